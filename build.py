@@ -72,6 +72,7 @@ class Builder:
     def create_executable(self):
         self.setup_environment()
         self.install_requirements()
+        self.compile_resources()
         self.build_project()
         self.copy_assets()
 
@@ -99,6 +100,11 @@ class Builder:
     def install_requirements(self):
         run_command([self.pip_path, "install", "-r", "requirements.txt"])
 
+    def compile_resources(self):
+        print("Compiling resources..")
+        rcc_path = os.path.join(os.path.dirname(self.pip_path), "pyside6-rcc")
+        run_command([rcc_path, "--binary", "src/utils/resources.qrc", "-o", "src/utils/resources.rcc"])
+
     def build_project(self):
         print("Installing PyInstaller..")
         run_command([self.pip_path, "install", "pyinstaller"])
@@ -17,6 +17,7 @@ datas.extend(collect_data_files('jupyter_core'))
 datas.extend(collect_data_files('yaspin'))
 datas.extend(collect_data_files('html2image'))
 datas.extend(collect_data_files('azure.cognitiveservices.speech'))
+datas.append(('src/utils/resources.rcc', 'src/utils'))  # the :/ icons, registered by src/gui/helpers.py
 
 binaries = collect_dynamic_libs('kiwisolver')
 binaries.extend(collect_dynamic_libs('azure.cognitiveservices.speech'))
@@ -1,3 +1,13 @@
-from src.gui.main import launch
+import sys
+
+if '--profile-startup' in sys.argv:  # sample from before the app imports, reported once the window shows
+    from src.utils.profiling import startup_profiler
+    startup_profiler.start()
+
+
+def launch(db_path=None):
+    from src.gui.main import launch as launch_app  # so headless imports of `src` packages don't import Qt
+    launch_app(db_path)
+
 
 __all__ = ['launch']
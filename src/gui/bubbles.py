@@ -1,7 +1,8 @@
-import asyncio
 import json
 import os
 import platform
+import re
+import traceback
 from typing import Optional, List, Dict, Tuple, Any
 
 from urllib.parse import quote
@@ -10,16 +11,17 @@ from PySide6 import QtWidgets
 from PySide6.QtWidgets import *
 from PySide6.QtCore import QSize, QTimer, QMargins, QRect, QUrl, QEvent, Slot, QRunnable, QPropertyAnimation, \
     QEasingCurve
-from PySide6.QtGui import QPixmap, QIcon, QTextCursor, QTextOption, Qt, QDesktopServices
+from PySide6.QtGui import QPixmap, QIcon, QTextCursor, QTextOption, Qt, QDesktopServices, QGuiApplication
 
 from src.members.user import User
 # from interpreter import interpreter
-from src.plugins.openinterpreter.src import interpreter
 
-from src.utils.helpers import path_to_pixmap, display_message_box, get_avatar_paths_from_config, \
-    get_member_name_from_config, apply_alpha_to_hex, split_lang_and_code, try_parse_json, block_signals, display_message
+from src.utils.helpers import get_avatar_paths_from_config, get_member_name_from_config, split_lang_and_code, \
+    try_parse_json
+from src.gui.helpers import path_to_pixmap, display_message_box, apply_alpha_to_hex, block_signals, display_message
 from src.gui.widgets import colorize_pixmap, IconButton, find_main_widget, clear_layout, find_workflow_widget
 from src.utils import sql
+from src.utils.runtime import runtime
 from src.system.base import manager
 
 import mistune
@@ -61,6 +63,11 @@ class MessageCollection(QWidget):
         self.waiting_for_bar = self.WaitingForBar(self)
         self.layout.addWidget(self.waiting_for_bar)
 
+        # Streamed chunks are buffered in main.stream_bus and drained on a fixed cadence
+        self.stream_flush_timer = QTimer(self)
+        self.stream_flush_timer.setSingleShot(True)
+        self.stream_flush_timer.timeout.connect(self.flush_stream)
+
     def maybe_scroll_to_end(self):
         scroll_bar = self.scroll_area.verticalScrollBar()
         is_at_bottom = scroll_bar.value() >= scroll_bar.maximum() - 100
@@ -290,28 +297,27 @@ class MessageCollection(QWidget):
         # self.refresh_waiting_bar(set_visibility=False)
         # self.parent.workflow_settings.refresh_member_highlights()
 
-        runnable = self.RespondingRunnable(self, from_member_id, feed_back)
-        self.main.threadpool.start(runnable)
+        response_coro = self.workflow.behaviour.start(from_member_id, feed_back=feed_back)
+        self.workflow.response_future = runtime.submit(response_coro)
+        self.workflow.response_future.add_done_callback(self.on_response_done)
 
         if self.parent.__class__.__name__ == 'Page_Chat':
             self.parent.try_generate_title()
 
-    class RespondingRunnable(QRunnable):
-        def __init__(self, parent, from_member_id=None, feed_back=False):
-            super().__init__()
-            self.parent = parent
-            self.main = parent.main
-            self.from_member_id = from_member_id
-            self.feed_back = feed_back  # todo clean
-
-        def run(self):
-            try:
-                asyncio.run(self.parent.workflow.behaviour.start(self.from_member_id, feed_back=self.feed_back))
-                self.main.finished_signal.emit()
-            except Exception as e:
-                if os.environ.get('AP_DEV_MODE', False):
-                    raise e  # re-raise the exception for debugging
-                self.main.error_occurred.emit(str(e))
+    def on_response_done(self, future):
+        """Called from the workflow runtime thread when the turn ends"""
+        if future.cancelled():
+            self.main.finished_signal.emit()
+            return
+
+        e = future.exception()
+        if e is None:
+            self.main.finished_signal.emit()
+            return
+
+        if os.environ.get('AP_DEV_MODE', False):
+            traceback.print_exception(e)  # print the full traceback for debugging
+        self.main.error_occurred.emit(str(e))
 
     @Slot(str)
     def on_error_occurred(self, error):
@@ -319,10 +325,12 @@ class MessageCollection(QWidget):
             message=error,
             icon=QMessageBox.Critical,
         )
+        self.clear_stream()
         self.end_turn()
 
     @Slot()
     def on_receive_finished(self):
+        self.clear_stream()
         self.refresh()
         self.end_turn()
 
@@ -337,14 +345,33 @@ class MessageCollection(QWidget):
 
     @Slot(str, str, str)
     def new_sentence(self, role, member_id, sentence):
+        self.new_sentences([(role, member_id, sentence)])
+
+    def new_sentences(self, sentences):
         with self.workflow.message_history.thread_lock:
-            if (role, member_id) not in self.last_member_bubbles:
-                msg = Message(msg_id=-1, role=role, content=sentence, member_id=member_id)
-                self.insert_bubble(msg)
-                self.last_member_bubbles[(role, member_id)] = self.chat_bubbles[-1]
-            else:
-                last_member_bubble = self.last_member_bubbles[(role, member_id)]
-                last_member_bubble.bubble.append_text(sentence)
+            for role, member_id, sentence in sentences:
+                if (role, member_id) not in self.last_member_bubbles:
+                    msg = Message(msg_id=-1, role=role, content=sentence, member_id=member_id)
+                    self.insert_bubble(msg)
+                    self.last_member_bubbles[(role, member_id)] = self.chat_bubbles[-1]
+                else:
+                    last_member_bubble = self.last_member_bubbles[(role, member_id)]
+                    last_member_bubble.bubble.append_text(sentence, stream=True)
+
+    @Slot()
+    def schedule_stream_flush(self):
+        if not self.stream_flush_timer.isActive():
+            self.stream_flush_timer.start(self.main.stream_bus.flush_interval_ms)
+
+    def flush_stream(self):
+        sentences = self.main.stream_bus.drain()
+        if sentences:
+            self.new_sentences(sentences)
+
+    def clear_stream(self):
+        # pending chunks are superseded by the saved messages that refresh() loads
+        self.stream_flush_timer.stop()
+        self.main.stream_bus.clear()
 
     def refresh_waiting_bar(self, set_visibility=None):
         """Optionally use set_visibility to show or hide, while respecting the system config"""
@@ -681,6 +708,7 @@ class MessageContainer(QWidget):
                     member_id=member_id  # !! #
                 )
 
+                from src.plugins.openinterpreter.src import interpreter
                 oi_res = interpreter.computer.run(lang, code)
                 output = next(r for r in oi_res if r['format'] == 'output').get('content', '')
                 self.msg_container.parent.send_message(output, role='output', as_member_id=member_id, feed_back=True, clear_input=False)
@@ -814,6 +842,15 @@ class MessageBubble(QTextEdit):
 
         self.text = ''
         self.code_blocks = []
+        self.css_key = None
+        self.css = ''
+
+        # Streamed text is rendered at most once per frame, re-parsing only the trailing open markdown block
+        self.markdown_stream = MarkdownStream()
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(self.get_frame_interval())
+        self.render_timer.timeout.connect(self.render_stream)
 
         self.setSizePolicy(
             QtWidgets.QSizePolicy.Expanding,
@@ -842,6 +879,8 @@ class MessageBubble(QTextEdit):
         self.log = message.log
         self.text = ''
         self.code_blocks = []
+        self.render_timer.stop()
+        self.markdown_stream.reset()
 
         self.enable_markdown = self.parent.member_config.get('chat.display_markdown', True)
         if self.role not in ('user', 'code'):
@@ -943,7 +982,26 @@ class MessageBubble(QTextEdit):
 
         super().mousePressEvent(event)
 
-    def setMarkdownText(self, text):
+    @staticmethod
+    def get_frame_interval():
+        screen = QGuiApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen else 60
+        return max(int(1000 / max(refresh_rate, 1)), 1)
+
+    def get_css(self, font, size):
+        role_config = self.main.system.roles.get_role_config(self.role)
+        bubble_text_color = role_config.get('bubble_text_color', '#d1d1d1')
+
+        css_key = (font, size, bubble_text_color, self.role)
+        if css_key != self.css_key:
+            code_color = '#919191' if self.role != 'code' else bubble_text_color
+            css_background = f"code {{ color: {code_color}; }}"
+            css_font = f"body {{ color: {bubble_text_color}; font-family: {font}; font-size: {size}px; white-space: pre-wrap; }}"
+            self.css = f"{css_background}\n{css_font}"
+            self.css_key = css_key
+        return self.css
+
+    def setMarkdownText(self, text, stream=False):
         self.text = text
         cursor = self.textCursor()
 
@@ -968,20 +1026,13 @@ class MessageBubble(QTextEdit):
         cursor_position = cursor.position()  # Save the current cursor position
         anchor_position = cursor.anchor()  # Save the anchor position for selection
 
-        role_config = self.main.system.roles.get_role_config(self.role)
-
-        bubble_text_color = role_config.get('bubble_text_color', '#d1d1d1')
-
-        code_color = '#919191' if self.role != 'code' else bubble_text_color
-        css_background = f"code {{ color: {code_color}; }}"
-        css_font = f"body {{ color: {bubble_text_color}; font-family: {font}; font-size: {size}px; white-space: pre-wrap; }}"
-        css = f"{css_background}\n{css_font}"
+        css = self.get_css(font, size)
 
         if self.enable_markdown and not self.is_edit_mode:
-            text = mistune.markdown(text)
-            # md = mistune.create_markdown(renderer=self.XMLTagRenderer())
-            # text = md(text)
-            text = text.replace('\n</code>', '</code>')  # !! #
+            if stream and self.role not in ('tool', 'result'):
+                text = self.markdown_stream.render(text)
+            else:
+                text = render_markdown(text)
         else:
             text = text.replace('\n', '<br>')
             text = text.replace('\t', '&nbsp;&nbsp;&nbsp;&nbsp;')
@@ -1010,7 +1061,7 @@ class MessageBubble(QTextEdit):
         button_y = self.height() - button_height
         return QRect(button_x, button_y, button_width, button_height)
 
-    def append_text(self, text):
+    def append_text(self, text, stream=False):
         # cursor = self.textCursor()
         #
         # start = cursor.selectionStart()
@@ -1018,7 +1069,14 @@ class MessageBubble(QTextEdit):
 
         self.text += text
         # self.original_text = self.text
-        self.setMarkdownText(self.text)
+        if not stream:
+            self.render_timer.stop()
+            self.setMarkdownText(self.text)
+            return
+
+        # Coalesce streamed chunks into one render per frame
+        if not self.render_timer.isActive():
+            self.render_timer.start()
         # self.update_size()
         #
         # cursor.setPosition(start, cursor.MoveAnchor)
@@ -1027,6 +1085,10 @@ class MessageBubble(QTextEdit):
         # self.setTextCursor(cursor)
         # self.code_blocks = self.extract_code_blocks(text)
 
+    def render_stream(self):
+        self.setMarkdownText(self.text, stream=True)
+        self.updateGeometry()
+
     def sizeHint(self):
         doc = self.document().clone()
         main = find_main_widget(self)
@@ -1206,3 +1268,90 @@ class MessageBubble(QTextEdit):
 
         def update_buttons(self):
             pass
+
+
+def render_markdown(text):
+    html = mistune.markdown(text)
+    # md = mistune.create_markdown(renderer=self.XMLTagRenderer())
+    # text = md(text)
+    return html.replace('\n</code>', '</code>')  # !! #
+
+
+class MarkdownStream:
+    """
+    Incrementally renders markdown that is being streamed.
+    Blocks that are finished are rendered once and frozen, so each render only re-parses the open blocks.
+    A block is finished at a blank line outside a code fence or html block, once the next line starts a new block
+    (not indented and not a list item, which could continue a loose list or indented code). Nothing is frozen past
+    a possible reference link or definition, since those can be resolved by any other part of the text.
+    """
+    LIST_ITEM = re.compile(r'([-+*]|\d{1,9}[.)])(\s|$)')
+    FENCE = re.compile(r'(`{3,}|~{3,})')
+    HTML_BLOCK_ENDS = {'<!--': '-->', '<pre': '</pre>', '<script': '</script>', '<style': '</style>', '<textarea': '</textarea>'}
+    INLINE_CODE = re.compile(r'`+[^`]*`+')
+    REFERENCE = re.compile(r'\](?!\()')  # a closing bracket that isn't an inline link or image
+
+    def __init__(self):
+        self.frozen_source = ''
+        self.frozen_html = ''
+        self.scan_pos = 0  # position of the first line not yet scanned for block boundaries
+        self.fence = None  # the marker of the open code fence
+        self.html_end = None  # the end marker of the open html block
+        self.after_blank = False
+        self.held = False  # a possible reference was seen, the rest of the text isn't frozen
+
+    def reset(self):
+        self.frozen_source = ''
+        self.frozen_html = ''
+        self.scan_pos = 0
+        self.fence = None
+        self.html_end = None
+        self.after_blank = False
+        self.held = False
+
+    def render(self, text):
+        if len(text) < self.scan_pos or not text.startswith(self.frozen_source):  # text was replaced, not appended to
+            self.reset()
+
+        freeze_pos = len(self.frozen_source)
+        while not self.held:
+            line_end = text.find('\n', self.scan_pos)
+            if line_end == -1:
+                break  # the last line is still open
+            line_start = self.scan_pos
+            raw_line = text[line_start:line_end]
+            line = raw_line.strip()
+            self.scan_pos = line_end + 1
+
+            if self.fence:
+                if line.startswith(self.fence) and line.strip(self.fence[0]) == '':
+                    self.fence = None
+                continue
+            if self.html_end:
+                if self.html_end in line.lower():
+                    self.html_end = None
+                continue
+            if line == '':
+                self.after_blank = True
+                continue
+
+            if self.after_blank and raw_line[0] not in ' \t' and not self.LIST_ITEM.match(raw_line):
+                freeze_pos = line_start
+            self.after_blank = False
+
+            fence_match = self.FENCE.match(line)
+            if fence_match:
+                self.fence = fence_match.group(1)
+                continue
+            lower_line = line.lower()
+            html_start = next((start for start in self.HTML_BLOCK_ENDS if lower_line.startswith(start)), None)
+            if html_start and self.HTML_BLOCK_ENDS[html_start] not in lower_line[len(html_start):]:
+                self.html_end = self.HTML_BLOCK_ENDS[html_start]
+            elif self.REFERENCE.search(self.INLINE_CODE.sub('', line)):
+                self.held = True
+
+        if freeze_pos > len(self.frozen_source):
+            self.frozen_html += render_markdown(text[len(self.frozen_source):freeze_pos])
+            self.frozen_source = text[:freeze_pos]
+
+        return self.frozen_html + render_markdown(text[len(self.frozen_source):])
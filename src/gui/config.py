@@ -11,11 +11,11 @@ from PySide6.QtCore import Signal, QFileInfo, Slot, QRunnable, QSize, QPoint, QT
 from PySide6.QtWidgets import *
 from PySide6.QtGui import QFont, Qt, QIcon, QPixmap, QCursor, QStandardItem, QStandardItemModel, QColor
 
-from src.utils.helpers import block_signals, block_pin_mode, display_message_box, \
-    merge_config_into_workflow_config, convert_to_safe_case, convert_model_json_to_obj, convert_json_to_obj, \
-    hash_config, try_parse_json, display_message
+from src.utils.helpers import merge_config_into_workflow_config, convert_to_safe_case, convert_model_json_to_obj, \
+    convert_json_to_obj, hash_config, try_parse_json
+from src.gui.helpers import block_signals, block_pin_mode, display_message_box, display_message
 from src.gui.widgets import BaseComboBox, CircularImageLabel, \
-    ColorPickerWidget, FontComboBox, BaseTreeWidget, IconButton, colorize_pixmap, LanguageComboBox, RoleComboBox, \
+    ColorPickerWidget, FontComboBox, BaseTreeWidget, IconButton, colorize_pixmap, colorize_pixmap_path, LanguageComboBox, RoleComboBox, \
     clear_layout, TreeDialog, ToggleIconButton, HelpIcon, PluginComboBox, EnvironmentComboBox, find_main_widget, \
     CTextEdit, PythonHighlighter, APIComboBox, VenvComboBox, ModuleComboBox, XMLHighlighter, \
     InputSourceComboBox, InputTargetComboBox, find_attribute  # XML used dynamically
@@ -1210,7 +1210,11 @@ class ConfigDBTree(ConfigTree):
     A widget that displays a tree of items from the db, with buttons to add and delete items.
     Can contain a config widget shown either to the right of the tree or below it,
     representing the config for each item in the tree.
+    If a `search_func` is given, the search box runs it off the UI thread and the query's `{{search}}`
+    placeholder restricts the rows to the ids it returns.
     """
+    search_results_signal = Signal(str, list)
+
     def __init__(self, parent, **kwargs):
         super().__init__(parent=parent, **kwargs)
         self.default_schema = self.schema.copy()
@@ -1218,6 +1222,15 @@ class ConfigDBTree(ConfigTree):
         self.query = kwargs.get('query', None)
         self.query_params = kwargs.get('query_params', ())
         self.table_name = kwargs.get('table_name', None)
+        self.search_func = kwargs.get('search_func', None)
+        self.search_ids = None  # None = not searching
+
+        if self.search_func:
+            self.search_timer = QTimer(self)
+            self.search_timer.setSingleShot(True)
+            self.search_timer.setInterval(250)
+            self.search_timer.timeout.connect(self.start_search)
+            self.search_results_signal.connect(self.on_search_results, Qt.QueuedConnection)
         self.isolated_config = True  # kwargs.get('propagate', False)
         # self.db_config_field = kwargs.get('db_config_field', 'config')
         # self.config_buttons = kwargs.get('config_buttons', None)
@@ -1281,8 +1294,7 @@ class ConfigDBTree(ConfigTree):
             if hasattr(self.tree_buttons, 'btn_group_folders'):
                 group_folders = self.tree_buttons.btn_group_folders.isChecked()
 
-        query = self.query if not self.filterable else self.query.replace('{{kind}}', self.filter_widget.get_kind())
-        data = sql.get_results(query=query, params=self.query_params)
+        data = sql.get_results(query=self.get_query(), params=self.query_params)
         self.tree.load(
             data=data,
             append=append,
@@ -1303,9 +1315,62 @@ class ConfigDBTree(ConfigTree):
             self.load_count += 1
 
     def reload_current_row(self):
-        data = sql.get_results(query=self.query, params=self.query_params)
+        data = sql.get_results(query=self.get_query(), params=self.query_params)
         self.tree.reload_selected_item(data=data, schema=self.schema)
 
+    def get_query(self):
+        """The query with its `{{kind}}` and `{{search}}` placeholders filled"""
+        query = self.query if not self.filterable else self.query.replace('{{kind}}', self.filter_widget.get_kind())
+        return query.replace('{{search}}', self.get_search_filter())
+
+    def get_search_filter(self):
+        if self.search_ids is None:
+            return ''
+        return f"AND id IN ({', '.join(str(int(item_id)) for item_id in self.search_ids) or 'NULL'})"
+
+    def get_search_text(self):
+        if not self.show_tree_buttons or not self.tree_buttons.search_box.isVisible():
+            return ''
+        return self.tree_buttons.search_box.text().strip()
+
+    def filter_rows(self):
+        if not self.search_func:
+            super().filter_rows()
+            return
+        self.search_timer.start()  # debounce typing
+
+    def start_search(self):
+        search_text = self.get_search_text()
+        if search_text == '':
+            if self.search_ids is not None:
+                self.search_ids = None
+                self.load()
+            return
+
+        main = find_main_widget(self)
+        main.threadpool.start(self.SearchRunnable(self, search_text))
+
+    @Slot(str, list)
+    def on_search_results(self, search_text, item_ids):
+        if search_text != self.get_search_text():
+            return  # a newer search is running
+        self.search_ids = item_ids
+        self.load()
+
+    class SearchRunnable(QRunnable):
+        def __init__(self, parent, search_text):
+            super().__init__()
+            self.parent = parent
+            self.search_text = search_text
+
+        def run(self):
+            try:
+                item_ids = self.parent.search_func(self.search_text)
+            except Exception as e:
+                print(f"Search failed: {e}")
+                item_ids = []
+            self.parent.search_results_signal.emit(self.search_text, item_ids)
+
     def update_config(self):
         """Overrides to stop propagation to the parent."""
         self.save_config()
@@ -2101,7 +2166,7 @@ class ConfigJsonTree(ConfigTree):
                     btn_func = col_schema.get('func', None)
                     btn_partial = partial(btn_func, row_dict)
                     btn_icon_path = col_schema.get('icon', '')
-                    pixmap = colorize_pixmap(QPixmap(btn_icon_path))
+                    pixmap = colorize_pixmap_path(btn_icon_path)
                     self.tree.setItemIconButtonColumn(item, i, pixmap, btn_partial)
                 elif ftype == bool:
                     widget = QCheckBox()
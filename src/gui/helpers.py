@@ -0,0 +1,272 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from PySide6.QtCore import QSize, Qt, QResource
+from PySide6.QtGui import QPixmap, QPainter, QPainterPath, QColor
+from PySide6.QtWidgets import QWidget, QMessageBox
+
+from src.utils.filesystem import unsimplify_path
+from src.utils.helpers import freeze_paths
+
+# The icons of resources.qrc, compiled with `pyside6-rcc --binary resources.qrc -o resources.rcc`
+RESOURCES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utils', 'resources.rcc')
+resources_registered = False
+
+
+def register_resources():
+    """Registers the `:/` resources, Qt maps the .rcc file and reads an icon when it's first used"""
+    global resources_registered
+    if not resources_registered:
+        resources_registered = QResource.registerResource(RESOURCES_PATH)
+        if not resources_registered:
+            print(f"WARNING: Could not register the resources file `{RESOURCES_PATH}`")
+    return resources_registered
+
+
+register_resources()
+
+
+def get_all_children(widget):
+    """Recursive function to retrieve all child pages of a given widget."""
+    children = []
+    for child in widget.findChildren(QWidget):
+        children.append(child)
+        children.extend(get_all_children(child))
+    return children
+
+
+@contextmanager
+def block_signals(*widgets, recurse_children=True):
+    """Context manager to block signals for a widget and all its child pages."""
+    all_widgets = []
+    try:
+        # Get all child pages
+        for widget in widgets:
+            all_widgets.append(widget)
+            if recurse_children:
+                all_widgets.extend(get_all_children(widget))
+
+        # Block signals
+        for widget in all_widgets:
+            widget.blockSignals(True)
+
+        yield
+    finally:
+        # Unblock signals
+        for widget in all_widgets:
+            widget.blockSignals(False)
+
+
+@contextmanager
+def block_pin_mode():
+    """Context manager to temporarily set pin mode to true, and then restore old state. A workaround for dialogs"""
+    from src.gui import main
+    try:
+        old_pin_mode = main.PIN_MODE
+        main.PIN_MODE = True
+        yield
+    finally:
+        main.PIN_MODE = old_pin_mode
+
+
+def display_message(parent, message, title=None, icon=QMessageBox.Information):
+    from src.gui.widgets import find_main_widget
+    main = find_main_widget(parent)
+    if main:
+        main.notification_manager.show_notification(
+            message=message,
+            color='blue' if icon == QMessageBox.Information else None,
+        )
+    else:
+        display_message_box(
+            icon=icon,
+            title=title or icon.name,
+            text=message,
+        )
+
+
+def display_message_box(icon, text, title, buttons=(QMessageBox.Ok)):
+    with block_pin_mode():
+        msg = QMessageBox()
+        msg.setIcon(icon)
+        msg.setText(text)
+        msg.setWindowTitle(title)
+        msg.setStandardButtons(buttons)
+        if QMessageBox.Yes in buttons:
+            msg.setDefaultButton(QMessageBox.Yes)
+        elif QMessageBox.Ok in buttons:
+            msg.setDefaultButton(QMessageBox.Ok)
+        msg.setWindowFlags(msg.windowFlags() | Qt.WindowStaysOnTopHint)
+        # msg.addButton('Archive', QMessageBox.ActionRole)
+        return msg.exec_()
+
+
+def apply_alpha_to_hex(hex_color, alpha):
+    color = QColor(hex_color)
+    color.setAlphaF(alpha)
+    return color.name(QColor.HexArgb)
+
+
+class PixmapCache:
+    """
+    Process-wide LRU cache of rendered pixmaps (avatars and colorized icons), bounded by their total size in bytes.
+    The theme colours are part of every key, and the cache is cleared when they change.
+    """
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.pixmaps = OrderedDict()  # {key: QPixmap}
+        self.total_bytes = 0
+        self.theme_key = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    def get(self, key) -> Optional[QPixmap]:
+        with self.lock:
+            pixmap = self.pixmaps.get(key)
+            if pixmap is not None:
+                self.pixmaps.move_to_end(key)
+            return pixmap
+
+    def put(self, key, pixmap):
+        with self.lock:
+            if key in self.pixmaps:
+                self.total_bytes -= self.get_pixmap_bytes(self.pixmaps.pop(key))
+            self.pixmaps[key] = pixmap
+            self.total_bytes += self.get_pixmap_bytes(pixmap)
+            while self.total_bytes > self.max_bytes and len(self.pixmaps) > 1:
+                _, evicted = self.pixmaps.popitem(last=False)
+                self.total_bytes -= self.get_pixmap_bytes(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.pixmaps.clear()
+            self.total_bytes = 0
+
+    def set_theme(self, theme_key):
+        if theme_key != self.theme_key:
+            self.clear()
+            self.theme_key = theme_key
+
+
+pixmap_cache = PixmapCache()
+
+
+def path_to_pixmap(paths, circular=True, diameter=30, opacity=1, def_avatar=None):
+    from src.gui.style import TEXT_COLOR
+    cache_key = ('path', freeze_paths(paths), circular, diameter, opacity, def_avatar, TEXT_COLOR)
+    pixmap = pixmap_cache.get(cache_key)
+    if pixmap is None:
+        pixmap = render_path_pixmap(paths, circular, diameter, opacity, def_avatar)
+        pixmap_cache.put(cache_key, pixmap)
+    return QPixmap(pixmap)  # implicitly shared copy, so callers can't modify the cached pixmap
+
+
+def render_path_pixmap(paths, circular=True, diameter=30, opacity=1, def_avatar=None):
+    if isinstance(paths, (list, tuple)):
+        count = len(paths)
+        dia_mult = 0.7 if count > 1 else 1  # 1 - (0.08 * min(count - 1, 8))
+        small_diameter = int(diameter * dia_mult)
+
+        pixmaps = []
+        for path in paths:
+            pixmaps.append(path_to_pixmap(path, diameter=small_diameter, def_avatar=def_avatar))
+
+        # Create a new QPixmap to hold all the stacked pixmaps
+        stacked_pixmap = QPixmap(diameter, diameter)
+        stacked_pixmap.fill(Qt.transparent)
+
+        painter = QPainter(stacked_pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+
+        only_two = count == 2
+        only_one = count == 1
+
+        offset = (diameter - small_diameter) // 2
+        for i, pixmap in enumerate(pixmaps):
+            # Calculate the shift for each pixmap
+            # random either -1 or 1
+            x_shift = (i % 2) * 2 - 1
+            y_shift = ((i // 2) % 2) * 2 - 1
+            x_shift *= 5
+            y_shift *= 5
+            if only_two and i == 1:
+                y_shift *= -1
+            if only_one:
+                x_shift = 0
+                y_shift = 0
+            painter.drawPixmap(offset - x_shift, offset - y_shift, pixmap)
+        painter.end()
+
+        return stacked_pixmap
+
+    else:
+        from src.gui.widgets import colorize_pixmap
+
+        try:
+            path = unsimplify_path(paths)
+            if path == '':
+                raise Exception('Empty path')
+            pic = QPixmap(path)
+            if path.startswith(':/'):
+                pic = colorize_pixmap(pic)
+        except Exception as e:
+            default_img_path = def_avatar or ':/resources/icon-agent-solid.png'
+            pic = colorize_pixmap(QPixmap(default_img_path))
+
+        if circular:
+            pic = create_circular_pixmap(pic, diameter=diameter)
+
+        if opacity < 1:
+            temp_pic = QPixmap(pic.size())
+            temp_pic.fill(Qt.transparent)
+
+            painter = QPainter(temp_pic)
+
+            painter.setOpacity(opacity)
+            painter.drawPixmap(0, 0, pic)
+            painter.end()
+
+            pic = temp_pic
+
+        return pic
+
+
+def create_circular_pixmap(src_pixmap, diameter=30):
+    if src_pixmap.isNull():
+        return QPixmap()
+
+    # Desired size of the profile picture
+    size = QSize(diameter, diameter)
+
+    # Create a new QPixmap for our circular image with the same size as our QLabel
+    circular_pixmap = QPixmap(size)
+    circular_pixmap.fill(Qt.transparent)  # Ensure transparency for the background
+
+    # Create a painter to draw on the pixmap
+    painter = QPainter(circular_pixmap)
+    painter.setRenderHint(QPainter.Antialiasing)  # For smooth rendering
+    painter.setRenderHint(QPainter.SmoothPixmapTransform)
+
+    # Draw the ellipse (circular mask) onto the pixmap
+    path = QPainterPath()
+    path.addEllipse(0, 0, size.width(), size.height())
+    painter.setClipPath(path)
+
+    # Scale the source pixmap while keeping its aspect ratio
+    src_pixmap = src_pixmap.scaled(size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
+
+    # Calculate the coordinates to ensure the pixmap is centered
+    x = (size.width() - src_pixmap.width()) / 2
+    y = (size.height() - src_pixmap.height()) / 2
+
+    painter.drawPixmap(x, y, src_pixmap)
+    painter.end()
+
+    return circular_pixmap
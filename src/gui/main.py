@@ -5,7 +5,6 @@ import sys
 import uuid
 from functools import partial
 
-import nest_asyncio
 from PySide6.QtWidgets import *
 from PySide6.QtCore import Signal, QSize, QTimer, QEvent, QThreadPool, QPoint, QPropertyAnimation, QEasingCurve, QObject
 from PySide6.QtGui import QPixmap, QIcon, QFont, QTextCursor, QTextDocument, QFontMetrics, QGuiApplication, Qt, \
@@ -18,21 +17,23 @@ from src.system.tools import ToolCollection, ComputerTool
 from src.utils.reset import ensure_system_folders
 from src.utils.sql_upgrade import upgrade_script
 from src.utils import sql, telemetry
+from src.utils.runtime import runtime
+from src.utils.profiling import startup_profiler
+from src.utils.stream_bus import StreamBus
 from src.system.base import manager
 
 from src.gui.pages.chat import Page_Chat
 from src.gui.pages.settings import Page_Settings
 from src.gui.pages.agents import Page_Entities
 from src.gui.pages.contexts import Page_Contexts
-from src.utils.helpers import display_message_box, apply_alpha_to_hex, get_avatar_paths_from_config, path_to_pixmap
+from src.utils.helpers import get_avatar_paths_from_config
+from src.gui.helpers import display_message_box, apply_alpha_to_hex, path_to_pixmap
 from src.gui.style import get_stylesheet
 from src.gui.config import CVBoxLayout, CHBoxLayout, ConfigPages
 from src.gui.widgets import IconButton, colorize_pixmap, TextEnhancerButton, ToggleIconButton, find_main_widget
 
 os.environ["QT_OPENGL"] = "software"
 
-nest_asyncio.apply()
-
 BOTTOM_CORNER_X = 400
 BOTTOM_CORNER_Y = 450
 
@@ -721,6 +722,7 @@ class SendButton(IconButton):
 
 class Main(QMainWindow):
     new_sentence_signal = Signal(str, str, str)
+    stream_ready_signal = Signal()
     finished_signal = Signal()
     error_occurred = Signal(str)
     title_update_signal = Signal(str)
@@ -756,6 +758,7 @@ class Main(QMainWindow):
         self.system = manager
         self.system.load()
         self.system.initialize_custom_managers()
+        startup_profiler.mark('managers loaded')
         get_stylesheet()  # init stylesheet
 
         # telemetry.set_uuid(self.get_uuid())
@@ -767,6 +770,7 @@ class Main(QMainWindow):
         # self.resize_grip.setFixedSize(self.resize_grip.sizeHint())
 
         self.threadpool = QThreadPool()
+        self.stream_bus = StreamBus(on_ready=self.stream_ready_signal.emit)
 
         # self.oldPosition = None
         self.expanded = False
@@ -830,6 +834,7 @@ class Main(QMainWindow):
         self.message_text.enterPressed.connect(self.page_chat.on_send_message)
 
         self.new_sentence_signal.connect(self.page_chat.message_collection.new_sentence, Qt.QueuedConnection)
+        self.stream_ready_signal.connect(self.page_chat.message_collection.schedule_stream_flush, Qt.QueuedConnection)
         self.finished_signal.connect(self.page_chat.message_collection.on_receive_finished, Qt.QueuedConnection)
         self.error_occurred.connect(self.page_chat.message_collection.on_error_occurred, Qt.QueuedConnection)
         self.title_update_signal.connect(self.page_chat.on_title_update, Qt.QueuedConnection)
@@ -1203,9 +1208,15 @@ class Main(QMainWindow):
         event.acceptProposedAction()
 
 
+def report_startup_profile():
+    startup_profiler.mark('event loop started')
+    print(startup_profiler.report(manager.load_timings))
+
+
 def launch(db_path=None):
     try:
         sql.set_db_filepath(db_path)
+        startup_profiler.mark('imports')
 
         app = QApplication(sys.argv)
         app.setAttribute(Qt.AA_EnableHighDpiScaling)
@@ -1216,7 +1227,13 @@ def launch(db_path=None):
         #     app.installTranslator(translator)
 
         Main()
+        if startup_profiler.running:
+            startup_profiler.mark('window created')
+            QTimer.singleShot(0, report_startup_profile)
         app.exec()
+        manager.clients.close()
+        manager.kernels.close()
+        runtime.stop()
     except Exception as e:
         if 'AP_DEV_MODE' in os.environ:
             # When debugging in IDE, re-raise
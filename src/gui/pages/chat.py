@@ -7,8 +7,9 @@ from PySide6.QtGui import Qt, QIcon, QPixmap
 
 from src.gui.bubbles import MessageCollection
 from src.members.workflow import WorkflowSettings
-from src.utils.helpers import path_to_pixmap, display_message_box, block_signals, get_avatar_paths_from_config, \
-    merge_config_into_workflow_config, apply_alpha_to_hex, convert_model_json_to_obj, params_to_schema
+from src.utils.helpers import get_avatar_paths_from_config, merge_config_into_workflow_config, \
+    convert_model_json_to_obj, params_to_schema
+from src.gui.helpers import path_to_pixmap, display_message_box, block_signals, apply_alpha_to_hex
 from src.utils import sql
 
 from src.members.workflow import Workflow
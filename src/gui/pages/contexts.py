@@ -2,6 +2,8 @@
 from PySide6.QtWidgets import *
 from src.gui.config import ConfigDBTree
 from src.gui.widgets import find_main_widget
+from src.utils import sql
+from src.utils.search import search_root_context_ids
 
 
 class Page_Contexts(ConfigDBTree):
@@ -13,43 +15,17 @@ class Page_Contexts(ConfigDBTree):
                 SELECT
                     c.name,
                     c.id,
-                    CASE
-                        WHEN json_extract(c.config, '$.members') IS NOT NULL THEN
-                            CASE
-                                WHEN json_array_length(json_extract(c.config, '$.members')) > 2 THEN
-                                    json_array_length(json_extract(c.config, '$.members')) || ' members'
-                                WHEN json_array_length(json_extract(c.config, '$.members')) = 2 THEN
-                                    COALESCE(json_extract(json_extract(c.config, '$.members'), '$[1].config."info.name"'), 'Assistant')
-                                WHEN json_extract(json_extract(c.config, '$.members'), '$[1].config._TYPE') = 'agent' THEN
-                                    json_extract(json_extract(c.config, '$.members'), '$[1].config."info.name"')
-                                ELSE
-                                    json_array_length(json_extract(c.config, '$.members')) || ' members'
-                            END
-                        ELSE
-                            CASE
-                                WHEN json_extract(c.config, '$._TYPE') = 'workflow' THEN
-                                    '1 member'
-                                ELSE
-                                    COALESCE(json_extract(c.config, '$."info.name"'), 'Assistant')
-                            END
-                    END as member_count,
-                    c.config,
+                    c.member_summary,
+                    c.avatar_paths,
                     '' AS goto_button,
                     c.folder_id
                 FROM contexts c
-                LEFT JOIN (
-                    SELECT
-                        context_id,
-                        MAX(id) as latest_message_id
-                    FROM contexts_messages
-                    GROUP BY context_id
-                ) cmsg ON c.id = cmsg.context_id
                 WHERE c.parent_id IS NULL
                 AND c.kind = "{{kind}}"
-                GROUP BY c.id
+                {{search}}
                 ORDER BY
-                    pinned DESC,
-                    COALESCE(cmsg.latest_message_id, 0) DESC, 
+                    c.pinned DESC,
+                    c.last_message_id DESC,
                     c.id DESC
                 LIMIT ? OFFSET ?;
                 """,
@@ -57,7 +33,7 @@ class Page_Contexts(ConfigDBTree):
                 {
                     'text': 'name',
                     'type': str,
-                    'image_key': 'config',
+                    'image_key': 'avatar_paths',
                     'stretch': True,
                 },
                 {
@@ -67,13 +43,13 @@ class Page_Contexts(ConfigDBTree):
                     'visible': False,
                 },
                 {
-                    'key': 'member_count',
+                    'key': 'member_summary',
                     'text': '',
                     'type': str,
                     'width': 100,
                 },
                 {
-                    'key': 'config',
+                    'key': 'avatar_paths',
                     'text': '',
                     'type': str,
                     'visible': False,
@@ -98,12 +74,17 @@ class Page_Contexts(ConfigDBTree):
             init_select=False,
             filterable=True,
             searchable=True,
+            search_func=search_root_context_ids,
             archiveable=True,
         )
         self.icon_path = ":/resources/icon-contexts.png"
         self.tree.itemDoubleClicked.connect(self.on_row_double_clicked)
         self.try_add_breadcrumb_widget(root_title='Chats')
 
+    def load(self, *args, **kwargs):
+        sql.update_context_avatar_paths()
+        super().load(*args, **kwargs)
+
     def on_row_double_clicked(self):
         context_id = self.get_selected_item_id()
         if not context_id:
@@ -2,7 +2,7 @@
 from src.gui.config import ConfigFields, ConfigTabs, ConfigDBTree, ModelComboBox
 from src.gui.widgets import IconButton, find_main_widget
 from src.system.plugins import get_plugin_class
-from src.utils.helpers import display_message_box, display_message
+from src.gui.helpers import display_message_box, display_message
 from src.utils.reset import reset_models
 
 from PySide6.QtWidgets import QMessageBox
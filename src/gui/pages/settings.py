@@ -4,7 +4,7 @@ import os
 
 import requests
 import keyring
-from PySide6.QtCore import QRunnable, Signal, Slot
+from PySide6.QtCore import QRunnable, Signal, Slot, QTimer
 from PySide6.QtGui import Qt
 from PySide6.QtWidgets import *
 from keyring.errors import PasswordDeleteError
@@ -16,14 +16,15 @@ from src.gui.config import ConfigPages, ConfigFields, ConfigDBTree, ConfigTabs,
 from src.gui.pages.blocks import Page_Block_Settings
 from src.gui.pages.modules import Page_Module_Settings
 from src.gui.pages.tools import Page_Tool_Settings
-from src.system.environments import EnvironmentSettings
+from src.gui.environments import EnvironmentSettings
 
 from src.utils import sql
 from src.gui.widgets import IconButton, find_main_widget
-from src.utils.helpers import display_message_box, block_signals, block_pin_mode
+from src.gui.helpers import display_message_box, block_signals, block_pin_mode
 
 from src.gui.pages.models import Page_Models_Settings
 from src.utils.reset import reset_application
+from src.utils.search import rebuild_search_index
 from src.utils.sql import define_table
 
 
@@ -371,6 +372,115 @@ class Page_Settings(ConfigPages):
                     #     'tooltip': 'This is not an AI completion, it''s a statistical approach to quickly add commonly used phrases',
                     #     'default': True,
                     # },
+                    {
+                        'text': 'Response cache',
+                        'type': bool,
+                        'default': False,
+                        'tooltip': 'Reuse responses of prompt blocks and auto titles when the model, parameters and messages are identical',
+                        'row_key': 1,
+                    },
+                    {
+                        'text': 'TTL',
+                        'key': 'response_cache_ttl',
+                        'type': int,
+                        'minimum': 0,
+                        'maximum': 2592000,
+                        'step': 3600,
+                        'default': 86400,
+                        'tooltip': 'Seconds before a cached response expires',
+                        'has_toggle': True,
+                        'row_key': 1,
+                    },
+                    {
+                        'text': 'Size (MB)',
+                        'key': 'response_cache_size',
+                        'type': int,
+                        'minimum': 1,
+                        'maximum': 10000,
+                        'step': 10,
+                        'default': 50,
+                        'row_key': 1,
+                    },
+                    {
+                        'text': 'Vector memory',
+                        'type': bool,
+                        'default': False,
+                        'tooltip': 'Embed messages in the background so agents can retrieve relevant earlier messages',
+                        'row_key': 2,
+                    },
+                    {
+                        'text': 'Embedding model',
+                        'type': str,
+                        'default': 'text-embedding-3-small',
+                        'width': 200,
+                        'row_key': 2,
+                    },
+                    {
+                        'text': 'Max connections',
+                        'key': 'http_max_connections',
+                        'type': int,
+                        'minimum': 1,
+                        'maximum': 1000,
+                        'step': 1,
+                        'default': 20,
+                        'tooltip': 'Connections per API, shared by every call to it',
+                        'row_key': 3,
+                    },
+                    {
+                        'text': 'Keep-alive',
+                        'key': 'http_keepalive_connections',
+                        'type': int,
+                        'minimum': 0,
+                        'maximum': 1000,
+                        'step': 1,
+                        'default': 10,
+                        'tooltip': 'Idle connections per API kept open for the next call',
+                        'row_key': 3,
+                    },
+                    {
+                        'text': 'Timeout',
+                        'key': 'http_timeout',
+                        'type': int,
+                        'minimum': 1,
+                        'maximum': 3600,
+                        'step': 10,
+                        'default': 100,
+                        'tooltip': 'Seconds to wait for an API response',
+                        'row_key': 3,
+                    },
+                    {
+                        'text': 'Spare kernels',
+                        'key': 'kernel_spares',
+                        'type': int,
+                        'minimum': 0,
+                        'maximum': 8,
+                        'step': 1,
+                        'default': 1,
+                        'tooltip': 'Python kernels kept started per environment and venv, ready for the next code block or tool',
+                        'row_key': 4,
+                    },
+                    {
+                        'text': 'Max kernels',
+                        'key': 'kernel_max_per_pool',
+                        'type': int,
+                        'minimum': 1,
+                        'maximum': 32,
+                        'step': 1,
+                        'default': 4,
+                        'tooltip': 'Python kernels per environment and venv, for code blocks running at the same time',
+                        'row_key': 4,
+                    },
+                    {
+                        'text': 'Kernel idle timeout',
+                        'key': 'kernel_idle_timeout',
+                        'type': int,
+                        'minimum': 10,
+                        'maximum': 86400,
+                        'step': 60,
+                        'default': 600,
+                        'tooltip': 'Seconds before an unused kernel is shut down',
+                        'row_key': 4,
+                    },
                     {
                         'text': 'Voice input method',
                         'type': ('None',),
@@ -409,11 +519,64 @@ class Page_Settings(ConfigPages):
                 self.dev_mode.stateChanged.connect(lambda state: self.toggle_dev_mode(state))
                 self.always_on_top.stateChanged.connect(self.main.toggle_always_on_top)
 
+                self.response_cache_stats = QLabel()
+                self.clear_response_cache_btn = QPushButton('Clear response cache')
+                self.clear_response_cache_btn.clicked.connect(self.clear_response_cache)
+                cache_layout = QHBoxLayout()
+                cache_layout.addWidget(self.response_cache_stats)
+                cache_layout.addWidget(self.clear_response_cache_btn)
+                cache_layout.addStretch(1)
+                self.layout.addLayout(cache_layout)
+
+                self.llm_queue_stats = QLabel()
+                self.layout.addWidget(self.llm_queue_stats)
+                self.llm_queue_timer = QTimer(self)
+                self.llm_queue_timer.timeout.connect(self.refresh_llm_queue_stats)
+                self.llm_queue_timer.start(1000)
+
+                self.rebuild_search_index_btn = QPushButton('Rebuild search index')
+                self.rebuild_search_index_btn.clicked.connect(self.rebuild_search_index)
+                self.layout.addWidget(self.rebuild_search_index_btn)
+
                 # add a button 'Reset database'
                 self.reset_app_btn = QPushButton('Reset Application')
                 self.reset_app_btn.clicked.connect(reset_application)
                 self.layout.addWidget(self.reset_app_btn)
 
+            def load(self):
+                super().load()
+                self.refresh_response_cache_stats()
+
+            def refresh_response_cache_stats(self):
+                if not hasattr(self, 'response_cache_stats'):
+                    return
+                stats = self.main.system.response_cache.get_stats()
+                self.response_cache_stats.setText(
+                    f"Response cache: {stats['hits']} hits, {stats['misses']} misses, "
+                    f"{stats['entries']} entries ({stats['size'] / (1024 * 1024):.1f} MB)"
+                )
+
+            def refresh_llm_queue_stats(self):
+                if not self.isVisible():
+                    return
+                stats = self.main.system.scheduler.get_stats()
+                text = f"LLM calls: {stats['running']} running, {stats['waiting']} queued, {stats['rate_limited']} rate limited"
+                backing_off = [f"{limiter['name']} ({limiter['backoff_secs']:.0f}s)"
+                               for limiter in stats['limiters'] if limiter['backoff_secs'] > 0]
+                if backing_off:
+                    text += f", backing off: {', '.join(backing_off)}"
+                self.llm_queue_stats.setText(text)
+
+            def clear_response_cache(self):
+                self.main.system.response_cache.clear()
+                self.refresh_response_cache_stats()
+
+            def rebuild_search_index(self):
+                rebuild_search_index()
+                self.main.notification_manager.show_notification(
+                    message='Search index rebuilt',
+                )
+
             def toggle_dev_mode(self, state=None):
                 # pass
                 if state is None and hasattr(self, 'dev_mode'):
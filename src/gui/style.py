@@ -1,4 +1,4 @@
-from src.utils.helpers import apply_alpha_to_hex
+from src.gui.helpers import apply_alpha_to_hex, pixmap_cache
 
 PRIMARY_COLOR = '#151515'
 SECONDARY_COLOR = '#323232'
@@ -20,6 +20,7 @@ def get_stylesheet():
     TEXT_SIZE = system_config.get('display.text_size', 12)
     PARAM_COLOR = system_config.get('display.parameter_color', '#c4c4c4')
     STRUCTURE_COLOR = system_config.get('display.structure_color', '#c4c4c4')
+    pixmap_cache.set_theme((PRIMARY_COLOR, SECONDARY_COLOR, TEXT_COLOR, PARAM_COLOR, STRUCTURE_COLOR))
 
     # is_dev_mode = manager.config.dict.get('system.dev_mode', False)
 
@@ -1,4 +1,3 @@
-import asyncio
 import inspect
 import json
 import re
@@ -10,10 +9,12 @@ from PySide6.QtGui import QPixmap, QPalette, QColor, QIcon, QFont, Qt, QStandard
     QPainterPath, QFontDatabase, QSyntaxHighlighter, QTextCharFormat, QTextOption, QTextDocument, QKeyEvent, \
     QTextCursor, QFontMetrics, QCursor
 
-from src.utils import sql, resources_rc
-from src.utils.helpers import block_pin_mode, path_to_pixmap, display_message_box, block_signals, apply_alpha_to_hex, \
-    get_avatar_paths_from_config, convert_model_json_to_obj, display_message
+from src.utils import sql
+from src.utils.helpers import get_avatar_paths_from_config, get_avatar_paths_from_config_json, convert_model_json_to_obj
+from src.gui.helpers import block_pin_mode, path_to_pixmap, display_message_box, block_signals, apply_alpha_to_hex, \
+    display_message, pixmap_cache
 from src.utils.filesystem import unsimplify_path
+from src.utils.runtime import runtime
 from PySide6.QtWidgets import QAbstractItemView
 
 
@@ -669,7 +670,7 @@ class TextEnhancerButton(IconButton):
             self.block_name = block_name
 
         def run(self):
-            asyncio.run(self.enhance_text())
+            runtime.run(self.enhance_text())
 
         async def enhance_text(self):
             from src.system.base import manager
@@ -720,6 +721,17 @@ def colorize_pixmap(pixmap, opacity=1.0, color=None):
     return colored_pixmap
 
 
+def colorize_pixmap_path(path, opacity=1.0, color=None):
+    """Cached `colorize_pixmap(QPixmap(path))`, for icons that are drawn for every item of a list"""
+    from src.gui.style import TEXT_COLOR
+    cache_key = ('colorize', path, opacity, color or TEXT_COLOR)
+    pixmap = pixmap_cache.get(cache_key)
+    if pixmap is None:
+        pixmap = colorize_pixmap(QPixmap(path), opacity=opacity, color=color)
+        pixmap_cache.put(cache_key, pixmap)
+    return QPixmap(pixmap)
+
+
 class BaseComboBox(QComboBox):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -996,7 +1008,7 @@ class BaseTreeWidget(QTreeWidget):
                             folder_item = QTreeWidgetItem(parent_item, [str(name), str(folder_id)])
                             folder_item.setData(0, Qt.UserRole, 'folder')
                             use_icon_path = icon_path or ':/resources/icon-folder.png'
-                            folder_pixmap = colorize_pixmap(QPixmap(use_icon_path))
+                            folder_pixmap = colorize_pixmap_path(use_icon_path)
                             folder_item.setIcon(0, QIcon(folder_pixmap))
                             folder_items_mapping[folder_id] = folder_item
                             folders_data.remove((folder_id, name, parent_id, icon_path, folder_type, expanded, order))
@@ -1026,7 +1038,7 @@ class BaseTreeWidget(QTreeWidget):
                     item.setFlags(item.flags() & ~Qt.ItemIsEditable)
 
                 if default_item_icon:
-                    pixmap = colorize_pixmap(QPixmap(default_item_icon))
+                    pixmap = colorize_pixmap_path(default_item_icon)
                     item.setIcon(0, QIcon(pixmap))
 
                 for i in range(len(row_data)):
@@ -1036,15 +1048,14 @@ class BaseTreeWidget(QTreeWidget):
                         btn_func = col_schema.get('func', None)
                         btn_partial = partial(btn_func, row_data)
                         btn_icon_path = col_schema.get('icon', '')
-                        pixmap = colorize_pixmap(QPixmap(btn_icon_path))
+                        pixmap = colorize_pixmap_path(btn_icon_path)
                         self.setItemIconButtonColumn(item, i, pixmap, btn_partial)
 
                     image_key = col_schema.get('image_key', None)
                     if image_key:
                         if image_key == 'config':
                             config_index = [i for i, d in enumerate(schema) if d.get('key', d['text']) == 'config'][0]
-                            config_dict = json.loads(row_data[config_index])
-                            image_paths_list = get_avatar_paths_from_config(config_dict)
+                            image_paths_list = get_avatar_paths_from_config_json(row_data[config_index])
                         else:
                             image_index = [i for i, d in enumerate(schema) if d.get('key', d['text']) == image_key][0]
                             image_paths = row_data[image_index] or ''
@@ -1495,15 +1506,16 @@ class PluginComboBox(BaseComboBox):
         self.load()
 
     def load(self):
-        from src.system.plugins import ALL_PLUGINS
+        from src.system.plugins import ALL_PLUGINS, get_plugin_names
 
         self.clear()
         if self.none_text:
             self.addItem(self.none_text, "")
 
-        for plugin in ALL_PLUGINS[self.plugin_type]:
-            if inspect.isclass(plugin):
-                self.addItem(plugin.__name__.replace('_', ' '), plugin.__name__)
+        is_class_list = isinstance(ALL_PLUGINS[self.plugin_type], list)
+        for plugin in get_plugin_names(self.plugin_type):
+            if is_class_list:
+                self.addItem(plugin.replace('_', ' '), plugin)
             else:
                 self.addItem(plugin, plugin)
 
@@ -2,7 +2,7 @@ from PySide6.QtCore import QPoint
 from PySide6.QtGui import Qt, QIcon, QPixmap, QMouseEvent, QCursor, QTextCursor
 from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout, QTextEdit, QMainWindow
 
-from src.utils.helpers import block_signals
+from src.gui.helpers import block_signals
 
 
 class TextEditorWindow(QMainWindow):
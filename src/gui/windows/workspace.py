@@ -4,7 +4,7 @@ from PySide6.QtWidgets import QWidget, QVBoxLayout
 
 from src.gui.config import CVBoxLayout, CHBoxLayout
 from src.gui.widgets import IconButton, BaseTreeWidget
-# from src.utils.helpers import block_signals
+# from src.gui.helpers import block_signals
 
 
 class WorkspaceWindow(QWidget):
@@ -18,7 +18,7 @@ class Agent(LlmMember):
         #     'Max turns': 'chat.max_turns',
         # }
 
-    def system_message(self, msgs_in_system=None, response_instruction='', msgs_in_system_len=0):
+    async def system_message(self, msgs_in_system=None, response_instruction='', msgs_in_system_len=0):
         raw_sys_msg = self.config.get('chat.sys_msg', '')
 
         builtin_blocks = {
@@ -29,7 +29,7 @@ class Agent(LlmMember):
         }
         if self.member_id == '4':
             pass
-        formatted_sys_msg = self.workflow.system.blocks.format_string(
+        formatted_sys_msg = await self.workflow.system.blocks.format_string_async(
             raw_sys_msg,
             ref_workflow=self.workflow,
             additional_blocks=builtin_blocks,
@@ -191,6 +191,30 @@ class AgentSettings(ConfigPages):
                         'has_toggle': True,
                         'row_key': 1,
                     },
+                    {
+                        'text': 'Token budget',
+                        'type': bool,
+                        'default': False,
+                        'tooltip': "Fit the latest messages to the model's context window",
+                        'row_key': 2,
+                    },
+                    {
+                        'text': 'Summary strategy',
+                        'type': ('None', 'LLM summary'),
+                        'default': 'None',
+                        'tooltip': 'How to summarize the older messages that are cut by the token budget',
+                        'row_key': 2,
+                    },
+                    {
+                        'text': 'Memory results',
+                        'type': int,
+                        'minimum': 1,
+                        'maximum': 20,
+                        'default': 3,
+                        'width': 60,
+                        'has_toggle': True,
+                        'tooltip': 'Number of relevant messages, cut by the limits above, to retrieve from the vector memory',
+                    },
                 ]
 
         class Page_Chat_Preload(ConfigJsonTree):
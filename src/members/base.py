@@ -1,10 +1,10 @@
 
 import json
+import re
 from abc import abstractmethod
-from fnmatch import fnmatch
+from fnmatch import translate
 from typing import Any, Dict, List, Optional
 
-from src.plugins.realtimeai.modules.client import RealtimeAIClientWrapper
 
 from src.utils import sql
 from src.utils.helpers import convert_model_json_to_obj, convert_to_safe_case
@@ -73,13 +73,13 @@ class Member:
 
         if self.receivable_function:
             async for key, chunk in self.receivable_function():
-                if self.workflow and self.workflow.stop_requested:
-                    self.workflow.stop_requested = False
-                    break
-
                 yield key, chunk
                 if self.main:
-                    self.main.new_sentence_signal.emit(key, self.full_member_id(), chunk)
+                    stream_bus = getattr(self.main, 'stream_bus', None)
+                    if stream_bus:
+                        await stream_bus.publish_async(key, self.full_member_id(), chunk)
+                    else:
+                        self.main.new_sentence_signal.emit(key, self.full_member_id(), chunk)
         else:
             yield 'SYS', 'SKIP'
 
@@ -305,6 +305,7 @@ class LlmMember(Member):
         if model_obj['model_name'].startswith('gpt-4o-realtime'):
             # Initialize the realtime client
             if not self.realtime_client:
+                from src.plugins.realtimeai.modules.client import RealtimeAIClientWrapper  # imports pyaudio/onnxruntime
                 self.realtime_client = RealtimeAIClientWrapper(self)
             self.realtime_client.load(model_obj)
         # else:
@@ -327,15 +328,15 @@ class LlmMember(Member):
         """, agent_tools_ids)
 
     @abstractmethod
-    def system_message(self, msgs_in_system=None, response_instruction='', msgs_in_system_len=0):
+    async def system_message(self, msgs_in_system=None, response_instruction='', msgs_in_system_len=0):
         return ''
 
     def default_role(self):  # todo clean
         return self.config.get(self.default_role_key, 'assistant')
 
     @abstractmethod
-    def get_messages(self):  #todo
-        return self.workflow.message_history.get_llm_messages(calling_member_id=self.full_member_id())
+    async def get_messages(self):  #todo
+        return await self.workflow.message_history.get_llm_messages(calling_member_id=self.full_member_id())
 
     async def receive(self):
         from src.system.base import manager  # todo
@@ -343,9 +344,9 @@ class LlmMember(Member):
         model_obj = convert_model_json_to_obj(model_json)
         structured_data = model_obj.get('model_params', {}).get('structure.data', [])
 
-        messages = self.get_messages()
+        messages = await self.get_messages()
 
-        system_msg = self.system_message()
+        system_msg = await self.system_message()
 
         if model_obj['model_name'].startswith('gpt-4o-realtime'):  # temp todo
             # raise NotImplementedError('Realtime models are not implemented yet.')
@@ -413,7 +414,7 @@ class LlmMember(Member):
         xml_tag_roles = model.get('model_params', {}).get('xml_roles.data', [])
         xml_tag_roles = {tag_dict['xml_tag'].lower(): tag_dict['map_to_role'] for tag_dict in xml_tag_roles}
         # default_role = self.config.get(self.default_role_key, 'assistant')
-        processor = CharProcessor(tag_roles=xml_tag_roles, default_role=self.default_role())
+        router = XMLRoleRouter(tag_roles=xml_tag_roles, default_role=self.default_role())
 
         stream = await manager.providers.run_model(
             model_obj=model,
@@ -443,10 +444,10 @@ class LlmMember(Member):
                         tc["function"]["arguments"] += t_chunk.function.arguments
 
             if content != '':
-                async for role, content in processor.process_chunk(content):
-                    yield role, content
-        async for role, content in processor.process_chunk(None):
-            yield role, content  # todo to get last char
+                for role, span in router.feed(content):
+                    yield role, span
+        for role, span in router.flush():
+            yield role, span
 
         if len(collected_tools) > 0:
             yield 'tools', collected_tools
@@ -514,74 +515,123 @@ class LlmMember(Member):
         return transformed
 
 
-class CharProcessor:  # todo clean / rethink
+TAG_CHARS = re.compile('[<>]')
+
+
+class XMLRoleRouter:
+    """
+    Routes streamed text to roles by xml tags, using the `xml_roles.data` tag to role mapping.
+    Whole chunks are scanned at once and returned as maximal spans of the same role,
+    so a chunk yields a handful of (role, text) tuples rather than one per character.
+    """
     def __init__(self, tag_roles=None, default_role='assistant'):
         self.default_role = default_role
-        self.tag_roles = tag_roles or {}
+        self.tag_patterns = [
+            (re.compile(translate(pattern.lower().replace('%', '*'))), role)
+            for pattern, role in (tag_roles or {}).items()
+        ]
         self.tag_opened = False
         self.closing_tag_opened = False
         self.tag_name_buffer = ''
         self.closing_tag_name_buffer = ''
-        self.text_buffer = ''
-        self.active_tags = []  # = None
         self.active_tag = None
         self.active_tag_role = None
-        self.tag_text_buffer = ''
-        self.current_char = None
+        self.pending = ''  # a trailing '<' inside a tag, held until the next chunk shows whether it starts a closing tag
 
     def match_tag(self, tag):
-        return next((role for pattern, role in self.tag_roles.items() if fnmatch(tag.lower(), pattern.lower().replace('%', '*'))), None)
-
-    async def process_chunk(self, chunk):
-        if chunk is None:
-            async for item in self.process_char(None):  # todo hack to get last char
-                yield item
-            return
-
-        for char in chunk:
-            self.text_buffer += char
-            async for item in self.process_char(char):
-                yield item
-
-    async def process_char(self, next_char):
-        char = self.current_char
-        self.current_char = next_char
-        if not char:
-            return
-
-        if not self.active_tag:
-            if char == '<':
-                self.tag_opened = True
-            elif char == '>':
-                self.tag_opened = False
-                matched_role = self.match_tag(self.tag_name_buffer.lower())
-                if matched_role:
-                    self.active_tag = self.tag_name_buffer
-                    self.active_tag_role = matched_role
-                yield self.default_role, f'<{self.tag_name_buffer}>'
-                self.tag_name_buffer = ''
-            elif self.tag_opened:
-                self.tag_name_buffer += char
+        tag = tag.lower()
+        return next((role for pattern, role in self.tag_patterns if pattern.match(tag)), None)
+
+    def feed(self, chunk):
+        """Returns a list of (role, text) spans for the chunk"""
+        text = self.pending + (chunk or '')
+        self.pending = ''
+        return self.route(text, final=False)
+
+    def flush(self):
+        """Returns the remaining spans at the end of the stream"""
+        text = self.pending
+        self.pending = ''
+        return self.route(text, final=True)
+
+    def route(self, text, final):
+        spans = []
+
+        def emit(role, span_text):
+            if not span_text:
+                return
+            if spans and spans[-1][0] == role:
+                spans[-1][1].append(span_text)
             else:
-                yield self.default_role, char
-
-        elif self.active_tag:
-            if next_char == '/' and char == '<':
-                self.closing_tag_opened = True
-            elif char == '>' and self.closing_tag_opened:
-                self.closing_tag_opened = False
-                self.closing_tag_name_buffer = self.closing_tag_name_buffer.strip('/')
-                if self.closing_tag_name_buffer == self.active_tag:
-                    self.active_tag = None
-                    self.active_tag_role = None
-                    yield self.default_role, f'</{self.closing_tag_name_buffer}>'
+                spans.append((role, [span_text]))
+
+        i = 0
+        text_len = len(text)
+        while i < text_len:
+            if not self.active_tag:
+                match = TAG_CHARS.search(text, i)
+                if not match:
+                    if self.tag_opened:
+                        self.tag_name_buffer += text[i:]
+                    else:
+                        emit(self.default_role, text[i:])
+                    break
+
+                if self.tag_opened:
+                    self.tag_name_buffer += text[i:match.start()]
                 else:
-                    yield self.active_tag_role.lower(), f'</{self.closing_tag_name_buffer}>'
-                self.closing_tag_name_buffer = ''
-            elif self.closing_tag_opened:
-                self.closing_tag_name_buffer += char
+                    emit(self.default_role, text[i:match.start()])
+                i = match.end()
+
+                if match.group() == '<':
+                    self.tag_opened = True
+                else:
+                    self.tag_opened = False
+                    matched_role = self.match_tag(self.tag_name_buffer)
+                    if matched_role:
+                        self.active_tag = self.tag_name_buffer
+                        self.active_tag_role = matched_role
+                    emit(self.default_role, f'<{self.tag_name_buffer}>')
+                    self.tag_name_buffer = ''
+
             else:
-                yield self.active_tag_role.lower(), char
+                tag_role = self.active_tag_role.lower()
+                if self.closing_tag_opened:
+                    match = TAG_CHARS.search(text, i)
+                    if not match:
+                        self.closing_tag_name_buffer += text[i:]
+                        break
+                    self.closing_tag_name_buffer += text[i:match.start()]
+                    i = match.end()
+
+                    if match.group() == '>':
+                        self.closing_tag_opened = False
+                        self.closing_tag_name_buffer = self.closing_tag_name_buffer.strip('/')
+                        if self.closing_tag_name_buffer == self.active_tag:
+                            self.active_tag = None
+                            self.active_tag_role = None
+                            emit(self.default_role, f'</{self.closing_tag_name_buffer}>')
+                        else:
+                            emit(tag_role, f'</{self.closing_tag_name_buffer}>')
+                        self.closing_tag_name_buffer = ''
+                        continue
+                else:
+                    lt_index = text.find('<', i)
+                    if lt_index == -1:
+                        emit(tag_role, text[i:])
+                        break
+                    emit(tag_role, text[i:lt_index])
+                    i = lt_index + 1
+
+                # a '<' was found inside the tag, it only opens a closing tag if followed by '/'
+                if i == text_len and not final:
+                    self.pending = '<'
+                    break
+                if i < text_len and text[i] == '/':
+                    self.closing_tag_opened = True
+                elif self.closing_tag_opened:
+                    self.closing_tag_name_buffer += '<'
+                else:
+                    emit(tag_role, '<')
 
-        if next_char is None:
-            return
+        return [(role, ''.join(parts)) for role, parts in spans]
@@ -1,4 +1,5 @@
 import ast
+import asyncio
 import json
 from textwrap import dedent
 
@@ -13,7 +14,7 @@ class Block(Member):
         super().__init__(**kwargs)
         self.receivable_function = self.receive
 
-    def get_content(self, run_sub_blocks=True):  # todo dupe code 777
+    async def get_content(self, run_sub_blocks=True):  # todo dupe code 777
         from src.system.base import manager
         content = self.config.get('data', '')
 
@@ -25,7 +26,7 @@ class Block(Member):
                 # if name in visited:
                 #     raise RecursionError(f"Circular reference detected in blocks: {name}")
                 # visited.add(name)
-                content = manager.blocks.format_string(content, ref_workflow=self.workflow)  # additional_blocks=member_blocks_dict)
+                content = await manager.blocks.format_string_async(content, ref_workflow=self.workflow)  # additional_blocks=member_blocks_dict)
 
         return content  # manager.blocks.format_string(content, additional_blocks=member_blocks_dict)
 
@@ -39,7 +40,7 @@ class TextBlock(Block):
 
     async def receive(self):
         """The entry response method for the member."""
-        content = self.get_content()
+        content = await self.get_content()
         yield self.default_role(), content
         self.workflow.save_message(self.default_role(), content, self.full_member_id())  # , logging_obj)
 
@@ -73,7 +74,7 @@ class CodeBlock(Block):
         name, environment = environment_tup
 
         lang = self.config.get('language', 'Python')
-        code = self.get_content(run_sub_blocks=False)
+        code = await self.get_content(run_sub_blocks=False)
         venv_name = environment.config.get('venv', 'default')
         venv = manager.venvs.venvs.get(venv_name)
 
@@ -90,7 +91,8 @@ class CodeBlock(Block):
         else:
             try:
                 wrapped_code = self.wrap_code(lang, code, params)
-                result = environment.run_code(lang, wrapped_code, venv_path)
+                result = await asyncio.to_thread(  # off the loop, so blocks of a parallel level run on their own kernels
+                    environment.run_code, lang, wrapped_code, venv_path, reset=self.is_tool_call())
                 unique_str = '##%##@##!##%##@##!##'
                 if unique_str in result:
                     result = result.split(unique_str)[-1].strip()
@@ -115,6 +117,13 @@ class CodeBlock(Block):
         # yield 'block', output
         # self.workflow.save_message('block', output, self.full_member_id())
 
+    def is_tool_call(self):
+        """Whether the block runs in a tool workflow, whose calls shouldn't share kernel state"""
+        workflow = self.workflow
+        while workflow._parent_workflow is not None:
+            workflow = workflow._parent_workflow
+        return workflow.tool_uuid is not None
+
     def wrap_code(self, lang, code, params=None):
         params = params or {}
         if lang != 'Python':
@@ -256,7 +265,7 @@ class PromptBlock(LlmMember):
     def __init__(self, **kwargs):
         super().__init__(model_config_key='prompt_model', **kwargs)
 
-    def get_content(self, run_sub_blocks=True):  # todo dupe code 777
+    async def get_content(self, run_sub_blocks=True):  # todo dupe code 777
         from src.system.base import manager
         content = self.config.get('data', '')
 
@@ -264,12 +273,41 @@ class PromptBlock(LlmMember):
             block_type = self.config.get('block_type', 'Text')
             nestable_block_types = ['Text', 'Prompt']
             if block_type in nestable_block_types:
-                content = manager.blocks.format_string(content, ref_workflow=self.workflow)
+                content = await manager.blocks.format_string_async(content, ref_workflow=self.workflow)
 
         return content
 
-    def get_messages(self):  # todo
-        return [{'role': 'user', 'content': self.get_content()}]
+    async def get_messages(self):  # todo
+        return [{'role': 'user', 'content': await self.get_content()}]
+
+    async def stream(self, model, messages):
+        from src.system.base import manager
+        response_cache = manager.response_cache
+        if not response_cache.enabled:
+            async for key, chunk in super().stream(model, messages):
+                yield key, chunk
+            return
+
+        cache_key = response_cache.get_key(model, messages, tools=self.get_function_call_tools())
+        cached_spans = response_cache.get(cache_key)
+        if cached_spans is not None:
+            for key, chunk in cached_spans:
+                yield key, chunk
+            return
+
+        spans = []
+        cacheable = True
+        async for key, chunk in super().stream(model, messages):
+            yield key, chunk
+            if key == 'tools':
+                cacheable = False  # tool calls need to be run
+            elif spans and spans[-1][0] == key:
+                spans[-1][1] += chunk or ''
+            else:
+                spans.append([key, chunk or ''])
+
+        if cacheable:
+            response_cache.set(cache_key, spans)
 
 
 class TextBlockSettings(ConfigFields):
@@ -1,4 +1,5 @@
 import asyncio
+import heapq
 import json
 import sqlite3
 import uuid
@@ -13,6 +14,7 @@ from src.members.user import User, UserSettings
 
 from src.utils import sql
 from src.utils.messages import MessageHistory
+from src.utils.runtime import runtime
 
 from PySide6.QtCore import QPointF, QRectF, QPoint, Signal, QTimer
 from PySide6.QtGui import Qt, QPen, QColor, QBrush, QPainter, QPainterPath, QCursor, QRadialGradient, \
@@ -25,12 +27,121 @@ from src.gui.config import ConfigWidget, CVBoxLayout, CHBoxLayout, ConfigFields,
     ConfigJsonTree, ConfigJoined
 
 from src.gui.widgets import IconButton, ToggleIconButton, TreeDialog, BaseTreeWidget, find_main_widget
-from src.utils.helpers import path_to_pixmap, display_message_box, get_avatar_paths_from_config, \
-    merge_config_into_workflow_config, get_member_name_from_config, block_signals, display_message
-
-loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
-
+from src.utils.helpers import get_avatar_paths_from_config, merge_config_into_workflow_config, \
+    get_member_name_from_config, hash_config
+from src.gui.helpers import path_to_pixmap, display_message_box, block_signals, display_message
+
+PARALLEL_MEMBER_TYPES = ('workflow', 'agent', 'block')
+MAX_CACHED_PLANS = 256
+execution_plans = {}  # {structure hash: ExecutionPlan}
+
+
+class ExecutionPlan:
+    """
+    The order the members of a workflow run in, compiled from its members and inputs.
+    A member with inputs depends on its (non looper) input members, a member without inputs depends on every member
+    in an earlier column, where members within 10px of loc_x share a column.
+    Members are grouped into levels that only depend on previous levels, so independent branches share a level.
+    """
+    def __init__(self, members, inputs):
+        self.member_inputs: Dict[str, List[str]] = {}  # {member_id: [source_member_id]}
+        self.dependencies: Dict[str, set] = {}  # {member_id: {member_id}}
+        self.levels: List[List[str]] = []
+        self.order: List[str] = []
+        self.compile(members, inputs)
+
+    def compile(self, members, inputs):
+        members = sorted(members, key=lambda x: x.get('loc_x', 50))
+        positions = {}  # {member_id: index by loc_x}
+        columns = {}  # {member_id: column}
+        column = -1
+        last_type, last_loc_x = None, None
+        for member_dict in members:
+            member_id = str(member_dict['id'])
+            member_type = member_dict.get('config', {}).get('_TYPE', 'agent')
+            loc_x = member_dict.get('loc_x', 50)
+            same_column = (
+                member_type in PARALLEL_MEMBER_TYPES and last_type in PARALLEL_MEMBER_TYPES
+                and abs(loc_x - last_loc_x) < 10  # 10px threshold
+            )
+            if not same_column:
+                column += 1
+            positions[member_id] = len(positions)
+            columns[member_id] = column
+            last_type, last_loc_x = member_type, loc_x
+
+        self.member_inputs = {member_id: [] for member_id in positions}
+        for input_info in inputs:
+            if input_info.get('config', {}).get('looper', False):
+                continue
+            target_member_id = str(input_info['target_member_id'])
+            if target_member_id in self.member_inputs:
+                self.member_inputs[target_member_id].append(str(input_info['source_member_id']))
+
+        dependents = {member_id: [] for member_id in positions}
+        for member_id, member_input_ids in self.member_inputs.items():
+            dependencies = {inp_id for inp_id in member_input_ids if inp_id in positions and inp_id != member_id}
+            if not dependencies:
+                dependencies = {other_id for other_id, other_column in columns.items()
+                                if other_column < columns[member_id]}
+            self.dependencies[member_id] = dependencies
+            for dependency_id in dependencies:
+                dependents[dependency_id].append(member_id)
+
+        # Kahn's algorithm, taking ready members by position
+        levels = {}
+        waiting = {member_id: set(dependencies) for member_id, dependencies in self.dependencies.items()}
+        ready = [(positions[member_id], member_id) for member_id, dependencies in waiting.items() if not dependencies]
+        heapq.heapify(ready)
+        queued = {member_id for _, member_id in ready}
+        while len(levels) < len(positions):
+            if not ready:  # a circular reference, break it at the leftmost member
+                member_id = min((m for m in positions if m not in levels), key=positions.get)
+                ready.append((positions[member_id], member_id))
+                queued.add(member_id)
+            _, member_id = heapq.heappop(ready)
+            levels[member_id] = max((levels[dep_id] + 1 for dep_id in self.dependencies[member_id] if dep_id in levels),
+                                    default=0)
+            for dependent_id in dependents[member_id]:
+                waiting[dependent_id].discard(member_id)
+                if not waiting[dependent_id] and dependent_id not in queued:
+                    heapq.heappush(ready, (positions[dependent_id], dependent_id))
+                    queued.add(dependent_id)
+
+        self.levels = [[] for _ in range(max(levels.values(), default=-1) + 1)]
+        for member_id in sorted(levels, key=positions.get):
+            self.levels[levels[member_id]].append(member_id)
+        self.order = [member_id for level in self.levels for member_id in level]
+
+
+def get_execution_plan(members, inputs) -> ExecutionPlan:
+    """Returns the execution plan of the members and inputs, cached by a hash of the parts it depends on"""
+    structure = {
+        'members': [(str(m['id']), m.get('loc_x', 50), m.get('config', {}).get('_TYPE', 'agent')) for m in members],
+        'inputs': [(str(inp['source_member_id']), str(inp['target_member_id']), inp.get('config', {}).get('looper', False))
+                   for inp in inputs],
+    }
+    plan_hash = hash_config(structure)
+    plan = execution_plans.get(plan_hash)
+    if plan is None:
+        if len(execution_plans) >= MAX_CACHED_PLANS:
+            execution_plans.clear()
+        plan = ExecutionPlan(members, inputs)
+        execution_plans[plan_hash] = plan
+    return plan
+
+
+async def gather_cancel_on_error(coros):
+    """Runs coroutines concurrently, cancelling the rest when one raises (like a TaskGroup, which needs 3.11)"""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
 
 class Workflow(Member):
     def __init__(self, **kwargs):
@@ -87,12 +198,12 @@ class Workflow(Member):
                 sql.execute("INSERT INTO contexts (kind, config, name) VALUES (?, ?, ?)", (kind, json.dumps(self.config), self.chat_title))
                 self.context_id = sql.get_scalar("SELECT id FROM contexts WHERE kind = ? ORDER BY id DESC LIMIT 1", (kind,))
 
-        self.loop = asyncio.get_event_loop()
+        self.loop = runtime.start()
         self.responding = False
-        self.stop_requested = False
+        self.response_future = None  # the turn running on the runtime, cancelled by the stop button
 
         self.members: Dict[str, Member] = {}  # id: member
-        self.boxes: List[set] = []
+        self.plan: Optional[ExecutionPlan] = None
 
         self.autorun = True
         self.behaviour = None
@@ -178,42 +289,17 @@ class Workflow(Member):
             members = wf_config.get('members', [])
         inputs = self.config.get('inputs', [])
 
-        last_member_id = None
-        last_loc_x = -100
-        current_box_member_ids = set()
-
-        members = sorted(members, key=lambda x: x['loc_x'])
+        self.plan = get_execution_plan(members, inputs)
+        member_dicts = {str(member_dict['id']): member_dict for member_dict in members}
 
         self.members = {}  #!looper!#
-        self.boxes = []
-        iterable = iter(members)
-        while len(members) > 0:
-            try:
-                member_dict = next(iterable)
-            except StopIteration:  # todo temp make nicer
-                iterable = iter(members)
-                continue
-
-            member_id = str(member_dict['id'])
-            if self._parent_workflow:
-                pass
+        for member_id in self.plan.order:
+            member_dict = member_dicts[member_id]
             entity_id = member_dict.get('agent_id', None)
             member_config = member_dict['config']
             loc_x = member_dict.get('loc_x', 50)
             loc_y = member_dict.get('loc_y', 0)
 
-            member_input_ids = [
-                input_info['source_member_id']
-                for input_info in inputs
-                if input_info['target_member_id'] == member_id
-                and not input_info['config'].get('looper', False)
-            ]
-
-            # Order based on the inputs
-            if len(member_input_ids) > 0:
-                if not all((inp_id in self.members) for inp_id in member_input_ids):
-                    continue
-
             # Instantiate the member
             member_type = member_dict.get('config', {}).get('_TYPE', 'agent')
             kwargs = dict(main=self.main,
@@ -223,7 +309,7 @@ class Workflow(Member):
                           agent_id=entity_id,
                           loc_x=loc_x,
                           loc_y=loc_y,
-                          inputs=member_input_ids)
+                          inputs=self.plan.member_inputs[member_id])
             if member_type == 'agent':
                 use_plugin = member_config.get('info.use_plugin', None)
                 member_class = get_plugin_class(plugin_type='Agent', plugin_name=use_plugin, default_class=Agent)
@@ -242,37 +328,7 @@ class Workflow(Member):
                 raise NotImplementedError(f"Member type '{member_type}' not implemented")
 
             member.load()
-
-            if member_type in ('workflow', 'agent', 'block'):
-                if abs(loc_x - last_loc_x) < 10:  # 10px threshold
-                    if last_member_id is not None:
-                        current_box_member_ids |= {last_member_id}
-                    current_box_member_ids |= {member_id}
-
-                else:
-                    if current_box_member_ids:
-                        self.boxes.append(current_box_member_ids)
-                        current_box_member_ids = set()
-
-                last_loc_x = loc_x
-                last_member_id = member_id
-
             self.members[member_id] = member
-            members.remove(member_dict)
-            iterable = iter(members)
-
-        if current_box_member_ids:
-            self.boxes.append(current_box_member_ids)
-
-        del_boxes = []
-        for box in self.boxes:
-            for member_id in box:
-                fnd = self.walk_inputs_recursive(member_id, box)
-                if fnd:
-                    del_boxes.append(box)
-                    break
-        for box in del_boxes:
-            self.boxes.remove(box)
 
         counted_members = self.count_members()
         if counted_members == 1:
@@ -283,16 +339,6 @@ class Workflow(Member):
 
         self.update_behaviour()
 
-    def walk_inputs_recursive(self, member_id: str, search_list: set) -> bool:  #!asyncrecdupe!#
-        member = self.members[member_id]  #!params!#
-        found = False
-        for inp in member.inputs:
-            # is_looper = self..inputs[inp].config.get('looper', False)
-            if inp in search_list:
-                return True
-            found = found or self.walk_inputs_recursive(inp, search_list)
-        return found
-
     def get_members(self, incl_types: Any = 'all', excl_types=None) -> List[Member]:
         if incl_types == 'all':
             incl_types = ('agent', 'workflow', 'user', 'tool', 'block', 'node')
@@ -324,12 +370,6 @@ class Workflow(Member):
         only_one_empty = len([member for member in self.get_members() if member.turn_output is None]) == 1
         return only_one_empty  #!99!#  #!looper!#
 
-    def get_member_async_group(self, member_id) -> Optional[List[str]]:
-        for box in self.boxes:
-            if member_id in box:
-                return [b for b in box if self.last_output is None]
-        return None  # [member_id]
-
     def get_member_config(self, member_id) -> Dict[str, Any]:
         member = self.members.get(member_id)
         return member.config if member else {}
@@ -439,9 +479,9 @@ class Workflow(Member):
 
     def update_behaviour(self):
         """Update the behaviour of the context based on the common key"""
-        from src.system.plugins import ALL_PLUGINS
+        from src.system.plugins import get_plugin_class
         common_group_key = self.get_common_group_key()
-        behaviour = ALL_PLUGINS['Workflow'].get(common_group_key, None)
+        behaviour = get_plugin_class('Workflow', common_group_key)
         self.behaviour = behaviour(self) if behaviour else WorkflowBehaviour(self)
 
     def get_final_message(self, filter_role='all'):
@@ -458,29 +498,12 @@ class WorkflowBehaviour:
         # self.tasks = []
 
     async def start(self, from_member_id: int = None, feed_back: bool = False):
+        if self.workflow._parent_workflow is None:
+            self.workflow.system.blocks.new_turn()
         async for key, chunk in self.receive(from_member_id, feed_back):
             pass
 
     async def receive(self, from_member_id: int = None, feed_back: bool = False):
-        processed_members = set()
-
-        def create_async_group_task(member_ids):
-            """ Helper function to create and return a coroutine that runs all members in the member_async_group """
-            async def run_group():
-                group_tasks = []
-                for member_id in member_ids:
-                    if member_id not in processed_members:
-                        m = self.workflow.members[member_id]
-                        sub_task = asyncio.create_task(run_member_task(m))
-                        group_tasks.append(sub_task)
-                        processed_members.add(member_id)
-                try:
-                    await asyncio.gather(*group_tasks)
-                except StopIteration:
-                    return
-
-            return run_group
-
         async def run_member_task(member):  # todo dirty
             async for _ in member.run_member():
                 pass
@@ -492,30 +515,39 @@ class WorkflowBehaviour:
         # if first_member.config.get('_TYPE', 'agent') == 'user':  #!33!#
         #     from_member_id = first_member.member_id
 
+        plan = self.workflow.plan
+        skip_member_ids = set()
+        if from_member_id is not None:
+            from_index = plan.order.index(from_member_id) if from_member_id in plan.order else len(plan.order)
+            skip_member_ids = set(plan.order[:from_index])
+
         filter_role = self.workflow.config.get('config', {}).get('filter_role', 'All').lower()
         self.workflow.responding = True
         try:
-            found_source = True if from_member_id is None else False
-            for member in self.workflow.members.values():
-                if not found_source and member.member_id == from_member_id:
-                    found_source = True
-                if not found_source:
-                    continue  # todo clean mechanism
-                ignore_turn_output = feed_back and member.member_id == from_member_id
-                if (member.turn_output is not None and not ignore_turn_output) or member.member_id in processed_members:
+            for level in plan.levels:
+                level_members = []
+                for member_id in level:
+                    member = self.workflow.members[member_id]
+                    ignore_turn_output = feed_back and member_id == from_member_id
+                    if member_id in skip_member_ids or (member.turn_output is not None and not ignore_turn_output):
+                        continue
+                    level_members.append(member)
+                if not level_members:
                     continue
                 if self.workflow.chat_page:
                     self.workflow.chat_page.workflow_settings.refresh_member_highlights()
 
-                async_group_member_ids = self.workflow.get_member_async_group(member.member_id)
-                if async_group_member_ids:
-                    self.workflow.gen_members = async_group_member_ids
-                    # Create a single coroutine to handle the entire member async group
-                    run_method = create_async_group_task(async_group_member_ids)
-                    result = await run_method()
-                    if result is True:
+                # Members of a level don't depend on each other, so they run concurrently
+                async_group = [member for member in level_members
+                               if member.config.get('_TYPE', 'agent') in PARALLEL_MEMBER_TYPES]
+                if len(async_group) > 1:
+                    self.workflow.gen_members = [member.member_id for member in async_group]
+                    await gather_cancel_on_error(run_member_task(member) for member in async_group)
+                    level_members = [member for member in level_members if member not in async_group]
+                    if not self.workflow.autorun:
                         return
-                else:
+
+                for member in level_members:
                     nem = self.workflow.next_expected_member()
                     is_final_message = self.workflow.next_expected_is_last_member() and member == nem
                     # # Run individual member
@@ -530,8 +562,8 @@ class WorkflowBehaviour:
                     except StopIteration:
                         return
 
-                if not self.workflow.autorun:
-                    return
+                    if not self.workflow.autorun:
+                        return
 
             if self.workflow._parent_workflow is not None:  # todo
                 # last_member = list(self.workflow.members.values())[-1]
@@ -549,7 +581,9 @@ class WorkflowBehaviour:
             self.workflow.responding = False
 
     def stop(self):
-        self.workflow.stop_requested = True
+        """Cancels the running turn, the cancellation is raised in the member awaiting on the runtime loop"""
+        if self.workflow.response_future is not None:
+            runtime.cancel(self.workflow.response_future)
 
 
 class WorkflowSettings(ConfigWidget):
@@ -761,60 +795,28 @@ class WorkflowSettings(ConfigWidget):
             self.members_in_view[_id] = member
 
     def load_async_groups(self):
-        # Clear any existing members from the scene
+        """Draws a box around the members of each execution plan level that run concurrently"""
         for box in self.boxes_in_view:
             self.scene.removeItem(box)
         self.boxes_in_view = []
 
-        last_member_id = None
-        last_member_pos = None
-        last_loc_x = -100
-        current_box_member_positions = []
-        current_box_member_ids = []
-
-        members = self.members_in_view.values()
-        members = sorted(members, key=lambda m: m.x())
-
-        for member in members:
-            loc_x = member.x()
-            loc_y = member.y()
-            pos = QPointF(loc_x, loc_y)
-
-            member_type = member.member_config.get('_TYPE', 'agent')
-            if member_type in ('workflow', 'agent', 'block'):
-                if abs(loc_x - last_loc_x) < 10:
-                    current_box_member_positions += [last_member_pos, pos]
-                    current_box_member_ids += [last_member_id, member.id]
-                else:
-                    if current_box_member_positions:
-                        box = RoundedRectWidget(self, points=current_box_member_positions, member_ids=current_box_member_ids)
-                        self.scene.addItem(box)
-                        self.boxes_in_view.append(box)
-                        current_box_member_positions = []
-                        current_box_member_ids = []
-
-                last_loc_x = loc_x
-                last_member_pos = pos
-                last_member_id = member.id
-
-        # Handle the last group after finishing the loop
-        if current_box_member_positions:
-            box = RoundedRectWidget(self, points=current_box_member_positions, member_ids=current_box_member_ids)
+        members_in_view = {str(member_id): member for member_id, member in self.members_in_view.items()}
+        members = [{'id': member_id, 'loc_x': int(member.x()), 'config': {'_TYPE': member.member_type}}
+                   for member_id, member in members_in_view.items()]
+        inputs = [{'source_member_id': source_member_id, 'target_member_id': target_member_id, 'config': line.config}
+                  for (source_member_id, target_member_id), line in self.inputs_in_view.items()]
+        plan = get_execution_plan(members, inputs)
+        for level in plan.levels:
+            async_group = [members_in_view[member_id] for member_id in level
+                           if members_in_view[member_id].member_type in PARALLEL_MEMBER_TYPES]
+            if len(async_group) < 2:
+                continue
+            box = RoundedRectWidget(self,
+                                    points=[QPointF(member.x(), member.y()) for member in async_group],
+                                    member_ids=[member.id for member in async_group])
             self.scene.addItem(box)
             self.boxes_in_view.append(box)
 
-        del_boxes = []
-        for box in self.boxes_in_view:
-            for member_id in box.member_ids:
-                fnd = self.walk_inputs_recursive(member_id, box.member_ids)
-                if fnd:
-                    del_boxes.append(box)
-                    break
-
-        for box in del_boxes:
-            self.scene.removeItem(box)
-            self.boxes_in_view.remove(box)
-
     def load_inputs(self):
         for _, line in self.inputs_in_view.items():
             self.scene.removeItem(line)
@@ -835,15 +837,6 @@ class WorkflowSettings(ConfigWidget):
             self.scene.addItem(line)
             self.inputs_in_view[(source_member_id, target_member_id)] = line
 
-    def walk_inputs_recursive(self, member_id, search_list) -> bool:  #!asyncrecdupe!# todo dupe
-        found = False
-        member_inputs = [k[0] for k, v in self.inputs_in_view.items() if k[1] == member_id and v.config.get('looper', False) is False]
-        for inp in member_inputs:
-            if inp in search_list:
-                return True
-            found = found or self.walk_inputs_recursive(inp, search_list)
-        return found
-
     def update_member(self, update_list, save=False):
         for member_id, attribute, value in update_list:
             member = self.members_in_view.get(member_id)
@@ -1636,7 +1629,7 @@ class CustomGraphicsView(QGraphicsView):
         self.setResizeAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
 
         from src.gui.style import TEXT_COLOR
-        from src.utils.helpers import apply_alpha_to_hex
+        from src.gui.helpers import apply_alpha_to_hex
         self.setBackgroundBrush(QBrush(QColor(apply_alpha_to_hex(TEXT_COLOR, 0.05))))
         self.setFrameShape(QFrame.Shape.NoFrame)
 
@@ -1,7 +1,8 @@
 from PySide6.QtWidgets import QVBoxLayout, QPushButton, QHBoxLayout
 
 from src.gui.config import ConfigTabs, ConfigFields, ConfigJsonTree, ConfigJoined, ConfigWidget
-from src.system.environments import Environment, EnvironmentSettings
+from src.gui.environments import EnvironmentSettings
+from src.system.environments import Environment
 from src.utils.helpers import convert_model_json_to_obj
 
 
@@ -8,7 +8,7 @@ from src.gui.config import ConfigFields
 from src.utils import sql
 import requests
 
-from src.utils.helpers import display_message_box
+from src.gui.helpers import display_message_box
 from src.system.providers import Provider
 
 cookie = None
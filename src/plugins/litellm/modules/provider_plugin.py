@@ -1,22 +1,28 @@
-import asyncio
 from typing import List, Dict, Any, Optional
 
-import instructor
-import litellm
-from litellm import acompletion, completion
 from pydantic import create_model
 
 from src.gui.config import ConfigFields
 from src.utils import sql
-from src.utils.helpers import network_connected, convert_model_json_to_obj, convert_to_safe_case
+from src.utils.connectivity import connectivity, classify_error, is_local_api
+from src.utils.helpers import convert_model_json_to_obj, convert_to_safe_case
+from src.utils.runtime import runtime
 from src.system.providers import Provider
 
-litellm.log_level = 'ERROR'
+
+def import_litellm():
+    """litellm (and instructor) take seconds to import, so they're imported on the first model call, not when the providers load"""
+    import litellm
+    litellm.log_level = 'ERROR'
+    return litellm
+
 
 class LitellmProvider(Provider):
     def __init__(self, parent, api_id=None):
         super().__init__(parent=parent)
         self.visible_tabs = ['Chat']
+        self.llm_providers = {}  # {(model_name, custom_provider, api_base): litellm provider}
+        self.instructor_client = None
 
         realtime_model_id = sql.get_scalar("""
             SELECT id 
@@ -92,30 +98,60 @@ class LitellmProvider(Provider):
         # if not all(msg['content'] for msg in messages):
         #     pass
 
-        ex = None
-        for i in range(5):
+        kwargs = dict(
+            model=model_name,
+            messages=messages,
+            stream=stream,
+            request_timeout=manager.clients.limits[2],
+            **(model_params or {}),
+            **self.get_client_kwargs(model_name, model_params, is_async=True),
+        )
+        if tools:
+            kwargs['tools'] = tools
+            kwargs['tool_choice'] = "auto"
+
+        async def check_connection(e):
+            # only connection errors to remote apis are worth checking the internet for
+            if classify_error(e) not in ('network', 'timeout') or is_local_api(model_name, model_params.get('api_base')):
+                return
+            if not await connectivity.is_connected():
+                raise ConnectionError('No network connection.') from e
+
+        response = await manager.scheduler.run(
+            model_obj,
+            lambda: import_litellm().acompletion(**kwargs),
+            messages=messages,
+            stream=stream,
+            on_error=check_connection,
+        )
+        connectivity.report_success()
+        return response
+
+    def get_llm_provider(self, model_name, model_params):
+        key = (model_name, model_params.get('custom_provider') or None, model_params.get('api_base') or None)
+        if key not in self.llm_providers:
             try:
-                kwargs = dict(
-                    model=model_name,
-                    messages=messages,
-                    stream=stream,
-                    request_timeout=100,
-                    **(model_params or {}),
-                )
-                if tools:
-                    kwargs['tools'] = tools
-                    kwargs['tool_choice'] = "auto"
-
-                if next(iter(messages), {}).get('role') != 'user':
-                    pass
-                return await acompletion(**kwargs)
-            except Exception as e:
-                if not network_connected():
-                    ex = ConnectionError('No network connection.')
-                    break
-                ex = e
-                await asyncio.sleep(0.3 * i)
-        raise ex
+                self.llm_providers[key] = import_litellm().get_llm_provider(
+                    model=model_name, custom_llm_provider=key[1], api_base=key[2])[1]
+            except Exception:
+                self.llm_providers[key] = None
+        return self.llm_providers[key]
+
+    def get_client_kwargs(self, model_name, model_params, is_async=False):
+        """
+        A shared OpenAI client for models that litellm calls through the OpenAI sdk (including OpenAI compatible
+        api bases), other providers use litellm's module level http handler
+        """
+        from src.system.base import manager
+        if self.get_llm_provider(model_name, model_params) != 'openai':
+            return {}
+        client = manager.clients.get_openai_client(
+            api_base=model_params.get('api_base'),
+            api_key=model_params.get('api_key'),
+            is_async=is_async,
+            max_retries=0,  # retried by the scheduler
+        )
+        return {'client': client}
 
     async def get_structured_output(self, model_obj, **kwargs):
         def create_dynamic_model(model_name: str, attributes: List[Dict[str, Any]]) -> Any:
@@ -158,17 +194,24 @@ class LitellmProvider(Provider):
         model_obj['model_params'] = {**model_obj.get('model_params', {}), **model_s_params}
         model_obj['model_params'] = {k: v for k, v in model_obj['model_params'].items() if k in accepted_keys}
 
-        client = instructor.from_litellm(completion)
+        if self.instructor_client is None:
+            import instructor
+            self.instructor_client = instructor.from_litellm(import_litellm().acompletion)
 
         model_name = model_obj['model_name']
         model_params = model_obj.get('model_params', {})
         messages = kwargs.get('messages', [])
 
-        resp = client.chat.completions.create(
-            model=model_name,
+        resp = await manager.scheduler.run(
+            model_obj,
+            lambda: self.instructor_client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                response_model=pydantic_model,
+                **(model_params or {}),
+                **self.get_client_kwargs(model_name, model_params, is_async=True),
+            ),
             messages=messages,
-            response_model=pydantic_model,
-            **(model_params or {}),
         )
         assert isinstance(resp, pydantic_model)
         return resp.json()
@@ -184,30 +227,50 @@ class LitellmProvider(Provider):
             response_stream = await self.run_model(model_obj=model_obj, messages=[{'role': 'user', 'content': prompt}], stream=True)
             output = ''
             line_count = 0
-            async for resp in response_stream:
-                if 'delta' in resp.choices[0]:
-                    delta = resp.choices[0].get('delta', {})
-                    chunk = delta.get('content', '')
-                else:
-                    chunk = resp.choices[0].get('text', '')
-
-                if chunk is None:
-                    continue
-                if '\n' in chunk:
-                    chunk = chunk.split('\n')[0]
-                    output += chunk
-                    line_count += 1
-                    if line_count >= num_lines:
-                        break
-                    output += chunk.split('\n')[1]
-                else:
-                    output += chunk
+            try:
+                async for resp in response_stream:
+                    if 'delta' in resp.choices[0]:
+                        delta = resp.choices[0].get('delta', {})
+                        chunk = delta.get('content', '')
+                    else:
+                        chunk = resp.choices[0].get('text', '')
+
+                    if chunk is None:
+                        continue
+                    if '\n' in chunk:
+                        chunk = chunk.split('\n')[0]
+                        output += chunk
+                        line_count += 1
+                        if line_count >= num_lines:
+                            break
+                        output += chunk.split('\n')[1]
+                    else:
+                        output += chunk
+            finally:
+                await response_stream.aclose()  # frees its scheduler slot after breaking early or failing
         return output
 
     def get_scalar(self, prompt, single_line=False, num_lines=0, model_obj=None):
-        loop = asyncio.get_event_loop()
-        result = loop.run_until_complete(self.get_scalar_async(prompt, single_line, num_lines, model_obj))
-        return result
+        """Blocking `get_scalar_async`, for threads other than the workflow runtime's"""
+        return runtime.run(self.get_scalar_async(prompt, single_line, num_lines, model_obj))
+
+    def get_context_window(self, model_obj):
+        context_window = self.get_model(model_obj).get('context_window')
+        if context_window:
+            return int(context_window)
+        try:
+            model_info = import_litellm().get_model_info(model_obj['model_name'])
+        except Exception:
+            return None
+        return model_info.get('max_input_tokens') or model_info.get('max_tokens')
+
+    def get_embeddings(self, texts, model_obj):
+        model_obj = convert_model_json_to_obj(model_obj)
+        accepted_keys = ['api_key', 'api_base', 'api_version', 'custom_provider']
+        model_params = {k: v for k, v in self.get_model(model_obj).items() if k in accepted_keys}
+        response = import_litellm().embedding(model=model_obj['model_name'], input=texts, **model_params,
+                                     **self.get_client_kwargs(model_obj['model_name'], model_params))
+        return [item['embedding'] for item in response.data]
 
     class ChatConfig(ConfigFields):
         def __init__(self, parent):
@@ -311,6 +374,40 @@ class LitellmProvider(Provider):
                     'row_key': 'D',
                     'default': 0.0,
                 },
+                {
+                    'text': 'Max concurrent',
+                    'type': int,
+                    'has_toggle': True,
+                    'label_width': 150,
+                    'minimum': 1,
+                    'maximum': 1000,
+                    'step': 1,
+                    'row_key': 'E',
+                    'tooltip': 'When enabled, the most calls to run at the same time for all models under this API, others wait in a queue',
+                    'default': 4,
+                },
+                {
+                    'text': 'Requests per minute',
+                    'type': int,
+                    'has_toggle': True,
+                    'label_width': 140,
+                    'minimum': 1,
+                    'maximum': 1000000,
+                    'step': 10,
+                    'row_key': 'E',
+                    'default': 60,
+                },
+                {
+                    'text': 'Tokens per minute',
+                    'type': int,
+                    'has_toggle': True,
+                    'label_width': 150,
+                    'minimum': 1,
+                    'maximum': 100000000,
+                    'step': 1000,
+                    'tooltip': 'When enabled, calls wait until the tokens of their messages and max tokens fit in the limit',
+                    'default': 100000,
+                },
             ]
 
     class ChatModelParameters(ConfigFields):
@@ -381,6 +478,40 @@ class LitellmProvider(Provider):
                     'step': 1,
                     'default': 100,
                 },
+                {
+                    'text': 'Max concurrent',
+                    'type': int,
+                    'has_toggle': True,
+                    'label_width': 125,
+                    'minimum': 1,
+                    'maximum': 1000,
+                    'step': 1,
+                    'row_key': 'E',
+                    'tooltip': 'When enabled, the most calls to run at the same time with this model, others wait in a queue',
+                    'default': 4,
+                },
+                {
+                    'text': 'Requests per minute',
+                    'type': int,
+                    'has_toggle': True,
+                    'label_width': 140,
+                    'minimum': 1,
+                    'maximum': 1000000,
+                    'step': 10,
+                    'row_key': 'E',
+                    'default': 60,
+                },
+                {
+                    'text': 'Tokens per minute',
+                    'type': int,
+                    'has_toggle': True,
+                    'label_width': 125,
+                    'minimum': 1,
+                    'maximum': 100000000,
+                    'step': 1000,
+                    'tooltip': 'When enabled, calls wait until the tokens of their messages and max tokens fit in the limit',
+                    'default': 100000,
+                },
             ]
 
     class V2VModelParameters(ConfigFields):
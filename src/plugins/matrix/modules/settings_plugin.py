@@ -6,7 +6,7 @@
 #
 # from src.gui.config import ConfigFields, get_widget_value, CHBoxLayout
 # from src.gui.widgets import find_main_widget
-# from src.utils.helpers import display_message_box
+# from src.gui.helpers import display_message_box
 #
 #
 # class Page_Settings_Matrix(ConfigFields):
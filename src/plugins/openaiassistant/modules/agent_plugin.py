@@ -1,13 +1,12 @@
 import time
 import openai
 from PySide6.QtWidgets import QMessageBox
-from openai import OpenAI
 from openai.types.beta import CodeInterpreterTool
 from openai.types.beta.assistant_stream_event import ThreadMessageDelta
 
 from src.gui.config import ConfigFields
 from src.members.agent import Agent, AgentSettings
-from src.utils.helpers import display_message_box
+from src.gui.helpers import display_message_box
 
 
 class OpenAI_Assistant(Agent):
@@ -20,15 +19,14 @@ class OpenAI_Assistant(Agent):
     #     super().load_agent()
     #     # ADD CHECK FOR CHANGED CONFIG, IF INVALID, RECREATE ASSISTANT
 
-    def find_assistant(self):  # todo rethink, maybe reintroduce instance config
+    async def find_assistant(self, instructions):  # todo rethink, maybe reintroduce instance config
         name = self.config.get('info.name', 'Assistant')
-        instructions = self.system_message()
         model = self.config.get('chat.model', 'gpt-3.5-turbo')
         code_interpreter = self.config.get('plugin.code_interpreter', True)
         pass
 
         try:
-            assistants = self.client.beta.assistants.list(limit=100)
+            assistants = await self.client.beta.assistants.list(limit=100)
 
             for assistant in assistants.data:
                 tools = assistant.tools
@@ -47,28 +45,27 @@ class OpenAI_Assistant(Agent):
         except Exception as e:
             raise e
 
-    def initialize_assistant(self):
+    async def initialize_assistant(self, system_msg):
         if self.assistant is None:
             model_name = self.config.get('chat.model', 'gpt-3.5-turbo')
             model_params = self.workflow.main.system.providers.get_model_parameters(model_name)
             api_key = model_params.get('api_key', None)
             api_base = model_params.get('api_base', None)
-            self.client = OpenAI(api_key=api_key, base_url=api_base)
+            self.client = self.workflow.main.system.clients.get_openai_client(api_base=api_base, api_key=api_key, is_async=True)
 
-            ass_id = self.find_assistant()
+            ass_id = await self.find_assistant(system_msg)
             if ass_id:
-                self.assistant = self.client.beta.assistants.retrieve(ass_id)
+                self.assistant = await self.client.beta.assistants.retrieve(ass_id)
             else:
-                self.assistant = self.create_assistant()
+                self.assistant = await self.create_assistant(system_msg)
 
-    def create_assistant(self):
+    async def create_assistant(self, system_msg):
         name = self.config.get('info.name', 'Assistant')
         model_name = self.config.get('chat.model', 'gpt-3.5-turbo')
-        system_msg = self.system_message()
 
         code_interpreter = self.config.get('plugin.Code Interpreter', True)
         tools = [] if not code_interpreter else [{"type": "code_interpreter"}]
-        return self.client.beta.assistants.create(
+        return await self.client.beta.assistants.create(
             name=name,
             instructions=system_msg,
             model=model_name,
@@ -84,11 +81,11 @@ class OpenAI_Assistant(Agent):
 
     async def stream(self, *args, **kwargs):
         if self.assistant is None:
-            self.initialize_assistant()
+            await self.initialize_assistant(await self.system_message())
 
         messages = kwargs.get('messages', [])
 
-        run = self.client.beta.threads.create_and_run(
+        run = await self.client.beta.threads.create_and_run(  # async client, a slow stream doesn't block the runtime loop
             assistant_id=self.assistant.id,
             stream=True,
             thread={
@@ -96,7 +93,7 @@ class OpenAI_Assistant(Agent):
             }
         )
 
-        for event in run:
+        async for event in run:
             if not isinstance(event, ThreadMessageDelta):
                 continue
             chunk = event.data.delta.content[0].text.value
@@ -3,11 +3,10 @@ from datetime import datetime
 import openai
 from PySide6.QtCore import QRunnable
 from PySide6.QtWidgets import QInputDialog, QMessageBox
-from openai import OpenAI
 
 from src.gui.config import ConfigDBTree, ConfigTabs, ConfigExtTree
 from src.gui.widgets import find_main_widget, find_attribute
-from src.utils.helpers import block_signals, block_pin_mode, display_message_box
+from src.gui.helpers import block_signals, block_pin_mode, display_message_box
 
 
 class Page_Settings_OAI(ConfigTabs):
@@ -27,7 +26,7 @@ class Page_Settings_OAI(ConfigTabs):
         model_params = manager.providers.get_model_parameters('gpt-3.5-turbo')  # hack to get OAI api key
         api_key = model_params.get('api_key', None)
         api_base = model_params.get('api_base', None)
-        self.client = OpenAI(api_key=api_key, base_url=api_base)
+        self.client = manager.clients.get_openai_client(api_base=api_base, api_key=api_key)
         super().load()
 
     class Page_Settings_OAI_Assistants(ConfigExtTree):
@@ -1,3 +1,5 @@
+from contextlib import aclosing
+
 from PySide6.QtGui import Qt
 from PySide6.QtWidgets import QVBoxLayout
 
@@ -9,6 +11,7 @@ from src.members.agent import AgentSettings, Agent
 # from interpreter import OpenInterpreter
 from src.plugins.openinterpreter.src import OpenInterpreter
 from src.utils.helpers import split_lang_and_code, convert_model_json_to_obj
+from src.utils.runtime import iterate_in_thread
 
 
 class Open_Interpreter(Agent):
@@ -52,30 +55,32 @@ class Open_Interpreter(Agent):
         self.agent_object.llm.api_base = model_params.get('api_base', None)
 
     async def stream(self, *args, **kwargs):
-        self.agent_object.system_message = self.system_message()  # put this here to only compute blocks when needed
-        native_messages = self.workflow.message_history.get_llm_messages(calling_member_id=self.member_id)
+        self.agent_object.system_message = await self.system_message()  # put this here to only compute blocks when needed
+        native_messages = await self.workflow.message_history.get_llm_messages(calling_member_id=self.member_id)
         messages = self.convert_messages(native_messages)
         try:
             code_lang = None
-            for chunk in self.agent_object.chat(message=messages, display=False, stream=True):
-                if chunk.get('start', False) or chunk.get('end', False):
-                    continue
+            chunks = iterate_in_thread(self.agent_object.chat(message=messages, display=False, stream=True))
+            async with aclosing(chunks):  # the interpreter streams synchronously, keep it off the runtime loop
+                async for chunk in chunks:
+                    if chunk.get('start', False) or chunk.get('end', False):
+                        continue
 
-                if chunk['type'] == 'message':
-                    yield 'assistant', chunk.get('content', '')
+                    if chunk['type'] == 'message':
+                        yield 'assistant', chunk.get('content', '')
 
-                elif chunk['type'] == 'code':
-                    if code_lang is None:
-                        code_lang = chunk['format']
-                        yield 'code', f'```{code_lang}\n'
+                    elif chunk['type'] == 'code':
+                        if code_lang is None:
+                            code_lang = chunk['format']
+                            yield 'code', f'```{code_lang}\n'
 
-                    code = chunk['content']
-                    yield 'code', code
-                elif chunk['type'] == 'confirmation':
-                    yield 'code', '\n```'
-                    break
-                else:
-                    print('Unknown chunk type:', chunk['type'])
+                        code = chunk['content']
+                        yield 'code', code
+                    elif chunk['type'] == 'confirmation':
+                        yield 'code', '\n```'
+                        break
+                    else:
+                        print('Unknown chunk type:', chunk['type'])
 
         except StopIteration as e:
             raise NotImplementedError('StopIteration')
@@ -20,6 +20,15 @@ from jupyter_client.kernelspec import KernelSpecManager
 from ..base_language import BaseLanguage
 
 DEBUG_MODE = False
+KERNEL_READY_TIMEOUT = 60
+
+# Matplotlib figures are sent back as images (%matplotlib inline), run when a kernel starts or is reset
+SETUP_CODE = """
+%matplotlib inline
+import matplotlib.pyplot as plt
+""".strip()
+
+installed_kernel_specs = {}  # {venv_path: kernel_name}
 
 # When running from an executable, ipykernel calls itself infinitely
 # This is a workaround to detect it and launch it manually
@@ -34,6 +43,8 @@ if "ipykernel_launcher" in sys.argv:
 
 
 def install_kernel_spec(venv_path, kernel_name=None):
+    if venv_path in installed_kernel_specs and kernel_name is None:
+        return installed_kernel_specs[venv_path]
     if kernel_name is None:
         kernel_name = os.path.basename(venv_path)
 
@@ -66,6 +77,7 @@ def install_kernel_spec(venv_path, kernel_name=None):
         dest = kernel_manager.install_kernel_spec(temp_dir, kernel_name=kernel_name, user=True)
 
         print(f"Kernel spec created and installed: {dest}")
+        installed_kernel_specs[venv_path] = kernel_name
         return kernel_name
     finally:
         # Clean up the temporary directory
@@ -76,11 +88,14 @@ class JupyterLanguage(BaseLanguage):
     name = "Python"
     aliases = ["py"]
 
-    def __init__(self, computer):
+    def __init__(self, computer, venv_path=None, pin_venv=False):
+        """`pin_venv` keeps the kernel on `venv_path`, otherwise it follows `computer.interpreter.venv_path`"""
         self.computer = computer
+        self.pin_venv = pin_venv
 
         kernel_name = 'python3'
-        venv_path = self.computer.interpreter.venv_path
+        if not pin_venv:
+            venv_path = self.computer.interpreter.venv_path
         if venv_path:
             kernel_name = install_kernel_spec(venv_path)
 
@@ -89,9 +104,7 @@ class JupyterLanguage(BaseLanguage):
         self.kc = self.km.client()
         self.kc.start_channels()
         self.loaded_venv = venv_path
-        while not self.kc.is_alive():
-            time.sleep(0.1)
-        time.sleep(0.5)
+        self.kc.wait_for_ready(timeout=KERNEL_READY_TIMEOUT)
 
         self.listener_thread = None
         self.finish_flag = False
@@ -110,10 +123,7 @@ matplotlib.use('{backend}')
         """.strip()
 
         # Use Inline actually, it's better I think
-        code = """
-%matplotlib inline
-import matplotlib.pyplot as plt
-""".strip()
+        code = SETUP_CODE
 
         for _ in self.run(code):
             pass
@@ -130,8 +140,13 @@ import matplotlib.pyplot as plt
         self.kc.stop_channels()
         self.km.shutdown_kernel()
 
+    def reset(self):
+        """Clears the variables and imports of the previous code, keeping the kernel process warm"""
+        for _ in self.run(f"%reset -f\n{SETUP_CODE}"):
+            pass
+
     def run(self, code):
-        if self.loaded_venv != self.computer.interpreter.venv_path:
+        if not self.pin_venv and self.loaded_venv != self.computer.interpreter.venv_path:
             self.terminate()
             self.__init__(self.computer)
 
@@ -180,7 +195,7 @@ import matplotlib.pyplot as plt
             yield {"type": "console", "format": "output", "content": json.dumps(response_dict)}
 
     def _execute_code(self, code, message_queue):
-        def iopub_message_listener():
+        def iopub_message_listener(msg_id):
             max_retries = 100
             while True:
                 # If self.finish_flag = True, and we didn't set it (we do below), we need to stop. That's our "stop"
@@ -200,6 +215,9 @@ import matplotlib.pyplot as plt
                     print("Jupyter error, retrying:", str(e))
                     continue
 
+                if msg["parent_header"].get("msg_id") != msg_id:
+                    continue  # left over from an earlier request, e.g. the kernel_info of wait_for_ready
+
                 if DEBUG_MODE:
                     print("-----------" * 10)
                     print("Message received:", msg["content"])
@@ -289,7 +307,10 @@ import matplotlib.pyplot as plt
                             }
                         )
 
-        self.listener_thread = threading.Thread(target=iopub_message_listener)
+        # The iopub messages of the request are queued by the channel until the listener reads them
+        msg_id = self.kc.execute(code)
+
+        self.listener_thread = threading.Thread(target=iopub_message_listener, args=(msg_id,))
         # self.listener_thread.daemon = True
         self.listener_thread.start()
 
@@ -298,8 +319,6 @@ import matplotlib.pyplot as plt
                 "thread is on:", self.listener_thread.is_alive(), self.listener_thread
             )
 
-        self.kc.execute(code)
-
     def detect_active_line(self, line):
         if "##active_line" in line:
             # Split the line by "##active_line" and grab the last element
@@ -313,8 +332,6 @@ import matplotlib.pyplot as plt
 
     def _capture_output(self, message_queue):
         while True:
-            time.sleep(0.1)
-
             # For async usage
             if (
                 hasattr(self.computer.interpreter, "stop_event")
@@ -330,17 +347,15 @@ import matplotlib.pyplot as plt
                     yield output
                 except queue.Empty:
                     if self.finish_flag:
-                        time.sleep(0.1)
-
-                        try:
-                            output = message_queue.get(timeout=0.1)
+                        # The listener queues every output before it sets finish_flag, drain what's left
+                        while not message_queue.empty():
+                            output = message_queue.get_nowait()
                             if DEBUG_MODE:
                                 print(output)
                             yield output
-                        except queue.Empty:
-                            if DEBUG_MODE:
-                                print("we're done")
-                            break
+                        if DEBUG_MODE:
+                            print("we're done")
+                        break
 
     def stop(self):
         self.finish_flag = True
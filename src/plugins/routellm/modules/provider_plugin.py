@@ -1,5 +1,4 @@
 import asyncio
-from litellm import acompletion
 
 from src.gui.config import ConfigFields
 from src.gui.widgets import find_main_widget
@@ -1,11 +1,19 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from src.system.apis import APIManager
 from src.system.config import ConfigManager
 from src.system.blocks import BlockManager
+from src.system.clients import ClientManager
 # from src.system.files import FileManager
 from src.system.modules import ModuleManager
 from src.system.providers import ProviderManager
+from src.system.responses import ResponseCacheManager
 from src.system.roles import RoleManager
+from src.system.scheduler import SchedulerManager
 from src.system.environments import EnvironmentManager
+from src.system.kernels import KernelPoolManager
 # from src.system.plugins import PluginManager
 # from src.system.tasks import TaskManager
 from src.system.tools import ToolManager
@@ -13,24 +21,41 @@ from src.system.vectordbs import VectorDBManager
 from src.system.venvs import VenvManager
 from src.system.workspaces import WorkspaceManager
 
+MANAGER_LOAD_WORKERS = 4
+# Managers that read other managers when they load, they load after them. The rest load concurrently
+MANAGER_DEPENDENCIES = {
+    'vectordbs': ('config',),
+}
+# Created and loaded on first use instead of at startup, they scan the filesystem, import plugins or user modules
+DEFERRED_MANAGERS = ('environments', 'venvs', 'modules')
+deferred_load_lock = threading.RLock()
+
 
 class SystemManager:
     def __init__(self):
         self.manager_classes = {
             'apis': APIManager,
             'blocks': BlockManager,
+            'clients': ClientManager,
             'config': ConfigManager,
             'providers': ProviderManager,
+            'response_cache': ResponseCacheManager,
             'modules': ModuleManager,
             'roles': RoleManager,
+            'scheduler': SchedulerManager,
             'environments': EnvironmentManager,
+            'kernels': KernelPoolManager,
             'tools': ToolManager,
             'vectordbs': VectorDBManager,
             'venvs': VenvManager,
             'workspaces': WorkspaceManager,
             # 'tasks': TaskManager,
         }
+        self.load_timings = {}  # {name: (start, end, thread_name)}, perf_counter times of the last load
+        self.loading_managers = {}  # {name: manager}, deferred managers while they load
         for name, manager in self.manager_classes.items():
+            if name in DEFERRED_MANAGERS:
+                continue
             setattr(self, name, manager(parent=self))
 
         # self.initialize_custom_managers()
@@ -50,6 +75,24 @@ class SystemManager:
         # self.workspaces = WorkspaceManager(parent=self)
         # self.tasks = TaskManager(parent=self)
 
+    def __getattr__(self, name):
+        """Creates and loads a deferred manager on first use"""
+        if name not in DEFERRED_MANAGERS:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        with deferred_load_lock:
+            if name in self.__dict__:  # loaded by another thread while this one waited
+                return self.__dict__[name]
+            if name in self.loading_managers:  # used by its own load
+                return self.loading_managers[name]
+            mgr = self.manager_classes[name](parent=self)
+            self.loading_managers[name] = mgr
+            try:
+                self.load_manager(name, mgr)
+            finally:
+                del self.loading_managers[name]
+            setattr(self, name, mgr)
+            return mgr
+
     def initialize_custom_managers(self):
         for attr_name in list(self.__dict__.keys()):
             if isinstance(getattr(self, attr_name), dict):
@@ -62,21 +105,48 @@ class SystemManager:
         for name, mgr in custom_managers.items():
             setattr(self, name, mgr(parent=self))
             if hasattr(getattr(self, name), 'load'):
-                getattr(self, name).load()
+                self.load_manager(name, getattr(self, name))
 
     def load(self, manager_name='ALL'):
         if manager_name == 'ALL':
-            initial_items = list(self.__dict__.values())  # todo dirty
-            for mgr in initial_items:  # self.__dict__.values():
-                if hasattr(mgr, 'load'):
-                    mgr.load()
-            for mgr in self.__dict__.values():
-                if mgr not in initial_items and hasattr(mgr, 'load'):
-                    mgr.load()
+            initial_items = self.get_loadable_managers()  # todo dirty
+            self.load_concurrently(initial_items)
+            self.load_concurrently({name: mgr for name, mgr in self.get_loadable_managers().items()
+                                    if name not in initial_items})  # added by a loaded module
+        elif manager_name in DEFERRED_MANAGERS and manager_name not in self.__dict__:
+            getattr(self, manager_name)  # loads it
         else:
             mgr = getattr(self, manager_name, None)
             if mgr:
-                mgr.load()
+                self.load_manager(manager_name, mgr)
+
+    def get_loadable_managers(self):
+        return {name: mgr for name, mgr in self.__dict__.items()
+                if not isinstance(mgr, dict) and hasattr(mgr, 'load')}
+
+    def load_concurrently(self, managers):
+        """Loads the managers in a thread pool, each one after the managers it depends on"""
+        if not managers:
+            return
+        futures = {}
+        with ThreadPoolExecutor(max_workers=MANAGER_LOAD_WORKERS, thread_name_prefix='ManagerLoad') as executor:
+            for name in get_load_order(managers):  # dependencies are submitted first, so they never wait on a queued load
+                dependencies = [futures[dep] for dep in MANAGER_DEPENDENCIES.get(name, ()) if dep in futures]
+                futures[name] = executor.submit(self.load_after, dependencies, name, managers[name])
+        for future in futures.values():
+            future.result()  # raise the first error
+
+    def load_after(self, dependencies, name, mgr):
+        for dependency in dependencies:
+            dependency.result()
+        self.load_manager(name, mgr)
+
+    def load_manager(self, name, mgr):
+        start = time.perf_counter()
+        try:
+            mgr.load()
+        finally:
+            self.load_timings[name] = (start, time.perf_counter(), threading.current_thread().name)
 
     def get_manager(self, name):
         return getattr(self, name, None)
@@ -99,5 +169,23 @@ class SystemManager:
                 custom_manager_defs[manager_name] = manager_class  # todo
         return custom_manager_defs
 
+def get_load_order(names):
+    """The names with the managers each one depends on before it"""
+    order = []
+
+    def visit(name, path=()):
+        if name in order or name not in names:
+            return
+        if name in path:
+            raise ValueError(f"Circular manager dependency: {' -> '.join(path + (name,))}")
+        for dependency in MANAGER_DEPENDENCIES.get(name, ()):
+            visit(dependency, path + (name,))
+        order.append(name)
+
+    for name in names:
+        visit(name)
+    return order
+
+
 manager = SystemManager()
 
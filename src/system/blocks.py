@@ -1,11 +1,15 @@
 import asyncio
+import copy
 import json
 import re
-
-from PySide6.QtWidgets import QMessageBox
+from contextvars import ContextVar
 
 from src.utils import sql
-from src.utils.helpers import receive_workflow, display_message
+from src.utils.helpers import receive_workflow, hash_config
+from src.utils.runtime import runtime
+
+# Block outputs computed in the current expansion, visible to the nested expansions of dependent blocks
+expansion_outputs = ContextVar('expansion_outputs', default=None)
 
 
 class BlockManager:
@@ -13,7 +17,7 @@ class BlockManager:
         self.parent = parent
         self.blocks = {}
 
-        self.prompt_cache = {}  # dict((prompt, model_obj): response)
+        self.turn_cache = {}  # dict((name, config_hash): response), Text and Code block outputs for the current turn
 
     def load(self):
         self.blocks = sql.get_results("""
@@ -26,25 +30,120 @@ class BlockManager:
     def to_dict(self):
         return self.blocks
 
+    def new_turn(self):
+        self.turn_cache.clear()
+
+    def get_block_type(self, name):
+        config = self.blocks.get(name, {})
+        if config.get('_TYPE', 'block') != 'block':
+            return None  # workflow blocks are never cached
+        return config.get('block_type', 'Text')
+
+    def get_cache_key(self, name):
+        return name, hash_config(self.blocks[name])
+
+    def get_cached_output(self, name):
+        outputs = expansion_outputs.get()
+        if outputs is not None and name in outputs:
+            return outputs[name]
+
+        # Prompt block responses are reused by the response cache, across turns
+        if self.get_block_type(name) in ('Text', 'Code'):
+            return self.turn_cache.get(self.get_cache_key(name))
+        return None
+
+    def set_cached_output(self, name, output):
+        if self.get_block_type(name) in ('Text', 'Code'):
+            self.turn_cache[self.get_cache_key(name)] = output
+
+    def get_block_dependencies(self, name):
+        if self.get_block_type(name) not in ('Text', 'Prompt'):
+            return []
+        placeholders = re.findall(r'\{(.+?)\}', self.blocks[name].get('data', ''))
+        return [placeholder for placeholder in placeholders if placeholder in self.blocks]
+
+    def get_block_levels(self, names):
+        """Groups blocks into levels that can be computed concurrently, where each level only depends on previous levels"""
+        depths = {}
+        path = []
+
+        def visit(name):
+            if name in depths:
+                return depths[name]
+            if name in path:
+                cycle = path[path.index(name):] + [name]
+                raise RecursionError(f"Circular reference detected in blocks: {' -> '.join(cycle)}")
+            path.append(name)
+            depth = max((visit(dep) + 1 for dep in self.get_block_dependencies(name)), default=0)
+            path.pop()
+            depths[name] = depth
+            return depth
+
+        for name in names:
+            visit(name)
+
+        levels = [[] for _ in range(max(depths.values(), default=-1) + 1)]
+        for name, depth in depths.items():
+            levels[depth].append(name)
+        return levels
+
     async def receive_block(self, name, params=None):
-        self.load()  # todo temp, find out why model_params getting reset
-        wf_config = self.blocks[name]
+        wf_config = copy.deepcopy(self.blocks[name])  # the workflow can modify its config
         async for key, chunk in receive_workflow(wf_config, kind='BLOCK', params=params, chat_title=name):
             yield key, chunk
 
     async def compute_block_async(self, name, params=None):
-        response = ''
-        async for key, chunk in self.receive_block(name, params=params):
-            response += chunk
+        if params is None:
+            cached_output = self.get_cached_output(name)
+            if cached_output is not None:
+                return cached_output
+
+        if params is None and self.get_block_type(name) == 'Text':
+            # Text blocks are just their expanded data, no need for a workflow (and a new context)
+            response = await self.format_string_async(self.blocks[name].get('data', ''))
+        else:
+            response = ''
+            async for key, chunk in self.receive_block(name, params=params):
+                response += chunk
+
+        if params is None:
+            self.set_cached_output(name, response)
         return response
 
+    async def compute_blocks_async(self, names):
+        """Computes blocks and the blocks they depend on, running independent blocks concurrently"""
+        outputs = expansion_outputs.get()
+        token = None
+        if outputs is None:
+            outputs = {}
+            token = expansion_outputs.set(outputs)
+
+        try:
+            for level in self.get_block_levels(names):
+                level = [name for name in level if name not in outputs]
+                level_outputs = await asyncio.gather(*(self.compute_block_async(name) for name in level))
+                outputs.update(zip(level, level_outputs))
+            return {name: outputs[name] for name in names}
+        finally:
+            if token is not None:
+                expansion_outputs.reset(token)
+
     def compute_block(self, name, params=None):  # , visited=None, ):
-        return asyncio.run(self.compute_block_async(name, params))
-        # loop = asyncio.get_event_loop()
-        # return loop.run_until_complete(self.compute_block_async(name, params))
+        """Blocking `compute_block_async`, for threads other than the workflow runtime's"""
+        return runtime.run(self.compute_block_async(name, params))
 
+    async def compute_cached_blocks_async(self, names):
+        outputs = {name: self.get_cached_output(name) for name in names}
+        missing_names = [name for name, output in outputs.items() if output is None]
+        if missing_names:
+            outputs.update(await self.compute_blocks_async(missing_names))
+        return outputs
 
-    def format_string(self, content, ref_workflow=None, additional_blocks=None):  # , ref_config=None):
+    def format_string(self, content, ref_workflow=None, additional_blocks=None):
+        """Blocking `format_string_async`, for threads other than the workflow runtime's"""
+        return runtime.run(self.format_string_async(content, ref_workflow, additional_blocks))
+
+    async def format_string_async(self, content, ref_workflow=None, additional_blocks=None):  # , ref_config=None):
         all_params = {}
 
         if ref_workflow:
@@ -67,16 +166,12 @@ class BlockManager:
             # Recursively process placeholders
             placeholders = re.findall(r'\{(.+?)\}', content)
 
-            visited = set()
-
-            # Process each placeholder  todo clean duplicate code
-            for placeholder in placeholders:
-                if placeholder in self.blocks:
-                    if placeholder == 'ok':
-                        pass
-                    replacement = self.compute_block(placeholder)  # , visited.copy())
-                    content = content.replace(f'{{{placeholder}}}', replacement)
-                # If placeholder doesn't exist, leave it as is
+            # Compute the referenced blocks, independent blocks run concurrently
+            block_names = list(dict.fromkeys(p for p in placeholders if p in self.blocks))
+            block_outputs = await self.compute_cached_blocks_async(block_names) if block_names else {}
+            for name, output in block_outputs.items():
+                content = content.replace(f'{{{name}}}', output)
+            # If placeholder doesn't exist, leave it as is
 
             for key, text in all_params.items():
                 content = content.replace(f'{{{key}}}', text)
@@ -84,8 +179,6 @@ class BlockManager:
             return content
 
         except RecursionError as e:
-            display_message(self,
-                message=str(e),
-                icon=QMessageBox.Warning,
-            )
+            # formatted on the runtime thread, so there's no widget to show it in
+            print(f"Error formatting blocks: {e}")
             return content
@@ -0,0 +1,94 @@
+import asyncio
+import importlib.util
+import threading
+
+import httpx
+
+
+class ClientManager:
+    """
+    Shared keep-alive http clients, one per (api_base, api_key), so provider calls reuse their TCP/TLS connections
+    across turns instead of setting them up for every message.
+    Async clients are bound to the loop that uses them (usually the workflow runtime loop), so they're kept per loop.
+    HTTP/2 is used when the `h2` package is installed.
+    """
+    def __init__(self, parent):
+        self.parent = parent
+        self.clients = {}  # {(api_base, api_key, loop): (limits, httpx.Client | httpx.AsyncClient)}
+        self.openai_clients = {}  # {(api_base, api_key, loop, is_async, kwargs): (http_client, OpenAI | AsyncOpenAI)}
+        self.http2 = importlib.util.find_spec('h2') is not None
+        self.lock = threading.Lock()
+
+    @property
+    def limits(self):
+        config = self.parent.config.dict
+        return (
+            config.get('system.http_max_connections', 20),
+            config.get('system.http_keepalive_connections', 10),
+            config.get('system.http_timeout', 100),
+        )
+
+    def get_http_client(self, api_base=None, api_key=None, is_async=False) -> httpx.Client | httpx.AsyncClient:
+        """The shared client of the api, for async clients call it from the loop that will use it"""
+        loop = asyncio.get_running_loop() if is_async else None
+        key = (api_base or '', api_key or '', loop)
+        limits = self.limits
+        with self.lock:
+            limits_and_client = self.clients.get(key)
+            if limits_and_client and limits_and_client[0] == limits and not getattr(limits_and_client[1], 'is_closed', False):
+                return limits_and_client[1]
+            if limits_and_client:  # the pool settings changed
+                self.close_client(limits_and_client[1], loop)
+            self.remove_closed_loops()
+
+            max_connections, keepalive_connections, timeout = limits
+            client_class = httpx.AsyncClient if is_async else httpx.Client
+            client = client_class(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=keepalive_connections),
+                timeout=httpx.Timeout(timeout, connect=min(timeout, 10)),
+                http2=self.http2,
+                follow_redirects=True,
+            )
+            self.clients[key] = (limits, client)
+            return client
+
+    def get_openai_client(self, api_base=None, api_key=None, is_async=False, **kwargs):
+        """An OpenAI sdk client on the shared http client of the api, extra kwargs are passed to the client class"""
+        from openai import OpenAI, AsyncOpenAI
+        http_client = self.get_http_client(api_base, api_key, is_async=is_async)
+        loop = asyncio.get_running_loop() if is_async else None
+        key = (api_base or '', api_key or '', loop, is_async, tuple(sorted(kwargs.items())))
+        with self.lock:
+            http_client_and_client = self.openai_clients.get(key)
+            if http_client_and_client and http_client_and_client[0] is http_client:
+                return http_client_and_client[1]
+            client_class = AsyncOpenAI if is_async else OpenAI
+            client = client_class(api_key=api_key or None, base_url=api_base or None, http_client=http_client, **kwargs)
+            self.openai_clients[key] = (http_client, client)
+            return client
+
+    def close_client(self, client, loop=None):
+        if isinstance(client, httpx.AsyncClient):
+            if loop is not None and not loop.is_closed():
+                loop.create_task(client.aclose())
+        else:
+            client.close()
+
+    def remove_closed_loops(self):
+        for key in [key for key in self.clients if key[2] is not None and key[2].is_closed()]:
+            del self.clients[key]
+        for key in [key for key in self.openai_clients if key[2] is not None and key[2].is_closed()]:
+            del self.openai_clients[key]
+
+    def close(self, timeout=2):
+        """Closes every client, call it from outside the loops of the async clients (e.g. on exit)"""
+        with self.lock:
+            clients, self.clients, self.openai_clients = self.clients, {}, {}
+        for (_, _, loop), (_, client) in clients.items():
+            if loop is None:
+                client.close()
+            elif loop.is_running():
+                try:
+                    asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout)
+                except Exception:
+                    pass
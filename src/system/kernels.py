@@ -0,0 +1,253 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PYTHON_LANGUAGES = ('python', 'py')
+
+
+class KernelPoolManager:
+    """
+    Warm Jupyter kernels for running python code, pooled per (environment, venv), so code blocks and tools
+    don't cold start a kernel when they run in a different venv than the last call.
+    Each pool keeps `spares` started kernels ready besides the ones in use, and kernels idle for longer than
+    `idle_timeout` seconds are shut down. A kernel runs one call at a time.
+    """
+    def __init__(self, parent):
+        self.parent = parent
+        self.pools = {}  # {(environment, venv_path): KernelPool}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='Kernel')
+        self.reaper_thread = None
+        self.stopped = threading.Event()
+
+    @property
+    def settings(self):
+        config = self.parent.config.dict
+        return (
+            config.get('system.kernel_spares', 1),
+            config.get('system.kernel_idle_timeout', 600),
+            config.get('system.kernel_max_per_pool', 4),
+        )
+
+    def create_language(self, venv_path):
+        """A started Open Interpreter python language, pinned to the venv"""
+        from src.plugins.openinterpreter.src import interpreter
+        from src.plugins.openinterpreter.src.core.computer.terminal.languages.python import Python
+        return Python(interpreter.computer, venv_path=venv_path, pin_venv=True)
+
+    def get_pool(self, environment, venv_path):
+        key = (environment, venv_path)
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool is None:
+                pool = KernelPool(self, venv_path)
+                self.pools[key] = pool
+            if self.reaper_thread is None:
+                self.reaper_thread = threading.Thread(target=self.reap_idle_kernels, name='KernelReaper', daemon=True)
+                self.reaper_thread.start()
+            return pool
+
+    def run_code(self, environment, code, venv_path=None, reset=False):
+        """
+        Runs python code on a warm kernel of the environment and venv, returning the output chunks.
+        With `reset` the kernel's variables are cleared after the call, before another call can use it.
+        """
+        pool = self.get_pool(environment, venv_path)
+        kernel = pool.acquire()
+        try:
+            chunks = kernel.run(code)
+        except Exception:
+            pool.discard(kernel)
+            raise
+        pool.release(kernel, reset=reset)
+        return chunks
+
+    def reap_idle_kernels(self):
+        while True:
+            _, idle_timeout, _ = self.settings
+            if self.stopped.wait(max(1.0, min(30.0, idle_timeout / 4))):
+                return
+            now = time.monotonic()
+            with self.lock:
+                pools = list(self.pools.values())
+            for pool in pools:
+                pool.reap(now, idle_timeout)
+
+    def get_stats(self):
+        with self.lock:
+            pools = list(self.pools.items())
+        return [{'venv_path': venv_path, **pool.get_stats()} for (_, venv_path), pool in pools]
+
+    def close(self):
+        """Shuts down every kernel, on exit"""
+        self.stopped.set()
+        with self.lock:
+            pools, self.pools = list(self.pools.values()), {}
+        for pool in pools:
+            pool.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class KernelPool:
+    """The kernels of one (environment, venv)"""
+    def __init__(self, manager, venv_path):
+        self.manager = manager
+        self.venv_path = venv_path
+        self.idle = []  # [PooledKernel], most recently used last
+        self.busy = set()
+        self.starting = 0  # kernels starting for a waiting call
+        self.warming = 0  # spare kernels starting
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """A ready kernel, waiting for a spare or a busy kernel when the pool is full"""
+        _, _, max_kernels = self.manager.settings
+        kernel = None
+        with self.condition:
+            while kernel is None:
+                while self.idle and kernel is None:
+                    kernel = self.idle.pop()
+                    if not kernel.is_alive():
+                        self.manager.executor.submit(kernel.shutdown)
+                        kernel = None
+                if kernel is not None:
+                    self.busy.add(kernel)
+                elif self.warming == 0 and self.count() < max_kernels:
+                    self.starting += 1
+                    break
+                else:
+                    self.condition.wait()
+
+        if kernel is None:
+            try:
+                kernel = self.start_kernel()
+            finally:
+                with self.condition:
+                    self.starting -= 1
+            with self.condition:
+                self.busy.add(kernel)
+
+        self.fill_spares()
+        return kernel
+
+    def count(self):
+        return len(self.idle) + len(self.busy) + self.starting + self.warming
+
+    def start_kernel(self):
+        return PooledKernel(self.manager.create_language(self.venv_path))
+
+    def fill_spares(self):
+        spares, _, max_kernels = self.manager.settings
+        with self.condition:
+            if self.closed:
+                return
+            needed = min(spares - len(self.idle) - self.warming, max_kernels - self.count())
+            self.warming += max(0, needed)
+        for _ in range(needed):
+            self.manager.executor.submit(self.warm_spare)
+
+    def warm_spare(self):
+        try:
+            kernel = self.start_kernel()
+        except Exception as e:
+            print(f"Failed to start a spare kernel for `{self.venv_path}`: {e}")
+            kernel = None
+        with self.condition:
+            self.warming -= 1
+            if kernel is not None and not self.closed:
+                self.idle.insert(0, kernel)  # behind the used kernels, whose imports are already loaded
+                kernel = None
+            self.condition.notify_all()
+        if kernel is not None:
+            kernel.shutdown()
+
+    def release(self, kernel, reset=False):
+        if reset:
+            self.manager.executor.submit(self.reset_and_free, kernel)
+        else:
+            self.free(kernel)
+
+    def reset_and_free(self, kernel):
+        try:
+            kernel.reset()
+        except Exception:
+            self.discard(kernel)
+            return
+        self.free(kernel)
+
+    def free(self, kernel):
+        with self.condition:
+            self.busy.discard(kernel)
+            kernel.last_used = time.monotonic()
+            closed = self.closed
+            if not closed:
+                self.idle.append(kernel)
+            self.condition.notify_all()
+        if closed:
+            kernel.shutdown()
+
+    def discard(self, kernel):
+        with self.condition:
+            self.busy.discard(kernel)
+            self.condition.notify_all()
+        kernel.shutdown()
+
+    def reap(self, now, idle_timeout):
+        with self.condition:
+            expired = [kernel for kernel in self.idle if now - kernel.last_used > idle_timeout]
+            self.idle = [kernel for kernel in self.idle if kernel not in expired]
+        for kernel in expired:
+            kernel.shutdown()
+
+    def get_stats(self):
+        with self.condition:
+            return {'idle': len(self.idle), 'busy': len(self.busy), 'starting': self.starting + self.warming}
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            kernels, self.idle = self.idle + list(self.busy), []
+        for kernel in kernels:
+            kernel.shutdown()
+
+
+class PooledKernel:
+    """A started kernel, locked while it runs a call"""
+    def __init__(self, language):
+        self.language = language
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    def is_alive(self):
+        km = getattr(self.language, 'km', None)
+        return km is None or km.is_alive()
+
+    def run(self, code):
+        with self.lock:
+            return list(self.language.run(code))
+
+    def reset(self):
+        with self.lock:
+            self.language.reset()
+
+    def shutdown(self):
+        try:
+            self.language.terminate()
+        except Exception:
+            pass
+
+
+def merge_output_chunks(chunks):
+    """Joins consecutive chunks of the same type and format, dropping active lines, like `Terminal.run`"""
+    output_messages = []
+    for chunk in chunks:
+        if chunk.get('format') == 'active_line':
+            continue
+        if (output_messages
+                and output_messages[-1].get('type') == chunk['type']
+                and output_messages[-1].get('format') == chunk['format']):
+            output_messages[-1]['content'] += chunk['content']
+        else:
+            output_messages.append(dict(chunk))
+    return output_messages
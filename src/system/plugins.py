@@ -1,72 +1,49 @@
+import importlib
 
-from src.members.agent import AgentSettings
-from src.members.block import TextBlockSettings, CodeBlockSettings, PromptBlockSettings, TextBlock, CodeBlock, \
-    PromptBlock, ModuleBlock, ModuleBlockSettings, ModuleMethodSettings, ModuleVariableSettings
-from src.plugins.docker.modules.sandbox_plugin import Docker, DockerSettings
-
-# PROVIDER PLUGINS
-from src.plugins.fakeyou.modules.provider_plugin import FakeYouProvider
-from src.plugins.litellm.modules.provider_plugin import LitellmProvider
-
-# AGENT PLUGINS
-from src.plugins.openaiassistant.modules.agent_plugin import OpenAI_Assistant, OAIAssistantSettings
-from src.plugins.openinterpreter.modules.agent_plugin import OpenInterpreterSettings, Open_Interpreter
-
-# SANDBOX PLUGINS
-# from src.plugins.e2b.modules.sandbox_plugin import E2BEnvironment
-# from src.plugins.openllm.modules.provider_plugin import OpenllmProvider
-from src.plugins.routellm.modules.provider_plugin import RoutellmProvider
-
-
-class PluginManager:
-    def __init__(self):
-        pass
-
-    def load(self):
-        pass
-
-
+# Plugins are imported when they're first used (`get_plugin_class`), so the heavy ones (Open Interpreter,
+# the OpenAI assistant, litellm and routellm) aren't imported before the window shows.
+# Entries are `module.path.ClassName` import paths, list types are looked up by class name.
 ALL_PLUGINS = {
     'Agent': [
-        Open_Interpreter,
-        # CrewAI_Agent,
-        OpenAI_Assistant,
-        # Agent_Zero,
+        'src.plugins.openinterpreter.modules.agent_plugin.Open_Interpreter',
+        # 'CrewAI_Agent',
+        'src.plugins.openaiassistant.modules.agent_plugin.OpenAI_Assistant',
+        # 'Agent_Zero',
     ],
     'AgentSettings': {
-        'Open_Interpreter': OpenInterpreterSettings,
+        'Open_Interpreter': 'src.plugins.openinterpreter.modules.agent_plugin.OpenInterpreterSettings',
         # 'CrewAI_Agent': CrewAIAgentSettings,
-        'OpenAI_Assistant': OAIAssistantSettings,
+        'OpenAI_Assistant': 'src.plugins.openaiassistant.modules.agent_plugin.OAIAssistantSettings',
         # 'Agent_Zero': AgentSettings,
     },
     'Block': {
-        'Text': TextBlock,
-        'Code': CodeBlock,
-        'Prompt': PromptBlock,
-        'Module': ModuleBlock,
+        'Text': 'src.members.block.TextBlock',
+        'Code': 'src.members.block.CodeBlock',
+        'Prompt': 'src.members.block.PromptBlock',
+        'Module': 'src.members.block.ModuleBlock',
     },
     'BlockSettings': {
-        'Text': TextBlockSettings,
-        'Code': CodeBlockSettings,
-        'Prompt': PromptBlockSettings,
-        'Module': ModuleBlockSettings,
+        'Text': 'src.members.block.TextBlockSettings',
+        'Code': 'src.members.block.CodeBlockSettings',
+        'Prompt': 'src.members.block.PromptBlockSettings',
+        'Module': 'src.members.block.ModuleBlockSettings',
     },
     'ModuleTargetSettings': {  # todo remove from plugins & integrate
-        'Method': ModuleMethodSettings,
-        'Variable': ModuleVariableSettings,
+        'Method': 'src.members.block.ModuleMethodSettings',
+        'Variable': 'src.members.block.ModuleVariableSettings',
     },
     'Provider': {
-        # 'openllm': OpenllmProvider,
-        'litellm': LitellmProvider,
-        'fakeyou': FakeYouProvider,
-        'routellm': RoutellmProvider,
+        # 'openllm': 'src.plugins.openllm.modules.provider_plugin.OpenllmProvider',
+        'litellm': 'src.plugins.litellm.modules.provider_plugin.LitellmProvider',
+        'fakeyou': 'src.plugins.fakeyou.modules.provider_plugin.FakeYouProvider',
+        'routellm': 'src.plugins.routellm.modules.provider_plugin.RoutellmProvider',
     },
     'Environment': [
-        # E2BEnvironment,
-        Docker,
+        # 'src.plugins.e2b.modules.sandbox_plugin.E2BEnvironment',
+        'src.plugins.docker.modules.sandbox_plugin.Docker',
     ],
     'EnvironmentSettings': {
-        'Docker': DockerSettings
+        'Docker': 'src.plugins.docker.modules.sandbox_plugin.DockerSettings',
         # 'E2BSandbox': E2BSandboxSettings,
     },
     'Workflow': {
@@ -86,6 +63,33 @@ ALL_PLUGINS = {
     # # ],
 }
 
+plugin_classes = {}  # {import_path: class}
+
+
+class PluginManager:
+    def __init__(self):
+        pass
+
+    def load(self):
+        pass
+
+
+def import_plugin(import_path):
+    clss = plugin_classes.get(import_path)
+    if clss is None:
+        module_name, class_name = import_path.rsplit('.', 1)
+        clss = getattr(importlib.import_module(module_name), class_name)
+        plugin_classes[import_path] = clss
+    return clss
+
+
+def get_plugin_names(plugin_type):
+    """The plugin names of the type, without importing them"""
+    type_plugins = ALL_PLUGINS[plugin_type]
+    if isinstance(type_plugins, list):
+        return [import_path.rsplit('.', 1)[-1] for import_path in type_plugins]
+    return list(type_plugins)
+
 
 def get_plugin_class(plugin_type, plugin_name, default_class=None):
     # if kwargs is None:
@@ -93,16 +97,17 @@ def get_plugin_class(plugin_type, plugin_name, default_class=None):
 
     type_plugins = ALL_PLUGINS[plugin_type]
     if isinstance(type_plugins, list):
-        clss = next((AC for AC in type_plugins if AC.__name__ == plugin_name), None)
+        import_path = next((p for p in type_plugins if p.rsplit('.', 1)[-1] == plugin_name), None)
     else:  # is dict
-        clss = type_plugins.get(plugin_name, None)
-    if clss is None:
-        clss = default_class
-    return clss
+        import_path = type_plugins.get(plugin_name, None)
+    if import_path is None:
+        return default_class
+    return import_plugin(import_path)
 
 
 def get_plugin_agent_settings(plugin_name):
-    clss = ALL_PLUGINS['AgentSettings'].get(plugin_name, AgentSettings)
+    from src.members.agent import AgentSettings
+    clss = get_plugin_class('AgentSettings', plugin_name, default_class=AgentSettings)
 
     class AgentMemberSettings(clss):
         def __init__(self, parent):
@@ -132,7 +137,8 @@ def get_plugin_agent_settings(plugin_name):
 def get_plugin_block_settings(plugin_name):
     if not plugin_name:
         plugin_name = 'Text'
-    clss = ALL_PLUGINS['BlockSettings'].get(plugin_name, TextBlockSettings)  # , None)
+    from src.members.block import TextBlockSettings
+    clss = get_plugin_class('BlockSettings', plugin_name, default_class=TextBlockSettings)
 
     class BlockMemberSettings(clss):
         def __init__(self, parent):
@@ -160,5 +166,5 @@ def get_plugin_block_settings(plugin_name):
 
 
 def get_plugin_workflow_config(plugin_name):
-    clss = ALL_PLUGINS['WorkflowConfig'].get(plugin_name, None)
+    clss = get_plugin_class('WorkflowConfig', plugin_name)
     return clss
@@ -1,9 +1,12 @@
+import asyncio
 import json
 import os
 from abc import abstractmethod
 
+from src.system.scheduler import RATE_LIMIT_KEYS
 from src.utils import sql
 from src.utils.helpers import convert_model_json_to_obj
+from src.utils.runtime import runtime
 
 
 class ProviderManager:
@@ -69,6 +72,21 @@ class ProviderManager:
             return None
         return await provider.get_structured_output(model_obj, **kwargs)
 
+    def get_context_window(self, model_obj):
+        """Max input tokens of the model, or None if unknown"""
+        model_obj = convert_model_json_to_obj(model_obj)
+        provider = self.providers.get(model_obj.get('provider'))
+        if not hasattr(provider, 'get_context_window'):
+            return None
+        return provider.get_context_window(model_obj)
+
+    def get_embeddings(self, texts, model_obj):
+        model_obj = convert_model_json_to_obj(model_obj)
+        provider = self.providers.get(model_obj['provider'])
+        if not hasattr(provider, 'get_embeddings'):
+            return None
+        return provider.get_embeddings(texts, model_obj)
+
     def get_model_parameters(self, model_obj, incl_api_data=True):
         model_obj = convert_model_json_to_obj(model_obj)
         model_provider = self.providers.get(model_obj.get('provider'))
@@ -77,11 +95,31 @@ class ProviderManager:
         return model_provider.get_model_parameters(model_obj, incl_api_data)
 
     def get_scalar(self, prompt, single_line=False, num_lines=0, model_obj=None):
+        """Blocking `get_scalar_async`, for threads other than the workflow runtime's"""
+        return runtime.run(self.get_scalar_async(prompt, single_line, num_lines, model_obj))
+
+    async def get_scalar_async(self, prompt, single_line=False, num_lines=0, model_obj=None):
         model_obj = convert_model_json_to_obj(model_obj)
         provider = self.providers.get(model_obj['provider'])
         if not hasattr(provider, 'get_scalar'):
             return None
-        return provider.get_scalar(prompt, single_line, num_lines, model_obj)
+
+        response_cache = self.parent.response_cache
+        if not response_cache.enabled:
+            return await self.run_scalar(provider, prompt, single_line, num_lines, model_obj)
+
+        messages = [{'role': 'user', 'content': prompt}]
+        cache_key = response_cache.get_key(model_obj, messages, single_line=single_line, num_lines=num_lines)
+        output = response_cache.get(cache_key)
+        if output is None:
+            output = await self.run_scalar(provider, prompt, single_line, num_lines, model_obj)
+            response_cache.set(cache_key, output)
+        return output
+
+    async def run_scalar(self, provider, prompt, single_line, num_lines, model_obj):
+        if hasattr(provider, 'get_scalar_async'):
+            return await provider.get_scalar_async(prompt, single_line, num_lines, model_obj)
+        return await asyncio.to_thread(provider.get_scalar, prompt, single_line, num_lines, model_obj)
 
 
 class Provider:
@@ -92,10 +130,16 @@ class Provider:
         self.api_ids = {}
         self.model_api_ids = {}
         self.model_aliases = {}
+        self.api_limits = {}  # {api_id: {limit_key: value}}, shared by the models of the api
+        self.model_limits = {}  # {model_key: {limit_key: value}}
 
     def insert_model(self, model_name, alias, model_config, kind, api_id, api_name, api_config, api_key):
+        api_config, model_config = json.loads(api_config), json.loads(model_config)
+        self.api_limits[api_id] = {k: api_config[k] for k in RATE_LIMIT_KEYS if api_config.get(k)}
+        self.model_limits[(kind, model_name)] = {k: model_config[k] for k in RATE_LIMIT_KEYS if model_config.get(k)}
+
         # model_config overrides api_config
-        model_config = {**json.loads(api_config), **json.loads(model_config)}
+        model_config = {**api_config, **model_config}
         if api_key != '':
             # model_config['api_key'] = api_key
             model_config['api_key'] = os.environ.get(api_key[1:], 'NA') if api_key.startswith('$') else api_key
@@ -0,0 +1,139 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.utils import sql
+from src.utils.helpers import hash_config, convert_model_json_to_obj
+
+
+class ResponseCacheManager:
+    """
+    Opt-in on-disk cache of LLM responses, used by Prompt blocks and `get_scalar`.
+    Responses are keyed by a hash of the model, its effective parameters and the messages,
+    stored in `response_cache.db` next to the database, and evicted by TTL and least recently used.
+    """
+    def __init__(self, parent):
+        self.parent = parent
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = None
+        self.db_path = None
+
+    @property
+    def enabled(self):
+        return self.parent.config.dict.get('system.response_cache', False)
+
+    @property
+    def ttl(self):
+        return self.parent.config.dict.get('system.response_cache_ttl', None)  # seconds, None = never expires
+
+    @property
+    def max_size(self):
+        max_size_mb = self.parent.config.dict.get('system.response_cache_size', 50)
+        return max_size_mb * 1024 * 1024
+
+    def get_connection(self):
+        db_path = os.path.join(os.path.dirname(sql.get_db_path()), 'response_cache.db')
+        if self.conn is None or db_path != self.db_path:
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)")
+            self.db_path = db_path
+        return self.conn
+
+    def get_key(self, model_obj, messages, **kwargs):
+        """Hashes the model name, its effective parameters (without credentials) and the messages"""
+        model_obj = convert_model_json_to_obj(model_obj)
+        model_params = {
+            **self.parent.providers.get_model_parameters(model_obj, incl_api_data=False),
+            **model_obj.get('model_params', {}),
+        }
+        model_params.pop('api_key', None)
+        return hash_config({
+            'model_name': model_obj.get('model_name'),
+            'provider': model_obj.get('provider'),
+            'model_params': dict(sorted(model_params.items())),
+            'messages': messages,
+            **kwargs,
+        })
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+
+        with self.lock:
+            conn = self.get_connection()
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row and self.ttl and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key, response):
+        if not self.enabled:
+            return
+
+        response_json = json.dumps(response)
+        now = time.time()
+        with self.lock:
+            conn = self.get_connection()
+            conn.execute("""
+                INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?)""", (key, response_json, len(response_json), now, now))
+            self.evict(conn)
+
+    def evict(self, conn):
+        if self.ttl:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+
+        total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self.max_size:
+            return
+
+        # delete the least recently used responses until the cache fits
+        conn.execute("""
+            DELETE FROM responses
+            WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS running_size
+                    FROM responses
+                )
+                WHERE running_size > ?
+            )""", (self.max_size,))
+
+    def clear(self):
+        with self.lock:
+            self.get_connection().execute("DELETE FROM responses")
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        stats = {'hits': self.hits, 'misses': self.misses, 'entries': 0, 'size': 0}
+        if self.conn is None and not self.enabled:
+            return stats  # don't create the cache file until it's used
+
+        with self.lock:
+            entries, total_size = self.get_connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        stats.update(entries=entries, size=total_size)
+        return stats
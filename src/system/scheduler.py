@@ -0,0 +1,316 @@
+import asyncio
+import collections
+import email.utils
+import inspect
+import random
+import time
+
+from src.utils.helpers import convert_model_json_to_obj
+from src.utils.tokens import count_tokens
+
+RATE_LIMIT_KEYS = ('max_concurrent', 'requests_per_minute', 'tokens_per_minute')
+NON_RETRYABLE_STATUS_CODES = (400, 401, 403, 404, 422)
+
+
+class SchedulerManager:
+    """
+    Schedules LLM calls within the limits of their api and model (from the `apis` and `models` configs):
+    concurrent calls, requests per minute and tokens per minute.
+    Failed calls are retried with jittered exponential backoff, a rate limited call pauses every call of its api
+    and model until the Retry-After of the response.
+    """
+    def __init__(self, parent):
+        self.parent = parent
+        self.limiters = {}  # {key: RateLimiter}
+        self.max_retries = 5
+        self.base_delay = 1.0
+        self.max_delay = 60.0
+
+    def get_limiters(self, model_obj):
+        """The limiters a call to the model has to pass, the model's first and then its api's"""
+        model_obj = convert_model_json_to_obj(model_obj)
+        provider = self.parent.providers.providers.get(model_obj.get('provider'))
+        if provider is None:
+            return []
+        model_key = (model_obj.get('kind'), model_obj.get('model_name'))
+        api_id = provider.model_api_ids.get(model_key)
+        return [
+            self.get_limiter(('model', *model_key), provider.model_aliases.get(model_key, model_key[1]),
+                             provider.model_limits.get(model_key, {})),
+            self.get_limiter(('api', api_id), provider.api_ids.get(api_id, 'Unknown API'),
+                             provider.api_limits.get(api_id, {})),
+        ]
+
+    def get_limiter(self, key, name, limits):
+        limiter = self.limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(name)
+            self.limiters[key] = limiter
+        limiter.configure(limits)
+        return limiter
+
+    async def run(self, model_obj, request, messages=None, stream=False, on_error=None):
+        """
+        Awaits `request()` within the limits of the model, retrying failed calls.
+        A stream keeps its slot until it's consumed or closed. `on_error(e)`, sync or async, can raise to stop retrying.
+        """
+        model_obj = convert_model_json_to_obj(model_obj)
+        limiters = self.get_limiters(model_obj)
+        tokens = 0
+        if any(limiter.tokens for limiter in limiters):
+            tokens = self.estimate_tokens(model_obj, messages or [])
+
+        for attempt in range(self.max_retries):
+            acquired = []
+            try:
+                for limiter in limiters:
+                    await limiter.acquire(tokens)
+                    acquired.append(limiter)
+                response = await request()
+            except Exception as e:
+                for limiter in acquired:
+                    limiter.release()
+                if attempt == self.max_retries - 1 or getattr(e, 'status_code', None) in NON_RETRYABLE_STATUS_CODES:
+                    raise
+                if on_error:
+                    result = on_error(e)
+                    if inspect.isawaitable(result):
+                        await result
+
+                delay = self.get_retry_delay(e, attempt)
+                if is_rate_limit_error(e):
+                    for limiter in limiters:
+                        limiter.back_off(delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+            except BaseException:  # cancelled
+                for limiter in acquired:
+                    limiter.release()
+                raise
+
+            if stream:
+                return ScheduledStream(response, acquired)
+            for limiter in acquired:
+                limiter.release()
+            return response
+
+    def estimate_tokens(self, model_obj, messages):
+        """Tokens of the messages plus the max tokens of the response"""
+        model_name = model_obj.get('model_name')
+        tokens = sum(count_tokens(msg.get('content') if isinstance(msg.get('content'), str) else str(msg.get('content')),
+                                  model_name) for msg in messages)
+        return tokens + (model_obj.get('model_params', {}).get('max_tokens') or 0)
+
+    def get_retry_delay(self, e, attempt):
+        retry_after = get_retry_after(e)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def get_stats(self):
+        """Totals and per limiter stats, of the limiters that were used"""
+        now = time.monotonic()
+        used = {key: limiter.get_stats(now) for key, limiter in self.limiters.items()
+                if limiter.completed or limiter.active or limiter.waiting}
+        model_stats = [stats for key, stats in used.items() if key[0] == 'model']
+        return {
+            'running': sum(stats['running'] for stats in model_stats),
+            'waiting': sum(stats['waiting'] for stats in model_stats),
+            'rate_limited': sum(stats['rate_limited'] for stats in model_stats),
+            'limiters': list(used.values()),
+        }
+
+
+class RateLimiter:
+    """Concurrency cap and request/token buckets of one api or model, used from the workflow runtime loop"""
+    def __init__(self, name):
+        self.name = name
+        self.limits = None
+        self.max_concurrent = None
+        self.requests = None  # TokenBucket of requests per minute
+        self.tokens = None  # TokenBucket of tokens per minute
+        self.backoff_until = 0.0
+        self.slot_waiters = collections.deque()
+
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rate_limited = 0
+
+    def configure(self, limits):
+        limits = {k: limits.get(k) for k in RATE_LIMIT_KEYS}
+        if limits == self.limits:
+            return
+        self.limits = limits
+        self.max_concurrent = limits['max_concurrent'] or None
+        self.requests = TokenBucket(limits['requests_per_minute']) if limits['requests_per_minute'] else None
+        self.tokens = TokenBucket(limits['tokens_per_minute']) if limits['tokens_per_minute'] else None
+        self.wake_waiters()  # the new limits may allow more calls
+
+    def get_delay(self, tokens, now):
+        delays = [self.backoff_until - now]
+        if self.requests:
+            delays.append(self.requests.get_delay(1, now))
+        if self.tokens and tokens:
+            delays.append(self.tokens.get_delay(tokens, now))
+        return max(delays)
+
+    async def acquire(self, tokens=0):
+        self.waiting += 1
+        try:
+            while True:
+                delay = self.get_delay(tokens, time.monotonic())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif self.max_concurrent and self.active >= self.max_concurrent:
+                    await self.wait_for_slot()
+                else:
+                    break
+        finally:
+            self.waiting -= 1
+
+        now = time.monotonic()
+        if self.requests:
+            self.requests.take(1, now)
+        if self.tokens and tokens:
+            self.tokens.take(tokens, now)
+        self.active += 1
+
+    async def wait_for_slot(self):
+        waiter = asyncio.get_running_loop().create_future()
+        self.slot_waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.wake_waiters(1)  # pass the slot on
+            raise
+
+    def wake_waiters(self, count=None):
+        while self.slot_waiters and count != 0:
+            waiter = self.slot_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                if count is not None:
+                    count -= 1
+
+    def release(self):
+        self.active -= 1
+        self.completed += 1
+        self.wake_waiters(1)
+
+    def back_off(self, delay):
+        self.rate_limited += 1
+        self.backoff_until = max(self.backoff_until, time.monotonic() + delay)
+
+    def get_stats(self, now):
+        return {
+            'name': self.name,
+            'running': self.active,
+            'waiting': self.waiting,
+            'completed': self.completed,
+            'rate_limited': self.rate_limited,
+            'backoff_secs': max(0.0, self.backoff_until - now),
+        }
+
+
+class TokenBucket:
+    """Refills `per_minute` evenly over a minute, holding at most `per_minute`"""
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def get_delay(self, amount, now):
+        self.refill(now)
+        amount = min(amount, self.capacity)  # a call larger than the bucket waits for a full bucket
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount, now):
+        self.refill(now)
+        self.level -= min(amount, self.capacity)
+
+
+class ScheduledStream:
+    """
+    Iterates a stream that holds limiter slots, releasing them once when it's consumed, fails or is closed.
+    A stream that's dropped before it's iterated (e.g. its caller was cancelled) releases them when it's collected.
+    """
+    def __init__(self, stream, limiters):
+        self.stream = stream
+        self.iterator = None
+        self.limiters = limiters
+        self.loop = asyncio.get_running_loop()
+        self.released = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.released:
+            raise StopAsyncIteration
+        if self.iterator is None:
+            self.iterator = self.stream.__aiter__()
+        try:
+            return await self.iterator.__anext__()
+        except BaseException:  # consumed, failed or cancelled
+            self.release()
+            raise
+
+    async def aclose(self):
+        try:
+            aclose = getattr(self.iterator or self.stream, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+        finally:
+            self.release()
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        for limiter in self.limiters:
+            limiter.release()
+
+    def __del__(self):
+        if self.released:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.release)  # limiters are used from their loop only
+        except RuntimeError:  # the loop was closed
+            self.release()
+
+
+def is_rate_limit_error(e):
+    return getattr(e, 'status_code', None) == 429 or type(e).__name__ == 'RateLimitError'
+
+
+def get_retry_after(e):
+    """Seconds from the Retry-After (or retry-after-ms) header of the error's response, or None"""
+    response = getattr(e, 'response', None)
+    headers = getattr(response, 'headers', None) or getattr(e, 'headers', None) or {}
+    try:
+        retry_after_ms = headers.get('retry-after-ms')
+        if retry_after_ms is not None:
+            return max(0.0, float(retry_after_ms) / 1000)
+        retry_after = headers.get('retry-after')
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
@@ -1,4 +1,3 @@
-import asyncio
 import json
 from abc import ABCMeta, abstractmethod
 from dataclasses import dataclass, fields, replace
@@ -8,6 +7,7 @@ from anthropic.types.beta import BetaToolUnionParam
 
 from src.utils import sql
 from src.utils.helpers import receive_workflow, params_to_schema
+from src.utils.runtime import runtime
 
 
 class ToolManager:
@@ -42,8 +42,8 @@ class ToolManager:
         return json.dumps({'output': output, 'status': status, 'tool_uuid': tool_uuid})
 
     def compute_tool(self, tool_uuid, params=None):  # , visited=None, ):
-        # return asyncio.run(self.receive_block(name, add_input))
-        return asyncio.run(self.compute_tool_async(tool_uuid, params))
+        """Blocking `compute_tool_async`, for threads other than the workflow runtime's"""
+        return runtime.run(self.compute_tool_async(tool_uuid, params))
 
 
 class BaseAnthropicTool(metaclass=ABCMeta):
@@ -1,4 +1,10 @@
 import json
+import os
+import queue
+import threading
+
+import numpy as np
+
 from src.utils import sql
 
 
@@ -7,6 +13,14 @@ class VectorDBManager:
         self.parent = parent
         self.vec_dbs = {}
 
+        self.stores = {}  # {name: LocalVectorStore}
+        self.embedding_func = None  # optional (texts) -> vectors, used instead of the provider of `embedding_model`
+        self.embed_queue = queue.Queue()  # (msg_id, content)
+        self.embed_thread = None
+        self.embed_batch_size = 32
+        self.embed_wait_secs = 1.0  # time to collect a batch before embedding it
+        self.embed_error = None  # the last embedding error, printed once
+
     def load(self):
         self.vec_dbs = sql.get_results("""
             SELECT
@@ -15,9 +29,221 @@ class VectorDBManager:
             FROM vectordbs""", return_type='dict')
         self.vec_dbs = {k: json.loads(v) for k, v in self.vec_dbs.items()}
 
+        if self.memory_enabled:
+            self.queue_unembedded_messages()
+
     def to_dict(self):
         return self.vec_dbs
 
+    @property
+    def memory_enabled(self):
+        return self.parent.config.dict.get('system.vector_memory', False)
+
+    @property
+    def embedding_model(self):
+        model_name = self.parent.config.dict.get('system.embedding_model', 'text-embedding-3-small')
+        return {'kind': 'EMBEDDING', 'model_name': model_name, 'provider': 'litellm', 'model_params': {}}
+
+    def get_store(self, name='messages'):
+        """Returns the local vector store `name`, stored in a `vectors` folder next to the database"""
+        store_dir = os.path.join(os.path.dirname(sql.get_db_path()), 'vectors')
+        store = self.stores.get(name)
+        if store is None or store.directory != store_dir:
+            store = LocalVectorStore(store_dir, name)
+            self.stores[name] = store
+        return store
+
+    def embed(self, texts):
+        if self.embedding_func:
+            vectors = self.embedding_func(texts)
+        else:
+            vectors = self.parent.providers.get_embeddings(texts, self.embedding_model)
+        if vectors is None:
+            raise ValueError(f"The provider of `{self.embedding_model['model_name']}` does not support embeddings")
+        return np.asarray(vectors, dtype=np.float32)
+
+    def add_documents(self, store_name, ids, texts):
+        """Embeds and stores documents under integer `ids`, returns their embedding ids"""
+        store = self.get_store(store_name)
+        model_name = self.embedding_model['model_name']
+        vectors = self.embed(texts)
+        if store.meta and store.meta.get('model') != model_name:
+            store.clear()  # vectors of different models aren't comparable
+            if store_name == 'messages':
+                sql.execute("UPDATE contexts_messages SET embedding_id = NULL WHERE embedding_id IS NOT NULL")
+        return store.add(ids, vectors, model_name=model_name)
+
+    def search(self, store_name, text, k=5, candidate_ids=None):
+        """
+        Top `k` (id, score) of the store by cosine similarity to `text`, optionally only within `candidate_ids`.
+        Embedding the text is a blocking request, run it off the workflow runtime loop.
+        Raises ValueError if the embedding model's provider has no embeddings.
+        """
+        store = self.get_store(store_name)
+        if len(store) == 0:
+            return []
+        return store.search(self.embed([text])[0], k=k, candidate_ids=candidate_ids)
+
+    def queue_message(self, msg_id, role, content):
+        """Queues a new message to be embedded in the background"""
+        if not self.memory_enabled:
+            return
+        if role not in ('user', 'assistant') or not content or not content.strip():
+            return
+        self.embed_queue.put((msg_id, content))
+        if self.embed_thread is None or not self.embed_thread.is_alive():
+            self.embed_thread = threading.Thread(target=self.embed_worker, daemon=True)
+            self.embed_thread.start()
+
+    def queue_unembedded_messages(self, limit=1000):
+        """Queues the latest messages without an embedding, e.g. after enabling the memory"""
+        rows = sql.get_results("""
+            SELECT id, role, msg
+            FROM contexts_messages
+            WHERE embedding_id IS NULL
+                AND role IN ('user', 'assistant')
+            ORDER BY id DESC
+            LIMIT ?""", (limit,))
+        for msg_id, role, content in reversed(rows):
+            self.queue_message(msg_id, role, content)
+
+    def embed_worker(self):
+        while True:
+            try:
+                batch = [self.embed_queue.get(timeout=30)]
+            except queue.Empty:
+                return  # restarted by the next `queue_message`
+
+            try:
+                try:
+                    while len(batch) < self.embed_batch_size:
+                        batch.append(self.embed_queue.get(timeout=self.embed_wait_secs))
+                except queue.Empty:
+                    pass
+                self.embed_messages(batch)
+                self.embed_error = None
+            except Exception as e:
+                if str(e) != self.embed_error:  # e.g. the provider has no embeddings, don't repeat it every batch
+                    print(f"Error embedding messages: {e}")
+                self.embed_error = str(e)
+            finally:
+                for _ in batch:
+                    self.embed_queue.task_done()
+
+    def embed_messages(self, batch):
+        msg_ids = [msg_id for msg_id, _ in batch]
+        embedding_ids = self.add_documents('messages', msg_ids, [content for _, content in batch])
+        sql.execute_multiple(
+            ["UPDATE contexts_messages SET embedding_id = ? WHERE id = ?"] * len(msg_ids),
+            list(zip(embedding_ids, msg_ids)))
+
+    def wait_for_embeddings(self):
+        self.embed_queue.join()
+
+
+class LocalVectorStore:
+    """
+    Append-only store of normalized float32 vectors and their integer ids, read through a memory-mapped matrix.
+    Rows are appended to `<name>.vectors` and `<name>.ids`, so a row index (the embedding id) never changes.
+    Changing the embedding model (or dimension) clears the store.
+    """
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self.vectors_path = os.path.join(directory, f'{name}.vectors')
+        self.ids_path = os.path.join(directory, f'{name}.ids')
+        self.meta_path = os.path.join(directory, f'{name}.json')
+        self.lock = threading.Lock()
+        self.meta = {}
+        self.matrix = None  # memory-mapped (n, dim), reopened after appending
+        self.ids = None
+
+        if os.path.isfile(self.meta_path):
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+
+    def __len__(self):
+        if not self.meta or not os.path.isfile(self.ids_path):
+            return 0
+        row_bytes = self.meta['dim'] * 4
+        return min(os.path.getsize(self.ids_path) // 8, os.path.getsize(self.vectors_path) // row_bytes)
+
+    def clear(self):
+        with self.lock:
+            self._clear_locked()
+
+    def _clear_locked(self):
+        for path in (self.vectors_path, self.ids_path, self.meta_path):
+            if os.path.isfile(path):
+                os.remove(path)
+        self.meta = {}
+        self.matrix = None
+        self.ids = None
+
+    def add(self, ids, vectors, model_name=None):
+        """Appends the vectors of `ids`, returns their row indexes"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError('Expected one vector per id')
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        dim = vectors.shape[1]
+        with self.lock:
+            if self.meta and (self.meta['dim'] != dim or self.meta.get('model') != model_name):
+                self._clear_locked()
+
+            if not self.meta:
+                os.makedirs(self.directory, exist_ok=True)
+                self.meta = {'dim': dim, 'model': model_name}
+                with open(self.meta_path, 'w') as f:
+                    json.dump(self.meta, f)
+
+            start = len(self)
+            # drop a partially written row, e.g. after a crash between the two appends
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(start * dim * 4)
+                f.write(vectors.tobytes())
+            with open(self.ids_path, 'ab') as f:
+                f.truncate(start * 8)
+                f.write(np.asarray(ids, dtype=np.int64).tobytes())
+            self.matrix = None
+            self.ids = None
+        return list(range(start, start + len(ids)))
+
+    def load_matrix(self):
+        with self.lock:
+            if self.matrix is None:
+                count = len(self)
+                if count == 0:
+                    return np.zeros((0, self.meta.get('dim', 0)), dtype=np.float32), np.zeros(0, dtype=np.int64)
+                self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(count, self.meta['dim']))
+                self.ids = np.fromfile(self.ids_path, dtype=np.int64, count=count)
+            return self.matrix, self.ids
+
+    def search(self, vector, k=5, candidate_ids=None):
+        """Top `k` (id, score) by cosine similarity, optionally only within `candidate_ids`"""
+        matrix, ids = self.load_matrix()
+        vector = np.asarray(vector, dtype=np.float32)
+        if len(ids) == 0 or vector.shape[0] != matrix.shape[1]:
+            return []
+        vector = vector / (np.linalg.norm(vector) or 1)
+
+        rows = None
+        if candidate_ids is not None:
+            rows = np.flatnonzero(np.isin(ids, np.fromiter(candidate_ids, dtype=np.int64)))
+            if len(rows) == 0:
+                return []
+            scores = matrix[rows] @ vector
+        else:
+            scores = matrix @ vector
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top_rows = top if rows is None else rows[top]
+        return [(int(ids[row]), float(scores[i])) for i, row in zip(top, top_rows)]
+
 
 class VectorDB:
     def __init__(self, *args, **kwargs):
@@ -34,4 +260,3 @@ class VectorDB:
 
     def delete_vec_store(self, *args, **kwargs):
         raise NotImplementedError
-
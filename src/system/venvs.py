@@ -1,6 +1,9 @@
+import glob
 import os
 import platform
+import re
 import subprocess
+import threading
 
 from src.utils.filesystem import get_application_path
 
@@ -91,38 +94,70 @@ class VenvManager:
             self.python_path = os.path.join(get_application_path(), "venvs", name, "bin", "python")
             self.pip_path = get_pip_path(self.path)
 
+            self.site_packages_dirs = []
+            self.packages = None  # {normalized_name: (name, version)}
+            self.packages_mtimes = None  # mtimes of the site-packages folders when `packages` was read
+            self.lock = threading.Lock()
+
         def install_package(self, package):
             """
             Installs a package into the virtual environment.
             """
             run_command([self.pip_path, "install", package])
+            self.invalidate_packages()
 
         def uninstall_package(self, package):
             """
             Uninstalls a package from the virtual environment.
             """
             run_command([self.pip_path, "uninstall", package])
+            self.invalidate_packages()
 
-        def list_packages(self):
+        def get_site_packages_dirs(self):
+            if self.site_packages_dirs:
+                return self.site_packages_dirs
+            if platform.system() == "Windows":
+                dirs = [os.path.join(self.path, "Lib", "site-packages")]
+            else:
+                dirs = glob.glob(os.path.join(self.path, "lib*", "python*", "site-packages"))
+            self.site_packages_dirs = sorted(d for d in dirs if os.path.isdir(d))
+            return self.site_packages_dirs
+
+        def get_packages(self):
             """
-            Lists all installed packages in the virtual environment.
+            The installed packages, read from the package metadata in site-packages.
+            Cached until the site-packages folders change (their mtime changes when a package is added or removed).
             """
-            python_exists = os.path.exists(self.python_path)
-            pip_exists = os.path.exists(self.pip_path)
-            if not python_exists or not pip_exists:
-                return []
-
-            packages = run_command([self.python_path, self.pip_path, "list"])
-            packages = [package.split() for package in packages.split("\n")[2:-1]]
-            print(packages)
+            site_packages_dirs = self.get_site_packages_dirs()
+            mtimes = [(d, os.stat(d).st_mtime_ns) for d in site_packages_dirs]
+            with self.lock:
+                if self.packages is not None and mtimes == self.packages_mtimes:
+                    return self.packages
+
+            packages = {}
+            for site_packages_dir in site_packages_dirs:
+                packages.update(read_installed_packages(site_packages_dir))
+
+            with self.lock:
+                self.packages = packages
+                self.packages_mtimes = mtimes
             return packages
 
+        def invalidate_packages(self):
+            with self.lock:
+                self.packages = None
+
+        def list_packages(self):
+            """
+            Lists all installed packages in the virtual environment, as [name, version] rows.
+            """
+            return sorted([name, version] for name, version in self.get_packages().values())
+
         def has_package(self, package):
             """
             Checks if a package is installed in the virtual environment.
             """
-            packages = self.list_packages()
-            return any(package in package_info for package_info in packages)
+            return normalize_package_name(package) in self.get_packages()
 
 
         # def delete(self):
@@ -147,6 +182,48 @@ class VenvManager:
 #         return os.path.dirname(os.path.abspath(sys.executable))
 
 
+def normalize_package_name(name):
+    """PEP 503 normalized name, e.g. `Typing_Extensions` -> `typing-extensions`"""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def read_installed_packages(site_packages_dir):
+    """{normalized_name: (name, version)} of the `.dist-info` and `.egg-info` metadata in a site-packages folder"""
+    packages = {}
+    for entry in os.scandir(site_packages_dir):
+        if entry.name.endswith('.dist-info'):
+            metadata_path = os.path.join(entry.path, 'METADATA')
+        elif entry.name.endswith('.egg-info'):
+            metadata_path = os.path.join(entry.path, 'PKG-INFO') if entry.is_dir() else entry.path
+        else:
+            continue
+
+        name, version = read_metadata_name_version(metadata_path)
+        if name is None:  # fall back to the folder name, `{name}-{version}.dist-info`
+            name, _, version = entry.name.rsplit('.', 1)[0].partition('-')
+        packages[normalize_package_name(name)] = (name, version)
+    return packages
+
+
+def read_metadata_name_version(metadata_path):
+    """The Name and Version headers of a package METADATA file, only reading up to the end of the headers"""
+    name, version = None, ''
+    try:
+        with open(metadata_path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if line.startswith('Name:'):
+                    name = line[5:].strip()
+                elif line.startswith('Version:'):
+                    version = line[8:].strip()
+                elif not line.strip():
+                    break
+                if name and version:
+                    break
+    except OSError:
+        pass
+    return name, version
+
+
 def get_pip_path(venv_path):
     if platform.system() == "Windows":
         return os.path.join(venv_path, "Scripts", "pip")
@@ -0,0 +1,127 @@
+import asyncio
+import concurrent.futures
+import ipaddress
+import socket
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+PROBE_ADDRESSES = (('1.1.1.1', 53), ('8.8.8.8', 53))
+LOCAL_MODEL_PREFIXES = ('ollama/', 'ollama_chat/', 'lm_studio/', 'llamafile/')  # default to a localhost api base
+NETWORK_ERROR_NAMES = (
+    'APIConnectionError', 'ConnectError', 'ConnectionError', 'ClientConnectorError', 'ClientOSError',
+    'ServerDisconnectedError', 'RemoteProtocolError', 'NetworkError', 'gaierror',
+)
+
+
+class ConnectivityMonitor:
+    """
+    Internet connectivity status that never blocks the event loop.
+    Probes connect a socket to public DNS servers in a worker thread, the result is cached for `ttl` seconds
+    and concurrent checks share one probe.
+    """
+    def __init__(self, ttl=15.0, timeout=1.5, addresses=PROBE_ADDRESSES):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.addresses = addresses
+        self.connected: Optional[bool] = None
+        self.checked_at = 0.0
+        self.probe_future: Optional[concurrent.futures.Future] = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='Connectivity')
+        self.lock = threading.Lock()
+
+    def probe(self) -> bool:
+        for address in self.addresses:
+            try:
+                with socket.create_connection(address, timeout=self.timeout):
+                    return True
+            except OSError:
+                continue
+        return False
+
+    def run_probe(self) -> bool:
+        connected = self.probe()
+        self.set_status(connected)
+        return connected
+
+    def set_status(self, connected: bool):
+        with self.lock:
+            self.connected = connected
+            self.checked_at = time.monotonic()
+
+    def get_cached(self) -> Optional[bool]:
+        """The status if it was checked within `ttl`, otherwise None"""
+        with self.lock:
+            if self.connected is not None and time.monotonic() - self.checked_at < self.ttl:
+                return self.connected
+            return None
+
+    def start_probe(self) -> concurrent.futures.Future:
+        with self.lock:
+            if self.probe_future is None or self.probe_future.done():
+                self.probe_future = self.executor.submit(self.run_probe)
+            return self.probe_future
+
+    def is_connected_nowait(self) -> bool:
+        """The cached status, or the last known one (assuming connected) while a probe refreshes it"""
+        cached = self.get_cached()
+        if cached is not None:
+            return cached
+        self.start_probe()
+        return self.connected is not False
+
+    async def is_connected(self) -> bool:
+        """The cached status, or the result of a probe awaited without blocking the loop"""
+        cached = self.get_cached()
+        if cached is not None:
+            return cached
+        return await asyncio.wrap_future(self.start_probe())
+
+    def report_success(self):
+        """A request got through, so the network is up"""
+        self.set_status(True)
+
+
+def iter_error_chain(e):
+    seen = set()
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        yield e
+        e = e.__cause__ or e.__context__
+
+
+def classify_error(e) -> str:
+    """One of 'network', 'timeout', 'rate_limit', 'server', 'client' or 'unknown', from the exception types"""
+    for err in iter_error_chain(e):
+        name = type(err).__name__
+        if name in NETWORK_ERROR_NAMES or isinstance(err, (ConnectionError, socket.gaierror)):
+            return 'network'
+        if 'Timeout' in name or isinstance(err, (TimeoutError, asyncio.TimeoutError, socket.timeout)):
+            return 'timeout'
+        status_code = getattr(err, 'status_code', None)
+        if isinstance(status_code, int):
+            if status_code == 429:
+                return 'rate_limit'
+            if status_code >= 500:
+                return 'server'
+            if status_code >= 400:
+                return 'client'
+    return 'unknown'
+
+
+def is_local_api(model_name: Optional[str] = None, api_base: Optional[str] = None) -> bool:
+    """True for api bases on this machine or the local network (e.g. Ollama), which don't need the internet"""
+    if api_base:
+        host = urlparse(api_base if '://' in api_base else f'http://{api_base}').hostname or ''
+        if host == 'localhost' or host.endswith('.local') or host.endswith('.localhost'):
+            return True
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return address.is_loopback or address.is_private or address.is_link_local
+    return bool(model_name) and model_name.startswith(LOCAL_MODEL_PREFIXES)
+
+
+connectivity = ConnectivityMonitor()
@@ -1,17 +1,9 @@
 import hashlib
 import json
 import re
+from functools import lru_cache
 from typing import Dict, Any, List
 
-from PySide6.QtCore import QSize, Qt
-from PySide6.QtGui import QPixmap, QPainter, QPainterPath, QColor
-
-from src.utils import resources_rc
-from src.utils.filesystem import unsimplify_path
-from contextlib import contextmanager
-from PySide6.QtWidgets import QWidget, QMessageBox
-import requests
-
 
 def convert_model_json_to_obj(model_json: Any) -> Dict[str, Any]:
     if model_json is None:
@@ -66,11 +58,9 @@ def hash_config(config, exclude=None) -> str:
 
 
 def network_connected() -> bool:
-    try:
-        response = requests.get("https://google.com", timeout=5)
-        return True
-    except requests.ConnectionError:
-        return False
+    """Cached connectivity status, never blocks (see `src.utils.connectivity`)"""
+    from src.utils.connectivity import connectivity
+    return connectivity.is_connected_nowait()
 
 
 def convert_to_safe_case(text) -> str:
@@ -226,87 +216,6 @@ def try_parse_json(text):
         return False, {}
 
 
-def get_all_children(widget):
-    """Recursive function to retrieve all child pages of a given widget."""
-    children = []
-    for child in widget.findChildren(QWidget):
-        children.append(child)
-        children.extend(get_all_children(child))
-    return children
-
-
-@contextmanager
-def block_signals(*widgets, recurse_children=True):
-    """Context manager to block signals for a widget and all its child pages."""
-    all_widgets = []
-    try:
-        # Get all child pages
-        for widget in widgets:
-            all_widgets.append(widget)
-            if recurse_children:
-                all_widgets.extend(get_all_children(widget))
-
-        # Block signals
-        for widget in all_widgets:
-            widget.blockSignals(True)
-
-        yield
-    finally:
-        # Unblock signals
-        for widget in all_widgets:
-            widget.blockSignals(False)
-
-
-@contextmanager
-def block_pin_mode():
-    """Context manager to temporarily set pin mode to true, and then restore old state. A workaround for dialogs"""
-    from src.gui import main
-    try:
-        old_pin_mode = main.PIN_MODE
-        main.PIN_MODE = True
-        yield
-    finally:
-        main.PIN_MODE = old_pin_mode
-
-
-def display_message(parent, message, title=None, icon=QMessageBox.Information):
-    from src.gui.widgets import find_main_widget
-    main = find_main_widget(parent)
-    if main:
-        main.notification_manager.show_notification(
-            message=message,
-            color='blue' if icon == QMessageBox.Information else None,
-        )
-    else:
-        display_message_box(
-            icon=icon,
-            title=title or icon.name,
-            text=message,
-        )
-
-
-def display_message_box(icon, text, title, buttons=(QMessageBox.Ok)):
-    with block_pin_mode():
-        msg = QMessageBox()
-        msg.setIcon(icon)
-        msg.setText(text)
-        msg.setWindowTitle(title)
-        msg.setStandardButtons(buttons)
-        if QMessageBox.Yes in buttons:
-            msg.setDefaultButton(QMessageBox.Yes)
-        elif QMessageBox.Ok in buttons:
-            msg.setDefaultButton(QMessageBox.Ok)
-        msg.setWindowFlags(msg.windowFlags() | Qt.WindowStaysOnTopHint)
-        # msg.addButton('Archive', QMessageBox.ActionRole)
-        return msg.exec_()
-
-
-def apply_alpha_to_hex(hex_color, alpha):
-    color = QColor(hex_color)
-    color.setAlphaF(alpha)
-    return color.name(QColor.HexArgb)
-
-
 # def replace_times_with_spoken(text):
 #     pattern = r"\b\d{1,2}:\d{2}\s?[ap]m\b"
 #     time_matches = re.findall(pattern, text)
@@ -418,106 +327,14 @@ def split_lang_and_code(text):
 #     return matches
 
 
-def path_to_pixmap(paths, circular=True, diameter=30, opacity=1, def_avatar=None):
-    if isinstance(paths, list):
-        count = len(paths)
-        dia_mult = 0.7 if count > 1 else 1  # 1 - (0.08 * min(count - 1, 8))
-        small_diameter = int(diameter * dia_mult)
-
-        pixmaps = []
-        for path in paths:
-            pixmaps.append(path_to_pixmap(path, diameter=small_diameter, def_avatar=def_avatar))
-
-        # Create a new QPixmap to hold all the stacked pixmaps
-        stacked_pixmap = QPixmap(diameter, diameter)
-        stacked_pixmap.fill(Qt.transparent)
-
-        painter = QPainter(stacked_pixmap)
-        painter.setRenderHint(QPainter.Antialiasing)
-        painter.setRenderHint(QPainter.SmoothPixmapTransform)
-
-        only_two = count == 2
-        only_one = count == 1
-
-        offset = (diameter - small_diameter) // 2
-        for i, pixmap in enumerate(pixmaps):
-            # Calculate the shift for each pixmap
-            # random either -1 or 1
-            x_shift = (i % 2) * 2 - 1
-            y_shift = ((i // 2) % 2) * 2 - 1
-            x_shift *= 5
-            y_shift *= 5
-            if only_two and i == 1:
-                y_shift *= -1
-            if only_one:
-                x_shift = 0
-                y_shift = 0
-            painter.drawPixmap(offset - x_shift, offset - y_shift, pixmap)
-        painter.end()
-
-        return stacked_pixmap
-
-    else:
-        from src.gui.widgets import colorize_pixmap
-
-        try:
-            path = unsimplify_path(paths)
-            if path == '':
-                raise Exception('Empty path')
-            pic = QPixmap(path)
-            if path.startswith(':/'):
-                pic = colorize_pixmap(pic)
-        except Exception as e:
-            default_img_path = def_avatar or ':/resources/icon-agent-solid.png'
-            pic = colorize_pixmap(QPixmap(default_img_path))
-
-        if circular:
-            pic = create_circular_pixmap(pic, diameter=diameter)
-
-        if opacity < 1:
-            temp_pic = QPixmap(pic.size())
-            temp_pic.fill(Qt.transparent)
-
-            painter = QPainter(temp_pic)
-
-            painter.setOpacity(opacity)
-            painter.drawPixmap(0, 0, pic)
-            painter.end()
-
-            pic = temp_pic
-
-        return pic
-
-
-def create_circular_pixmap(src_pixmap, diameter=30):
-    if src_pixmap.isNull():
-        return QPixmap()
-
-    # Desired size of the profile picture
-    size = QSize(diameter, diameter)
-
-    # Create a new QPixmap for our circular image with the same size as our QLabel
-    circular_pixmap = QPixmap(size)
-    circular_pixmap.fill(Qt.transparent)  # Ensure transparency for the background
-
-    # Create a painter to draw on the pixmap
-    painter = QPainter(circular_pixmap)
-    painter.setRenderHint(QPainter.Antialiasing)  # For smooth rendering
-    painter.setRenderHint(QPainter.SmoothPixmapTransform)
-
-    # Draw the ellipse (circular mask) onto the pixmap
-    path = QPainterPath()
-    path.addEllipse(0, 0, size.width(), size.height())
-    painter.setClipPath(path)
-
-    # Scale the source pixmap while keeping its aspect ratio
-    src_pixmap = src_pixmap.scaled(size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
-
-    # Calculate the coordinates to ensure the pixmap is centered
-    x = (size.width() - src_pixmap.width()) / 2
-    y = (size.height() - src_pixmap.height()) / 2
+def freeze_paths(paths):
+    """Converts (nested) lists of avatar paths to tuples, to be used in a cache key"""
+    if isinstance(paths, (list, tuple)):
+        return tuple(freeze_paths(path) for path in paths)
+    return paths
 
-    painter.drawPixmap(x, y, src_pixmap)
-    painter.end()
 
-    return circular_pixmap
+@lru_cache(maxsize=2048)
+def get_avatar_paths_from_config_json(config_json) -> Any:
+    """Cached `get_avatar_paths_from_config` for a config json string, the result must not be modified"""
+    return get_avatar_paths_from_config(json.loads(config_json))
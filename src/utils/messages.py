@@ -1,13 +1,54 @@
+import asyncio
+import bisect
+import heapq
+import inspect
 import json
 import threading
-from typing import List, Dict, Any
-
-import tiktoken
+from typing import List, Dict, Any, Optional
 
 from src.members.node import Node
 from src.members.user import User
 from src.utils import sql
-from src.utils.helpers import convert_to_safe_case, try_parse_json
+from src.utils.helpers import convert_to_safe_case, try_parse_json, convert_model_json_to_obj
+from src.utils.tokens import count_tokens
+
+DEFAULT_CONTEXT_WINDOW = 8192
+MESSAGE_TOKEN_OVERHEAD = 4  # role and separators added by chat templates
+SUMMARY_PROMPT = """Summarize the conversation below in under {max_words} words, keeping names, facts, decisions and open questions.{previous_summary}
+
+CONVERSATION:
+{conversation}"""
+
+
+async def summarize_with_llm(previous_summary, msgs, model_obj, max_tokens):
+    """Summary strategy that asks the model to extend the previous summary with the older messages"""
+    from src.system.base import manager
+    conversation = '\n'.join(f"{msg['role']}: {msg['content']}" for msg in msgs)
+    if previous_summary:
+        previous_summary = f"\n\nExtend this summary of the conversation before it:\n{previous_summary}"
+    prompt = SUMMARY_PROMPT.format(max_words=int(max_tokens * 0.75), previous_summary=previous_summary, conversation=conversation)
+    return await manager.providers.get_scalar_async(prompt, model_obj=model_obj)
+
+
+# {name: func(previous_summary, msgs, model_obj, max_tokens) -> summary (or an awaitable of it)},
+# for messages cut by the token budget
+SUMMARY_STRATEGIES = {
+    'LLM summary': summarize_with_llm,
+}
+
+
+def get_member_role(msg, calling_member_id):
+    """The role of a message as seen by the calling member, whose own messages are the assistant's"""
+    if msg.role not in ('user', 'assistant'):
+        return msg.role
+    return 'user' if (msg.member_id != calling_member_id or msg.role == 'user') else 'assistant'
+
+
+def get_role(msg, calling_member_id=None):
+    """The role of a preloaded message dict or a Message, as seen by the calling member if it's given"""
+    if isinstance(msg, dict):
+        return msg['role']
+    return msg.role if calling_member_id is None else get_member_role(msg, calling_member_id)
 
 
 class Message:
@@ -23,11 +64,27 @@ class Message:
         self.role: str = role
         self.content: str = content
         self.member_id: str = member_id
-        self.token_count = len(tiktoken.encoding_for_model("gpt-3.5-turbo").encode(content or ''))
         self.alt_turn: int = alt_turn
         if log is not None and not isinstance(log, str):
             log = json.dumps(log)  # todo clean
         self.log = None if not log else json.loads(log)
+        self._token_counts: Dict[Optional[str], int] = {}  # {model_name: token_count}
+
+    @property
+    def token_count(self) -> int:
+        """Token count with the model that wrote the message if it's logged, otherwise the default encoding"""
+        model_name = None
+        if self.log:
+            model_name = (self.log.get('model') or {}).get('model_name')
+        return self.get_token_count(model_name)
+
+    def get_token_count(self, model_name: Optional[str] = None) -> int:
+        """Lazily counts the tokens of the content, for the given model"""
+        count = self._token_counts.get(model_name)
+        if count is None:
+            count = count_tokens(self.content, model_name)
+            self._token_counts[model_name] = count
+        return count
 
 
 class MessageHistory:
@@ -39,7 +96,19 @@ class MessageHistory:
         self.messages: List[Message] = []  # [Message(m['id'], m['role'], m['content']) for m in (messages or [])]
         self.alt_turn_state: int = 0  # A flag to indicate if it's a new run
 
-        self.msg_id_buffer: List[int] = []
+        self.summaries: Dict[tuple, tuple] = {}  # {(leaf_id, member_id, strategy): (last_summarized_msg_id, summary)}
+
+        self.member_turn_outputs: Dict[str, Any] = {}
+        self.member_last_outputs: Dict[str, Any] = {}
+        self.state_leaf_id: Optional[int] = None  # leaf_id and last msg id that the turn state was computed for
+        self.state_last_msg_id: int = 0
+
+        # positions in `self.messages`, kept in sync by `sync_index`
+        self.member_index: Dict[str, Dict[str, List[int]]] = {}  # {member_id: {role: [positions]}}
+        self.role_index: Dict[str, List[int]] = {}  # {role: [positions]}
+        self.indexed_count: int = 0
+        self.indexed_last: Optional[Message] = None
+        self.input_cache: Dict[str, tuple] = {}  # {calling_member_id: (workflow_versions, input_filters)}
 
     def load(self):
         self.messages = []
@@ -69,7 +138,6 @@ class MessageHistory:
 
         self.load_branches()
         self.refresh_messages()
-        self.load_msg_id_buffer()
 
     def load_branches(self):
         root_id = self.workflow.context_id
@@ -116,36 +184,41 @@ class MessageHistory:
         self.messages.extend([Message(int(msg_id), role, content, member_id, alt_turn, log)
                               for msg_id, role, content, member_id, alt_turn, log in msg_log])
 
-        member_turn_outputs = {member.member_id: None for member in self.workflow.get_members()}  # todo clean
-        member_last_outputs = {member.member_id: None for member in self.workflow.get_members()}
+        self.member_turn_outputs = self.empty_member_outputs()  # todo clean
+        self.member_last_outputs = self.empty_member_outputs()
         for msg in self.messages:
-            if msg.alt_turn != self.alt_turn_state:
-                self.alt_turn_state = msg.alt_turn
-                member_turn_outputs = {member.member_id: None for member in self.workflow.get_members()}
+            self.update_turn_state(msg)
 
-            member_turn_outputs[msg.member_id] = msg.content
-            member_last_outputs[msg.member_id] = msg.content
+        self.workflow.reset_last_outputs()
+        self.workflow.set_last_outputs(self.member_last_outputs)
+        self.workflow.set_turn_outputs(self.member_turn_outputs)
+        self.mark_state_synced()
 
-            run_finished = None not in member_turn_outputs.values()  #!looper!#
-            if run_finished:
-                self.alt_turn_state = 1 - self.alt_turn_state
-                member_turn_outputs = {member.member_id: None for member in self.workflow.get_members()}
+    def empty_member_outputs(self) -> Dict[str, Any]:
+        return {member.member_id: None for member in self.workflow.get_members()}
 
-        self.workflow.reset_last_outputs()
-        self.workflow.set_last_outputs(member_last_outputs)
-        self.workflow.set_turn_outputs(member_turn_outputs)
+    def update_turn_state(self, msg: Message):
+        """Advance the turn state by one message"""
+        if msg.alt_turn != self.alt_turn_state:
+            self.alt_turn_state = msg.alt_turn
+            self.member_turn_outputs = self.empty_member_outputs()
 
-    def load_msg_id_buffer(self):
-        self.msg_id_buffer = []
-        last_msg_id = sql.get_scalar("SELECT seq FROM sqlite_sequence WHERE name = 'contexts_messages'")
-        last_msg_id = last_msg_id if last_msg_id is not None else 0
-        for msg_id in range(last_msg_id + 1, last_msg_id + 100):
-            self.msg_id_buffer.append(msg_id)
+        self.member_turn_outputs[msg.member_id] = msg.content
+        self.member_last_outputs[msg.member_id] = msg.content
 
-    def get_next_msg_id(self) -> int:
-        last_id = self.msg_id_buffer[-1]
-        self.msg_id_buffer.append(last_id + 1)
-        return self.msg_id_buffer.pop(0)
+        run_finished = None not in self.member_turn_outputs.values()  #!looper!#
+        if run_finished:
+            self.alt_turn_state = 1 - self.alt_turn_state
+            self.member_turn_outputs = self.empty_member_outputs()
+
+    def mark_state_synced(self):
+        self.state_leaf_id = self.workflow.leaf_id
+        self.state_last_msg_id = self.messages[-1].id if len(self.messages) > 0 else 0
+
+    def state_is_synced(self) -> bool:
+        """False if the messages or leaf context changed outside of `add`, e.g. when a branch is edited or switched"""
+        last_msg_id = self.messages[-1].id if len(self.messages) > 0 else 0
+        return self.state_leaf_id == self.workflow.leaf_id and self.state_last_msg_id == last_msg_id
 
     def add(self,
         role: str,
@@ -154,20 +227,63 @@ class MessageHistory:
         log_obj=None
     ) -> Message:
         with self.thread_lock:
-            next_id = self.get_next_msg_id()
             if log_obj is None:
                 log_obj = {}
-            log_obj['id'] = next_id
-            new_msg = Message(next_id, role, content, member_id, self.alt_turn_state, log_obj)
-
-            log_json_str = json.dumps(log_obj) if log_obj is not None else '{}'
-            sql.execute \
-                ("INSERT INTO contexts_messages (context_id, member_id, role, msg, alt_turn, embedding_id, log) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                        (self.workflow.leaf_id, member_id, role, content, new_msg.alt_turn, None, log_json_str))
-            self.refresh_messages()
+            is_synced = self.state_is_synced()
+            # The id is allocated by the insert itself, so messages written by other contexts can't take it,
+            # and it's never lower than the AUTOINCREMENT sequence, so ids of deleted messages aren't reused.
+            msg_id = sql.execute("""
+                INSERT INTO contexts_messages (id, context_id, member_id, role, msg, alt_turn, embedding_id, log)
+                SELECT new_id, ?, ?, ?, ?, ?, ?, json_set(?, '$.id', new_id)
+                FROM (
+                    SELECT MAX(
+                        COALESCE(MAX(id), 0),
+                        COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'contexts_messages'), 0)
+                    ) + 1 AS new_id
+                    FROM contexts_messages
+                )""", (self.workflow.leaf_id, member_id, role, content, self.alt_turn_state, None, json.dumps(log_obj)))
+            log_obj['id'] = msg_id
+            new_msg = Message(msg_id, role, content, member_id, self.alt_turn_state, log_obj)
+            self.workflow.system.vectordbs.queue_message(new_msg.id, role, content)
+
+            if not is_synced:
+                self.refresh_messages()
+                return new_msg
+
+            # Append in memory and advance the turn state by this message only
+            prev_turn_outputs = self.member_turn_outputs
+            self.messages.append(new_msg)
+            self.update_turn_state(new_msg)
+
+            turn_outputs = {k: None for k in prev_turn_outputs}  # clears outputs of a finished turn
+            turn_outputs.update(self.member_turn_outputs)
+            self.workflow.set_last_outputs({member_id: content})
+            self.workflow.set_turn_outputs(turn_outputs)
+            self.mark_state_synced()
+            self.sync_index()
 
             return new_msg
 
+    def sync_index(self):
+        """
+        Indexes messages appended since the last sync.
+        Rebuilds the index if messages were removed or replaced, e.g. by `load`, `pop` or when a branch is edited.
+        """
+        messages = self.messages
+        count = self.indexed_count
+        if count > len(messages) or (count > 0 and messages[count - 1] is not self.indexed_last):
+            self.member_index = {}
+            self.role_index = {}
+            count = 0
+
+        for position in range(count, len(messages)):
+            msg = messages[position]
+            self.member_index.setdefault(msg.member_id, {}).setdefault(msg.role, []).append(position)
+            self.role_index.setdefault(msg.role, []).append(position)
+
+        self.indexed_count = len(messages)
+        self.indexed_last = messages[-1] if messages else None
+
     def get_workflow_from_full_member_id(self, full_member_id: str):  # !nestmember!
         walk_ids = full_member_id.split('.')[:-1]
         workflow = self.workflow
@@ -218,7 +334,27 @@ class MessageHistory:
 
         return member_inputs
 
-    def get(self, incl_roles='all', calling_member_id='0', base_member_id=None):
+    def get_workflow_versions(self, calling_member_id: str) -> List[tuple]:
+        """The config and members of the member's workflow and its parents, these are replaced when a workflow is reloaded"""
+        versions = []
+        workflow = self.get_workflow_from_full_member_id(calling_member_id)
+        while workflow is not None:
+            versions.append((workflow.config, workflow.members))
+            workflow = workflow._parent_workflow
+        return versions
+
+    def get_input_filters(self, calling_member_id: str):
+        """
+        Returns (input_member_ids, member_exclusive_roles, member_structures) of a member,
+        cached until its workflow or a parent workflow is reloaded.
+        """
+        versions = self.get_workflow_versions(calling_member_id)
+        cached = self.input_cache.get(calling_member_id)
+        if cached and len(cached[0]) == len(versions) and all(
+                config is cached_config and members is cached_members
+                for (config, members), (cached_config, cached_members) in zip(versions, cached[0])):
+            return cached[1]
+
         member_inputs = self.get_member_inputs_from_workflow(calling_member_id)
         input_member_ids = [f"{inp['full_source_member_id']}" for inp in member_inputs]
 
@@ -237,16 +373,38 @@ class MessageHistory:
                         member_structures[source_member_id] = []
                     member_structures[source_member_id].append(mapping['source_options'])
 
-        # # get show_members_as_user_role setting
-        # member_workflow = self.get_workflow_from_full_member_id(calling_member_id)
-        # # calling_member = member_workflow.members.get(member_id, None)
-        # # member_config = {} if calling_member is None else calling_member.config
-
-        # # # get the member ids to show as user
-        # user_members = []
-        # set_members_as_user = True
-        # if set_members_as_user:
-        #     user_members = [f'{path_to_member}{m_id}' for m_id in member_workflow.members if m_id != member_id]
+        input_filters = (input_member_ids, member_exclusive_roles, member_structures)
+        self.input_cache[calling_member_id] = (versions, input_filters)
+        return input_filters
+
+    def get_position_lists(self, incl_roles, member_ids, member_exclusive_roles, base_member_id=None) -> List[List[int]]:
+        """
+        Returns sorted lists of the positions of matching messages, from the index.
+        `member_ids` = None matches all members, `member_exclusive_roles` limits the roles of some members.
+        """
+        self.sync_index()
+        if base_member_id is not None:
+            prefix = f'{base_member_id}.'
+            member_ids = [member_id for member_id in (self.member_index if member_ids is None else member_ids)
+                          if member_id.startswith(prefix)]
+
+        if member_ids is None and not member_exclusive_roles:
+            if incl_roles == 'all':
+                return [range(len(self.messages))]
+            return [self.role_index[role] for role in set(incl_roles) if role in self.role_index]
+
+        position_lists = []
+        for member_id in (self.member_index if member_ids is None else set(member_ids)):
+            role_buckets = self.member_index.get(member_id, {})
+            roles = role_buckets.keys() if incl_roles == 'all' else set(incl_roles)
+            if member_id in member_exclusive_roles:
+                roles = [role for role in roles if role in member_exclusive_roles[member_id]]
+            position_lists.extend(role_buckets[role] for role in roles if role in role_buckets)
+        return position_lists
+
+    def get_positions(self, incl_roles='all', calling_member_id='0', base_member_id=None, last_only=False):
+        """Returns (the sorted positions in `self.messages` of the messages the member sees, its member structures)"""
+        input_member_ids, member_exclusive_roles, member_structures = self.get_input_filters(calling_member_id)
 
         # get all member ids to include in the response, not just inputs
         all_member_ids = input_member_ids + [calling_member_id]
@@ -254,22 +412,36 @@ class MessageHistory:
         # get all messages that match the criteria
         # if message is in `incl_roles`, and the member is at the same depth,
         # and the member is in the input list (if no inputs, include all)
+        position_lists = self.get_position_lists(
+            incl_roles,
+            member_ids=all_member_ids if len(input_member_ids) > 0 else None,
+            member_exclusive_roles=member_exclusive_roles,
+            base_member_id=base_member_id,
+        )
+        if last_only:
+            last_position = max((positions[-1] for positions in position_lists if len(positions) > 0), default=None)
+            positions = [] if last_position is None else [last_position]
+        elif len(position_lists) == 1:
+            positions = position_lists[0]
+        else:
+            positions = list(heapq.merge(*position_lists))
+        return positions, member_structures
+
+    def get(self, incl_roles='all', calling_member_id='0', base_member_id=None, last_only=False):
+        positions, member_structures = self.get_positions(incl_roles, calling_member_id, base_member_id, last_only)
+        messages = self.messages
+        return self.get_msg_dicts((messages[position] for position in positions), calling_member_id, member_structures)
+
+    def get_msg_dicts(self, msgs, calling_member_id, member_structures):
+        """Message dicts of Message objects, seen by the calling member"""
         msgs = [
             {
                 'id': msg.id,
-                'role': msg.role if msg.role not in ('user', 'assistant')
-                else 'user' if (msg.member_id != calling_member_id or msg.role == 'user')
-                else 'assistant',
+                'role': get_member_role(msg, calling_member_id),
                 'member_id': msg.member_id,
                 'content': msg.content,
                 'alt_turn': msg.alt_turn,
-            } for msg in self.messages
-            if (incl_roles == 'all' or msg.role in incl_roles)
-            and (base_member_id is None or msg.member_id.startswith(f'{base_member_id}.'))
-            and (len(input_member_ids) == 0 or msg.member_id in all_member_ids)
-            and ((msg.member_id not in member_exclusive_roles)
-                or msg.role in member_exclusive_roles.get(msg.member_id, []))
-               # and msg.member_id.count('.') == calling_member_id.count('.')
+            } for msg in msgs
         ]
 
         # member_structures = {}  # {full_member_id: structure_field}
@@ -294,8 +466,13 @@ class MessageHistory:
 
         return expanded_msgs
 
-    def get_llm_messages(self, calling_member_id='0', msg_limit=None, max_turns=None):
-        msgs = self.get(incl_roles='all', calling_member_id=calling_member_id)
+    async def get_llm_messages(self, calling_member_id='0', msg_limit=None, max_turns=None, token_budget=None):
+        """
+        The messages the calling member sends to its model.
+        Limits and the token budget are applied to the Message objects, walking back from the latest one,
+        so only the messages that are kept are built into dicts.
+        """
+        positions, member_structures = self.get_positions(incl_roles='all', calling_member_id=calling_member_id)
         llm_accepted_roles = ('user', 'assistant', 'system', 'function', 'code', 'output', 'tool', 'result')
 
         member_id = calling_member_id.split('.')[-1]
@@ -314,7 +491,9 @@ class MessageHistory:
             # and msg['role'] in llm_accepted_roles
         ]
 
-        msgs = preloaded_msgs + msgs
+        messages = self.messages
+        msgs = preloaded_msgs + [messages[position] for position in positions]  # preloaded dicts, then Message objects
+        all_msgs = msgs
 
         # Apply maximum limits
         if msg_limit is None:
@@ -325,8 +504,9 @@ class MessageHistory:
             state_change_count = 0
             c_state = self.alt_turn_state
             for i, msg in enumerate(reversed(msgs)):
-                if msg['alt_turn'] != c_state:
-                    c_state = msg['alt_turn']
+                alt_turn = msg.get('alt_turn') if isinstance(msg, dict) else msg.alt_turn
+                if alt_turn != c_state:
+                    c_state = alt_turn
                     state_change_count += 1
                 if state_change_count >= max_turns:
                     msgs = msgs[len(msgs) - i:]
@@ -336,9 +516,31 @@ class MessageHistory:
             if len(msgs) > msg_limit:
                 msgs = msgs[-msg_limit:]
 
+        summary_msg = None
+        if token_budget is None and member_config.get('chat.token_budget', False):
+            token_budget = self.get_token_budget(calling_member, member_config)
+        if token_budget:
+            model_obj = self.get_member_model(calling_member, member_config)
+            summarize = SUMMARY_STRATEGIES.get(member_config.get('chat.summary_strategy'))
+            summary_tokens = token_budget // 8 if summarize else 0
+            msgs, older_msgs = self.fit_token_budget(msgs, token_budget - summary_tokens, model_obj.get('model_name'))
+            if summarize and older_msgs:
+                summary = await self.get_summary(calling_member_id, member_config['chat.summary_strategy'],
+                                                 older_msgs, model_obj, summary_tokens)
+                if summary:
+                    summary_msg = {'role': 'system', 'content': f"Summary of the earlier conversation:\n\n{summary}"}
+
         if len(msgs) == 0:
             return []
 
+        memory_msg = None
+        memory_results = member_config.get('chat.memory_results', None)
+        if memory_results and len(msgs) < len(all_msgs):
+            memory_msg = await self.get_memory_message(all_msgs[:len(all_msgs) - len(msgs)], msgs, memory_results, calling_member_id)
+
+        first_msg_position = next((i for i, msg in enumerate(msgs) if not isinstance(msg, dict)), len(msgs))
+        msgs = msgs[:first_msg_position] + self.get_msg_dicts(msgs[first_msg_position:], calling_member_id, member_structures)
+
         # Final LLM formatting
         llm_msgs = []
         for msg in msgs:
@@ -422,14 +624,129 @@ class MessageHistory:
             if first_msg.get('role', '') != 'user':
                 llm_msgs.pop(0)
 
+        if memory_msg:
+            llm_msgs.insert(0, memory_msg)
+        if summary_msg:
+            llm_msgs.insert(0, summary_msg)
+
         accepted_keys = ('role', 'content', 'name', 'function_call', 'tool_call_id', 'tool_calls')  #!toolcall!#
         llm_msgs = [{k: v for k, v in msg.items() if k in accepted_keys}
                     for msg in llm_msgs]
 
         return llm_msgs
 
+    def get_member_model(self, member, member_config):
+        model_key = getattr(member, 'model_config_key', 'chat.model')
+        model_json = member_config.get(model_key) or \
+            self.workflow.system.config.dict.get('system.default_chat_model', 'mistral/mistral-large-latest')
+        return convert_model_json_to_obj(model_json)
+
+    def get_token_budget(self, member, member_config):
+        """Tokens available for messages: the model's context window minus the response and system message"""
+        model_obj = self.get_member_model(member, member_config)
+        context_window = self.workflow.system.providers.get_context_window(model_obj) or DEFAULT_CONTEXT_WINDOW
+        response_tokens = model_obj.get('model_params', {}).get('max_tokens') or min(4096, context_window // 4)
+        system_tokens = count_tokens(member_config.get('chat.sys_msg', ''), model_obj.get('model_name'))
+        return max(context_window - response_tokens - system_tokens, 0)
+
+    def get_message(self, msg_id) -> Optional[Message]:
+        index = bisect.bisect_left(self.messages, msg_id, key=lambda msg: msg.id)
+        if index < len(self.messages) and self.messages[index].id == msg_id:
+            return self.messages[index]
+        return None
+
+    def get_msg_token_count(self, msg, model_name=None):
+        """Tokens of a Message, cached, or of a preloaded message dict"""
+        if isinstance(msg, dict):
+            return count_tokens(msg['content'], model_name) + MESSAGE_TOKEN_OVERHEAD
+        return msg.get_token_count(model_name) + MESSAGE_TOKEN_OVERHEAD
+
+    def fit_token_budget(self, msgs, token_budget, model_name=None):
+        """
+        Walks back from the latest message (Message objects, or preloaded message dicts) until the budget is reached,
+        returns (the messages that fit, the older messages that didn't).
+        Consecutive tool calls and results are kept or cut together, the latest message is always kept.
+        """
+        tool_roles = ('tool', 'result')
+        used_tokens = 0
+        start = len(msgs)
+        while start > 0:
+            group_start = start - 1
+            while group_start > 0 and get_role(msgs[group_start]) in tool_roles and get_role(msgs[group_start - 1]) in tool_roles:
+                group_start -= 1
+            group_tokens = sum(self.get_msg_token_count(msg, model_name) for msg in msgs[group_start:start])
+            if used_tokens + group_tokens > token_budget and start < len(msgs):
+                break
+            used_tokens += group_tokens
+            start = group_start
+
+        # never start with a result without its call
+        while start < len(msgs) - 1 and get_role(msgs[start]) == 'result':
+            start += 1
+        return msgs[start:], msgs[:start]
+
+    async def get_summary(self, calling_member_id, strategy_name, older_msgs, model_obj, max_tokens):
+        """Summarizes the messages cut by the token budget, extending the previous summary when only new ones were cut"""
+        older_msgs = [msg for msg in older_msgs if not isinstance(msg, dict)]  # preloaded messages are always kept
+        if not older_msgs:
+            return None
+
+        key = (self.workflow.leaf_id, calling_member_id, strategy_name)
+        last_id = older_msgs[-1].id
+        previous_id, previous_summary = self.summaries.get(key, (None, ''))
+        if previous_id == last_id:
+            return previous_summary
+        if previous_id is not None and previous_id < last_id:
+            older_msgs = [msg for msg in older_msgs if msg.id > previous_id]
+        else:
+            previous_summary = ''
+
+        older_msgs = [{'id': msg.id, 'role': get_member_role(msg, calling_member_id), 'content': msg.content}
+                      for msg in older_msgs]
+        try:
+            summary = SUMMARY_STRATEGIES[strategy_name](previous_summary, older_msgs, model_obj, max_tokens)
+            if inspect.isawaitable(summary):
+                summary = await summary
+        except Exception as e:
+            print(f"Error summarizing messages: {e}")
+            return previous_summary or None
+        self.summaries[key] = (last_id, summary)
+        return summary
+
+    async def get_memory_message(self, dropped_msgs, kept_msgs, max_results, calling_member_id='0'):
+        """
+        Retrieves the earlier messages (cut by the message limits) most relevant to the last message,
+        from the local vector memory, as a system message.
+        """
+        vectordbs = self.workflow.system.vectordbs
+        if not vectordbs.memory_enabled:
+            return None
+
+        query_msg = next((msg for msg in reversed(kept_msgs) if get_role(msg, calling_member_id) == 'user'), kept_msgs[-1])
+        query = query_msg['content'] if isinstance(query_msg, dict) else query_msg.content
+        dropped_msgs = {msg.id: msg for msg in dropped_msgs if not isinstance(msg, dict)}
+        if not dropped_msgs or not query:
+            return None
+
+        try:
+            results = await asyncio.to_thread(  # embedding the query is a network request
+                vectordbs.search, 'messages', query, k=max_results, candidate_ids=set(dropped_msgs))
+        except ValueError:  # the embedding model has no embeddings, the memory stays unused
+            return None
+        except Exception as e:
+            print(f"Error retrieving memories: {e}")
+            return None
+        if not results:
+            return None
+
+        memory_str = '\n'.join(
+            f"{get_member_role(dropped_msgs[msg_id], calling_member_id)}: {dropped_msgs[msg_id].content}"
+            for msg_id, _ in sorted(results))  # in conversation order
+        return {'role': 'system', 'content': f"Relevant earlier messages from this conversation:\n\n{memory_str}"}
+
     def count(self, incl_roles=('user', 'assistant')):
-        return len([msg for msg in self.messages if msg.role in incl_roles])
+        self.sync_index()
+        return sum(len(self.role_index.get(role, [])) for role in set(incl_roles))
 
     def pop(self, indx, incl_roles=('user', 'assistant')):
         seen_cnt = -1
@@ -441,7 +758,7 @@ class MessageHistory:
                 return self.messages.pop(i)
 
     def last(self, incl_roles=('user', 'assistant')):
-        msgs = self.get(incl_roles=incl_roles)
+        msgs = self.get(incl_roles=incl_roles, last_only=True)
         return msgs[-1] if len(msgs) > 0 else None
 
     def last_role(self):
@@ -0,0 +1,107 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+
+class StartupProfiler:
+    """
+    Samples the stacks of every thread while the app starts (`--profile-startup`), and reports them as
+    collapsed stacks (`thread;frame;frame count`, for flamegraph.pl or speedscope) with the manager load timeline.
+    """
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.started_at = None
+        self.marks = []  # [(name, perf_counter)]
+        self.stack_counts = collections.Counter()
+        self.samples = 0
+        self.thread = None
+        self.stopped = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None and not self.stopped.is_set()
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.thread = threading.Thread(target=self.sample_stacks, name='StartupProfiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def mark(self, name):
+        """Records the end of a startup phase"""
+        if self.started_at is not None:
+            self.marks.append((name, time.perf_counter()))
+
+    def sample_stacks(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.stack_counts[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def get_collapsed_stacks(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in sorted(self.stack_counts.items()))
+
+    def get_top_functions(self, count=15):
+        """The functions with the most samples on top of a main thread stack (self time)"""
+        own_counts = collections.Counter()
+        for stack, samples in self.stack_counts.items():
+            frames = stack.split(';')
+            if frames[0] == 'MainThread' and len(frames) > 1:
+                own_counts[frames[-1]] += samples
+        return own_counts.most_common(count)
+
+    def report(self, load_timings, path='startup_profile.folded'):
+        """Stops sampling, writes the collapsed stacks to `path` and returns the text report"""
+        self.stop()
+        with open(path, 'w') as f:
+            f.write(self.get_collapsed_stacks())
+
+        lines = [f'Startup profile, {self.samples} samples every {self.interval * 1000:.0f}ms']
+        last = self.started_at
+        for name, at in self.marks:
+            lines.append(f'  {name:<24} {(at - self.started_at) * 1000:8.1f}ms  (+{(at - last) * 1000:.1f}ms)')
+            last = at
+        lines.append('')
+        lines.append(format_load_timeline(load_timings))
+        lines.append('')
+        lines.append('Main thread self time:')
+        for function, samples in self.get_top_functions():
+            lines.append(f'  {samples * self.interval * 1000:8.1f}ms  {function}')
+        lines.append('')
+        lines.append(f'Collapsed stacks written to {os.path.abspath(path)} (open with speedscope or flamegraph.pl)')
+        return '\n'.join(lines)
+
+
+def format_load_timeline(load_timings, width=40):
+    """A row per manager load: start, duration, thread and a bar on the shared time axis"""
+    if not load_timings:
+        return 'No managers loaded'
+    first = min(start for start, _, _ in load_timings.values())
+    last = max(end for _, end, _ in load_timings.values())
+    scale = width / max(last - first, 1e-9)
+    lines = [f'Manager loads, {(last - first) * 1000:.1f}ms:']
+    for name, (start, end, thread_name) in sorted(load_timings.items(), key=lambda item: item[1][0]):
+        offset = int((start - first) * scale)
+        bar = ' ' * offset + '#' * max(1, int((end - start) * scale))
+        lines.append(f'  {name:<16} {(start - first) * 1000:7.1f}ms {(end - start) * 1000:7.1f}ms  '
+                     f'{thread_name:<16} |{bar:<{width}}|')
+    return '\n'.join(lines)
+
+
+startup_profiler = StartupProfiler()
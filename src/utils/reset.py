@@ -5,7 +5,7 @@ import sys
 
 from PySide6.QtWidgets import QMessageBox
 from src.utils import sql
-from src.utils.helpers import display_message_box
+from src.gui.helpers import display_message_box
 
 
 def reset_application():
@@ -21,6 +21,7 @@ def reset_application():
     backup_filepath = sql.get_db_path() + '.backup'
     while os.path.isfile(backup_filepath):
         backup_filepath += '.backup'
+    sql.close_connections()  # checkpoint the WAL so the backup is complete
     shutil.copyfile(sql.get_db_path(), backup_filepath)
 
     reset_table(table_name='pypi_packages')
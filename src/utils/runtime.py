@@ -0,0 +1,135 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import AsyncIterator, Coroutine, Iterable, Optional
+
+
+class WorkflowRuntime:
+    """
+    Owns a single long-lived event loop, running on a dedicated daemon thread.
+    Every workflow, block and tool coroutine is scheduled here, so clients bound to the loop
+    (litellm http sessions, realtime websockets) are reused across turns instead of torn down by `asyncio.run`.
+    """
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.futures = set()
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return self.loop
+
+            loop_ready = threading.Event()
+            self.loop = asyncio.new_event_loop()
+
+            def run_loop():
+                asyncio.set_event_loop(self.loop)
+                loop_ready.set()
+                self.loop.run_forever()
+
+            self.thread = threading.Thread(target=run_loop, name='WorkflowRuntime', daemon=True)
+            self.thread.start()
+            loop_ready.wait()
+            return self.loop
+
+    def stop(self, timeout=5):
+        with self.lock:
+            if not self.thread or not self.thread.is_alive():
+                return
+            loop, thread = self.loop, self.thread
+
+        self.cancel_all()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+        with self.lock:
+            self.loop = None
+            self.thread = None
+
+    def in_runtime_thread(self):
+        return self.thread is not None and threading.current_thread() is self.thread
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedules a coroutine on the runtime loop from any thread, returns a thread-safe future."""
+        loop = self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        with self.lock:
+            self.futures.add(future)
+        future.add_done_callback(self.discard_future)
+        return future
+
+    def discard_future(self, future):
+        with self.lock:
+            self.futures.discard(future)
+
+    def cancel(self, future: concurrent.futures.Future):
+        """Cancels a submitted coroutine, the cancellation is propagated to its task on the runtime loop."""
+        return future.cancel()
+
+    def cancel_all(self):
+        with self.lock:
+            futures = list(self.futures)
+        for future in futures:
+            future.cancel()
+
+    def run(self, coro: Coroutine, timeout=None):
+        """
+        Runs a coroutine on the runtime loop and blocks until it's done, for the GUI and worker threads.
+        Code running on the runtime loop awaits the coroutine instead (e.g. `compute_block_async`),
+        blocking there would deadlock the loop.
+        """
+        if self.in_runtime_thread():
+            coro.close()
+            raise RuntimeError('runtime.run() was called from the runtime loop, await the coroutine instead')
+        return self.submit(coro).result(timeout)
+
+
+async def iterate_in_thread(iterable: Iterable) -> AsyncIterator:
+    """
+    Iterates a blocking iterable (e.g. a sync sdk stream) on a worker thread and yields its items on the running loop,
+    so a slow stream only holds up the coroutine consuming it instead of every coroutine on the runtime.
+    Closing or cancelling the consumer stops the worker before its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+    done = object()
+
+    def put(item, error=None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:  # the loop was closed
+            stopped.set()
+
+    def iterate():
+        error = None
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if stopped.is_set():
+                    break
+                put(item)
+        except Exception as e:
+            error = e
+        finally:
+            if stopped.is_set() and hasattr(iterator, 'close'):
+                iterator.close()
+        put(done, error)
+
+    threading.Thread(target=iterate, name='iterate_in_thread', daemon=True).start()
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+runtime = WorkflowRuntime()
@@ -0,0 +1,77 @@
+import re
+
+from src.utils import sql
+
+MAX_SEARCH_CONTEXTS = 1000
+
+
+def to_fts_query(text):
+    """
+    Converts search box text to an FTS5 query, every word must match and the last word matches as a prefix.
+    Words are quoted so FTS5 operators and punctuation in the text are never interpreted.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return ''
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def search_messages(text, limit=50, offset=0, highlight=('<b>', '</b>')):
+    """Returns the messages matching `text`, best first, as a list of (context_id, msg_id, snippet)"""
+    fts_query = to_fts_query(text)
+    if not fts_query:
+        return []
+
+    return sql.get_results("""
+        SELECT
+            m.context_id,
+            m.id,
+            snippet(contexts_messages_fts, 0, ?, ?, '...', 12)
+        FROM contexts_messages_fts f
+        JOIN contexts_messages m ON m.id = f.rowid
+        WHERE contexts_messages_fts MATCH ?
+        ORDER BY f.rank
+        LIMIT ? OFFSET ?""", (highlight[0], highlight[1], fts_query, limit, offset))
+
+
+def search_root_context_ids(text, limit=MAX_SEARCH_CONTEXTS):
+    """
+    Returns the ids of the root contexts with a name or any message (including in branches) matching `text`.
+    Used by the contexts list, which only shows root contexts.
+    """
+    fts_query = to_fts_query(text)
+    name_pattern = '%' + re.sub(r'([\\%_])', r'\\\1', text.strip()) + '%'
+    message_matches = """
+            SELECT m.context_id
+            FROM contexts_messages_fts f
+            JOIN contexts_messages m ON m.id = f.rowid
+            WHERE contexts_messages_fts MATCH ?
+            UNION""" if fts_query else ''
+    params = (fts_query, name_pattern, limit) if fts_query else (name_pattern, limit)
+
+    rows = sql.get_results(f"""
+        WITH RECURSIVE matches(id) AS ({message_matches}
+            SELECT id
+            FROM contexts
+            WHERE name LIKE ? ESCAPE '\\'
+        ),
+        ancestors(id, parent_id) AS (
+            SELECT c.id, c.parent_id
+            FROM contexts c
+            JOIN matches mt ON mt.id = c.id
+            UNION
+            SELECT c.id, c.parent_id
+            FROM contexts c
+            JOIN ancestors a ON c.id = a.parent_id
+        )
+        SELECT id
+        FROM ancestors
+        WHERE parent_id IS NULL
+        LIMIT ?""", params)
+    return [row[0] for row in rows]
+
+
+def rebuild_search_index():
+    """Creates the message search index if it doesn't exist, and rebuilds it from contexts_messages"""
+    from src.utils.sql_upgrade import upgrade_script
+    upgrade_script.create_messages_search_index()
@@ -1,37 +1,136 @@
+import json
 import os.path
 import re
 import sqlite3
 import threading
+import weakref
 from contextlib import contextmanager
 
 from numpy.core.defchararray import upper
 from packaging import version
 
-from src.utils.helpers import convert_to_safe_case
+from src.utils.helpers import convert_to_safe_case, get_avatar_paths_from_config
 
 sql_thread_lock = threading.Lock()
 
 DB_FILEPATH = None  # None will use default
 WRITE_TO_COPY = False
 
+CONNECTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,  # 256 MB
+    'cache_size': -16000,  # 16 MB
+    'temp_store': 'MEMORY',
+}
+STATEMENT_CACHE_SIZE = 256
+
+
+def context_avatar_paths(config_json):
+    """The merged avatar paths of a context config, stored in `contexts.avatar_paths` for the contexts list"""
+    try:
+        return get_avatar_paths_from_config(json.loads(config_json or '{}'), merge_multiple=True)
+    except Exception:
+        return ''
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3.Connection subclass, only needed so the pool can hold weak references to it."""
+    pass
+
+
+class ConnectionPool:
+    """
+    Holds one long-lived connection per (thread, db path).
+    Connections run in autocommit mode, each statement is its own transaction unless one is opened explicitly.
+    Prepared statements are cached per connection by sqlite3 (`cached_statements`).
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = weakref.WeakSet()  # all open connections, across threads
+        self._generation = 0
+
+    def get_connection(self, db_path) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            local.connections = {}
+            local.generation = self._generation
+
+        conn = local.connections.get(db_path)
+        if conn is None:
+            conn = self.connect(db_path)
+            local.connections[db_path] = conn
+        return conn
+
+    def connect(self, db_path) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            db_path,
+            isolation_level=None,
+            check_same_thread=False,  # only so close_all() can close connections owned by other threads
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=PooledConnection,
+        )
+        for pragma, value in CONNECTION_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+
+        with self._lock:
+            self._connections.add(conn)
+        return conn
+
+    def close_all(self):
+        """
+        Closes every pooled connection in every thread, checkpointing the WAL first.
+        Threads will transparently reconnect on their next query.
+        Only call this when no other thread is mid-query (e.g. before copying or renaming the db file).
+        """
+        with self._lock:
+            self._generation += 1
+            connections = list(self._connections)
+            self._connections = weakref.WeakSet()
+
+        for conn in connections:
+            try:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                pass
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+connection_pool = ConnectionPool()
+_resolved_db_path = None
+
 
 @contextmanager
 def write_to_copy():
     """Context manager to write to db copy."""
-    global WRITE_TO_COPY
+    global WRITE_TO_COPY, _resolved_db_path
     try:
+        connection_pool.close_all()
         WRITE_TO_COPY = True
+        _resolved_db_path = None
         yield
     finally:
+        connection_pool.close_all()
         WRITE_TO_COPY = False
+        _resolved_db_path = None
 
 
 def set_db_filepath(path: str):
-    global DB_FILEPATH
+    global DB_FILEPATH, _resolved_db_path
     DB_FILEPATH = path
+    _resolved_db_path = None
+    connection_pool.close_all()
 
 
 def get_db_path():
+    global _resolved_db_path
+    if _resolved_db_path is not None:
+        return _resolved_db_path
+
     from src.utils.filesystem import get_application_path
     # Check if we're running as a script or a frozen exe
     if DB_FILEPATH:
@@ -45,29 +144,36 @@ def get_db_path():
     path = os.path.join(application_path, 'data.db')
     if WRITE_TO_COPY:
         path = path + '.copy'
+    _resolved_db_path = path
     return path
 
 
+def get_connection() -> sqlite3.Connection:
+    return connection_pool.get_connection(get_db_path())
+
+
+def close_connections():
+    connection_pool.close_all()
+
+
 def execute(query, params=None):
     with sql_thread_lock:
-        db_path = get_db_path()
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
-
+        finally:
             cursor.close()
-            return cursor.lastrowid
+        return cursor.lastrowid
 
 
 def get_results(query, params=None, return_type='rows', incl_column_names=False):
-    db_path = get_db_path()
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
         if params:
             param_list = [
                 p() if callable(p) else p
@@ -78,6 +184,7 @@ def get_results(query, params=None, return_type='rows', incl_column_names=False)
             cursor.execute(query)
 
         rows = cursor.fetchall()
+    finally:
         cursor.close()
 
     col_names = [description[0] for description in cursor.description]
@@ -106,24 +213,39 @@ def get_results(query, params=None, return_type='rows', incl_column_names=False)
 
 
 def get_scalar(query, params=None, return_type='single'):
-    db_path = get_db_path()
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
         if params:
             cursor.execute(query, params)
         else:
             cursor.execute(query)
 
         row = cursor.fetchone()
+    finally:
         cursor.close()
 
-        if row is None:
-            return None
-        if return_type == 'single':
-            return row[0]
-        elif return_type == 'tuple':
-            return row
+    if row is None:
+        return None
+    if return_type == 'single':
+        return row[0]
+    elif return_type == 'tuple':
+        return row
+
+
+def update_context_avatar_paths():
+    """
+    Fills `avatar_paths` of the root contexts that don't have it, the summary triggers clear it when a config
+    changes. Called before the contexts list loads, so contexts written by any connection are picked up.
+    """
+    rows = get_results("""
+        SELECT id, config
+        FROM contexts
+        WHERE avatar_paths IS NULL AND parent_id IS NULL""")
+    if not rows:
+        return
+    query = "UPDATE contexts SET avatar_paths = ? WHERE id = ? AND avatar_paths IS NULL"
+    execute_multiple([query] * len(rows), [(context_avatar_paths(config), context_id) for context_id, config in rows])
 
 
 def check_database_upgrade():
@@ -147,19 +269,20 @@ def check_database_upgrade():
 
 def execute_multiple(queries, params_list):
     with sql_thread_lock:
-        db_path = get_db_path()
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
+        conn = get_connection()
+        cursor = conn.cursor()
 
-            try:
-                for query, params in zip(queries, params_list):
-                    cursor.execute(query, params)
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                raise
-            finally:
-                cursor.close()
+        try:
+            cursor.execute("BEGIN")
+            for query, params in zip(queries, params_list):
+                cursor.execute(query, params)
+            cursor.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+        finally:
+            cursor.close()
 
 
 def define_table(table_name):
@@ -16,8 +16,143 @@ class SQLUpgrade:
             '0.2.0': self.v0_2_0,
             '0.3.0': self.v0_3_0,
             '0.4.0': self.v0_4_0,
+            '0.4.1': self.v0_4_1,
         }
 
+    def v0_4_1(self):
+        # indexes for the message history and context tree queries
+        sql.execute("""
+            CREATE INDEX IF NOT EXISTS idx_contexts_messages_context_id
+            ON contexts_messages (context_id, id)""")
+        sql.execute("""
+            CREATE INDEX IF NOT EXISTS idx_contexts_parent_id
+            ON contexts (parent_id, active, branch_msg_id)""")
+        sql.execute("""
+            CREATE INDEX IF NOT EXISTS idx_contexts_kind
+            ON contexts (kind, parent_id)""")
+        sql.execute("""
+            CREATE INDEX IF NOT EXISTS idx_contexts_branch_msg_id
+            ON contexts (branch_msg_id)""")
+
+        self.create_contexts_summary()
+        self.create_messages_search_index()
+
+        sql.execute("""
+            UPDATE settings SET value = '0.4.1' WHERE field = 'app_version'""")
+
+    def create_contexts_summary(self):
+        """
+        Denormalized columns read by the contexts list, so it doesn't parse every config or scan contexts_messages.
+        Kept up to date by triggers using only built-in json functions, so any connection can write contexts.
+        A config change clears avatar_paths, which `sql.update_context_avatar_paths` fills in from python.
+        """
+        existing_columns = [row[1] for row in sql.get_results("PRAGMA table_info(contexts)")]
+        for column, column_type in [('last_message_id', 'INTEGER'), ('member_summary', 'TEXT'), ('avatar_paths', 'TEXT')]:
+            if column not in existing_columns:
+                sql.execute(f"ALTER TABLE contexts ADD COLUMN {column} {column_type}")
+
+        member_summary = """
+            CASE
+                WHEN json_extract({config}, '$.members') IS NOT NULL THEN
+                    CASE
+                        WHEN json_array_length(json_extract({config}, '$.members')) > 2 THEN
+                            json_array_length(json_extract({config}, '$.members')) || ' members'
+                        WHEN json_array_length(json_extract({config}, '$.members')) = 2 THEN
+                            COALESCE(json_extract(json_extract({config}, '$.members'), '$[1].config."info.name"'), 'Assistant')
+                        WHEN json_extract(json_extract({config}, '$.members'), '$[1].config._TYPE') = 'agent' THEN
+                            json_extract(json_extract({config}, '$.members'), '$[1].config."info.name"')
+                        ELSE
+                            json_array_length(json_extract({config}, '$.members')) || ' members'
+                    END
+                ELSE
+                    CASE
+                        WHEN json_extract({config}, '$._TYPE') = 'workflow' THEN
+                            '1 member'
+                        ELSE
+                            COALESCE(json_extract({config}, '$."info.name"'), 'Assistant')
+                    END
+            END"""
+
+        sql.execute("DROP TRIGGER IF EXISTS contexts_summary_insert")
+        sql.execute(f"""
+            CREATE TRIGGER contexts_summary_insert AFTER INSERT ON contexts
+            BEGIN
+                UPDATE contexts
+                SET member_summary = {member_summary.format(config='NEW.config')}
+                WHERE id = NEW.id;
+            END""")
+        sql.execute("DROP TRIGGER IF EXISTS contexts_summary_update")
+        sql.execute(f"""
+            CREATE TRIGGER contexts_summary_update AFTER UPDATE OF config ON contexts
+            BEGIN
+                UPDATE contexts
+                SET member_summary = {member_summary.format(config='NEW.config')},
+                    avatar_paths = CASE WHEN NEW.avatar_paths IS OLD.avatar_paths THEN NULL ELSE NEW.avatar_paths END
+                WHERE id = NEW.id;
+            END""")
+
+        sql.execute("DROP TRIGGER IF EXISTS contexts_messages_summary_insert")
+        sql.execute("""
+            CREATE TRIGGER contexts_messages_summary_insert AFTER INSERT ON contexts_messages
+            BEGIN
+                UPDATE contexts SET last_message_id = NEW.id
+                WHERE id = NEW.context_id AND COALESCE(last_message_id, 0) < NEW.id;
+            END""")
+        sql.execute("DROP TRIGGER IF EXISTS contexts_messages_summary_delete")
+        sql.execute("""
+            CREATE TRIGGER contexts_messages_summary_delete AFTER DELETE ON contexts_messages
+            BEGIN
+                UPDATE contexts
+                SET last_message_id = (SELECT MAX(id) FROM contexts_messages WHERE context_id = OLD.context_id)
+                WHERE id = OLD.context_id AND last_message_id = OLD.id;
+            END""")
+
+        # backfill
+        sql.execute(f"""
+            UPDATE contexts
+            SET member_summary = {member_summary.format(config='config')},
+                avatar_paths = NULL,
+                last_message_id = (SELECT MAX(id) FROM contexts_messages WHERE context_id = contexts.id)""")
+
+        sql.execute("""
+            CREATE INDEX IF NOT EXISTS idx_contexts_list
+            ON contexts (kind, parent_id, pinned DESC, last_message_id DESC, id DESC)""")
+        sql.execute("""
+            CREATE INDEX IF NOT EXISTS idx_contexts_avatar_paths_null
+            ON contexts (id) WHERE avatar_paths IS NULL AND parent_id IS NULL""")
+        sql.update_context_avatar_paths()
+
+    def create_messages_search_index(self):
+        """
+        FTS5 index over contexts_messages.msg, kept in sync by triggers and searched by `src.utils.search`.
+        Also used to rebuild the index of an existing database, rebuilding is safe to run at any time.
+        """
+        sql.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS contexts_messages_fts
+            USING fts5(msg, content='contexts_messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""")
+
+        sql.execute("DROP TRIGGER IF EXISTS contexts_messages_fts_insert")
+        sql.execute("""
+            CREATE TRIGGER contexts_messages_fts_insert AFTER INSERT ON contexts_messages
+            BEGIN
+                INSERT INTO contexts_messages_fts (rowid, msg) VALUES (NEW.id, NEW.msg);
+            END""")
+        sql.execute("DROP TRIGGER IF EXISTS contexts_messages_fts_delete")
+        sql.execute("""
+            CREATE TRIGGER contexts_messages_fts_delete AFTER DELETE ON contexts_messages
+            BEGIN
+                INSERT INTO contexts_messages_fts (contexts_messages_fts, rowid, msg) VALUES ('delete', OLD.id, OLD.msg);
+            END""")
+        sql.execute("DROP TRIGGER IF EXISTS contexts_messages_fts_update")
+        sql.execute("""
+            CREATE TRIGGER contexts_messages_fts_update AFTER UPDATE OF msg ON contexts_messages
+            BEGIN
+                INSERT INTO contexts_messages_fts (contexts_messages_fts, rowid, msg) VALUES ('delete', OLD.id, OLD.msg);
+                INSERT INTO contexts_messages_fts (rowid, msg) VALUES (NEW.id, NEW.msg);
+            END""")
+
+        sql.execute("INSERT INTO contexts_messages_fts (contexts_messages_fts) VALUES ('rebuild')")
+
     def v0_4_0(self):
         sql.execute("DELETE FROM models WHERE api_id NOT IN (SELECT id FROM apis)")
 
@@ -1631,6 +1766,7 @@ class SQLUpgrade:
     def upgrade(self, current_version):
         # make a copy of the current data.db
         db_path = sql.get_db_path()
+        sql.close_connections()  # checkpoint the WAL so the copy is complete
         copy_to_path = db_path + '.copy'
         if os.path.isfile(copy_to_path):
             os.remove(copy_to_path)
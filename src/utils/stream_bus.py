@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class StreamBus:
+    """
+    Buffers streamed chunks between the workflow thread and the GUI.
+    Chunks are merged per (role, member_id) and drained by the GUI on a fixed cadence,
+    so the Qt event queue only ever holds a single wake-up instead of one event per chunk.
+    `publish` never blocks. When the GUI falls behind, `publish_async` awaits (up to `max_block_secs`) until the
+    buffer is drained, so a member on the runtime loop slows down without stalling the other tasks of the loop.
+    Text is never dropped, only the intermediate frames are.
+    """
+    def __init__(
+            self,
+            flush_interval_ms: int = 33,
+            max_pending_chars: int = 65536,
+            max_block_secs: float = 2.0,
+            on_ready: Optional[Callable[[], None]] = None,
+    ):
+        self.flush_interval_ms = flush_interval_ms
+        self.max_pending_chars = max_pending_chars
+        self.max_block_secs = max_block_secs
+        self.on_ready = on_ready  # called from the publishing thread when the buffer becomes non-empty
+
+        self.lock = threading.Lock()
+        self.pending: Dict[Tuple[str, str], List[str]] = OrderedDict()
+        self.pending_chunks = 0
+        self.pending_chars = 0
+        self.first_pending_time = None
+        self.capacity_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+        self.metrics = {
+            'published_chunks': 0,
+            'flushed_chunks': 0,
+            'flushes': 0,
+            'queue_depth': 0,
+            'max_queue_depth': 0,
+            'last_flush_latency': 0.0,
+            'max_flush_latency': 0.0,
+            'blocked_secs': 0.0,
+        }
+
+    def publish(self, role: str, member_id: str, chunk: str):
+        if not chunk:
+            return
+
+        with self.lock:
+            was_empty = self.pending_chunks == 0
+            if was_empty:
+                self.first_pending_time = time.perf_counter()
+            self.pending.setdefault((role, member_id), []).append(chunk)
+            self.pending_chunks += 1
+            self.pending_chars += len(chunk)
+
+            self.metrics['published_chunks'] += 1
+            self.metrics['queue_depth'] = self.pending_chunks
+            self.metrics['max_queue_depth'] = max(self.metrics['max_queue_depth'], self.pending_chunks)
+
+        if was_empty and self.on_ready:
+            self.on_ready()
+
+    async def publish_async(self, role: str, member_id: str, chunk: str):
+        """Publishes the chunk, then waits without blocking the loop while the buffer is full"""
+        self.publish(role, member_id, chunk)
+        await self.wait_for_capacity()
+
+    async def wait_for_capacity(self):
+        with self.lock:
+            if self.pending_chars < self.max_pending_chars:
+                return
+            loop = asyncio.get_running_loop()
+            waiter = loop.create_future()
+            self.capacity_waiters.append((loop, waiter))
+
+        block_start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_block_secs)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.lock:
+                if (loop, waiter) in self.capacity_waiters:
+                    self.capacity_waiters.remove((loop, waiter))
+                self.metrics['blocked_secs'] += time.perf_counter() - block_start
+
+    def wake_capacity_waiters(self):
+        """Called with the lock held, after the buffer is emptied"""
+        waiters, self.capacity_waiters = self.capacity_waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(set_waiter_done, waiter)
+            except RuntimeError:  # the loop is closed
+                pass
+
+    def drain(self) -> List[Tuple[str, str, str]]:
+        """Returns the merged (role, member_id, text) of every pending key, in the order they first arrived."""
+        with self.lock:
+            if self.pending_chunks == 0:
+                return []
+
+            sentences = [(role, member_id, ''.join(chunks)) for (role, member_id), chunks in self.pending.items()]
+            latency = time.perf_counter() - self.first_pending_time
+
+            self.metrics['flushed_chunks'] += self.pending_chunks
+            self.metrics['flushes'] += 1
+            self.metrics['queue_depth'] = 0
+            self.metrics['last_flush_latency'] = latency
+            self.metrics['max_flush_latency'] = max(self.metrics['max_flush_latency'], latency)
+
+            self.pending = OrderedDict()
+            self.pending_chunks = 0
+            self.pending_chars = 0
+            self.first_pending_time = None
+            self.wake_capacity_waiters()
+
+        return sentences
+
+    def clear(self):
+        """Discards pending chunks, e.g. when the turn ends and the bubbles are reloaded from the database."""
+        with self.lock:
+            self.pending = OrderedDict()
+            self.pending_chunks = 0
+            self.pending_chars = 0
+            self.first_pending_time = None
+            self.metrics['queue_depth'] = 0
+            self.wake_capacity_waiters()
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            return dict(self.metrics)
+
+
+def set_waiter_done(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -0,0 +1,68 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import tiktoken
+
+DEFAULT_ENCODING = 'cl100k_base'
+
+
+class TokenCounter:
+    """
+    Caches one tiktoken encoder per model, and token counts in an LRU keyed by (encoding, content hash).
+    Models without a tiktoken encoding (claude, mistral, llama etc.) fall back to `DEFAULT_ENCODING`,
+    which is a close approximation for counting purposes.
+    """
+    def __init__(self, max_cached_counts=8192):
+        self.max_cached_counts = max_cached_counts
+        self.encoders = {}  # {model_name: Encoding}
+        self.counts = OrderedDict()  # {(encoding_name, content_hash): token_count}
+        self.lock = threading.Lock()
+
+    def get_encoder(self, model_name: Optional[str] = None) -> tiktoken.Encoding:
+        encoder = self.encoders.get(model_name)
+        if encoder is not None:
+            return encoder
+
+        encoder = None
+        if model_name:
+            # litellm style names have a provider prefix, e.g. `openai/gpt-4o`
+            for name in (model_name, model_name.split('/')[-1]):
+                try:
+                    encoder = tiktoken.encoding_for_model(name)
+                    break
+                except KeyError:
+                    continue
+        if encoder is None:
+            encoder = tiktoken.get_encoding(DEFAULT_ENCODING)
+
+        self.encoders[model_name] = encoder
+        return encoder
+
+    def count(self, content: Optional[str], model_name: Optional[str] = None) -> int:
+        if not content:
+            return 0
+
+        encoder = self.get_encoder(model_name)
+        content_hash = hashlib.blake2b(content.encode('utf-8', errors='replace'), digest_size=16).digest()
+        key = (encoder.name, content_hash)
+        with self.lock:
+            count = self.counts.get(key)
+            if count is not None:
+                self.counts.move_to_end(key)
+                return count
+
+        count = len(encoder.encode(content, disallowed_special=()))
+        with self.lock:
+            self.counts[key] = count
+            if len(self.counts) > self.max_cached_counts:
+                self.counts.popitem(last=False)
+        return count
+
+
+token_counter = TokenCounter()
+
+
+def count_tokens(content: Optional[str], model_name: Optional[str] = None) -> int:
+    return token_counter.count(content, model_name)
@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.system.blocks import BlockManager
+
+PROMPT_SECS = 0.05
+
+
+class TestBlockExpansion(unittest.TestCase):
+    def setUp(self):
+        self.config = {}
+        self.block_manager = BlockManager(SimpleNamespace(config=SimpleNamespace(dict=self.config)))
+        self.block_manager.blocks = {
+            'name': {'_TYPE': 'block', 'block_type': 'Text', 'data': 'Jb'},
+            'greeting': {'_TYPE': 'block', 'block_type': 'Text', 'data': 'Hello {name}'},
+            'loop_a': {'_TYPE': 'block', 'block_type': 'Text', 'data': '{loop_b}'},
+            'loop_b': {'_TYPE': 'block', 'block_type': 'Text', 'data': '{loop_a}'},
+            **{
+                f'prompt_{i}': {'_TYPE': 'block', 'block_type': 'Prompt', 'data': f'Prompt {i} for {{name}}'}
+                for i in range(5)
+            },
+        }
+        self.workflow_runs = []
+        self.running = 0
+        self.peak_running = 0
+
+        async def receive_workflow(config, kind, params=None, tool_uuid=None, chat_title=''):
+            self.workflow_runs.append(chat_title)
+            self.running += 1
+            self.peak_running = max(self.peak_running, self.running)
+            await asyncio.sleep(PROMPT_SECS)
+            self.running -= 1
+            # nested blocks are expanded by the block member, from within the workflow
+            yield 'block', await self.block_manager.format_string_async(config['data'])
+
+        patcher = mock.patch('src.system.blocks.receive_workflow', receive_workflow)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_text_blocks_expanded_without_workflow(self):
+        content = self.block_manager.format_string('{greeting}, {unknown}')
+        self.assertEqual(content, 'Hello Jb, {unknown}')
+        self.assertEqual(self.workflow_runs, [])
+
+    def test_prompt_blocks_run_concurrently(self):
+        content = ' '.join(f'{{prompt_{i}}}' for i in range(5))
+
+        result = self.block_manager.format_string(content)
+
+        self.assertEqual(result, ' '.join(f'Prompt {i} for Jb' for i in range(5)))
+        self.assertEqual(sorted(self.workflow_runs), [f'prompt_{i}' for i in range(5)])
+        self.assertEqual(self.peak_running, 5)
+
+    def test_prompt_blocks_not_turn_cached(self):
+        # their responses are reused by the response cache instead, see test_response_cache
+        self.block_manager.format_string('{prompt_0}')
+        self.block_manager.format_string('{prompt_0}')
+        self.assertEqual(self.workflow_runs, ['prompt_0', 'prompt_0'])
+        self.assertNotIn('prompt_0', [name for name, config_hash in self.block_manager.turn_cache])
+
+    def test_cycle_detected(self):
+        with mock.patch('builtins.print') as print_:
+            content = self.block_manager.format_string('{loop_a}')
+        self.assertEqual(content, '{loop_a}')
+        self.assertIn('loop_a -> loop_b -> loop_a', print_.call_args.args[0])
+
+    def test_turn_cache(self):
+        self.block_manager.format_string('{greeting}')
+        self.assertTrue(self.block_manager.turn_cache)
+        self.block_manager.blocks['name']['data'] = 'Someone'
+        self.assertEqual(self.block_manager.format_string('{name}'), 'Someone')  # edited blocks aren't stale
+        self.block_manager.new_turn()
+        self.assertEqual(self.block_manager.turn_cache, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import socket
+import threading
+import unittest
+from unittest import mock
+
+from src.utils.connectivity import ConnectivityMonitor, classify_error, is_local_api
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'Error {status_code}')
+        self.status_code = status_code
+
+
+class APIConnectionError(StatusError):
+    """Named like litellm's, which has a 500 status code"""
+
+
+class TestConnectivity(unittest.TestCase):
+    def test_classify_error(self):
+        self.assertEqual(classify_error(APIConnectionError(500)), 'network')
+        self.assertEqual(classify_error(ConnectionRefusedError()), 'network')
+        self.assertEqual(classify_error(socket.gaierror()), 'network')
+        self.assertEqual(classify_error(asyncio.TimeoutError()), 'timeout')
+        self.assertEqual(classify_error(StatusError(429)), 'rate_limit')
+        self.assertEqual(classify_error(StatusError(503)), 'server')
+        self.assertEqual(classify_error(StatusError(401)), 'client')
+        self.assertEqual(classify_error(ValueError()), 'unknown')
+
+        try:
+            try:
+                raise ConnectionResetError()
+            except OSError as e:
+                raise RuntimeError('Wrapped') from e
+        except RuntimeError as e:
+            self.assertEqual(classify_error(e), 'network')
+
+    def test_local_api(self):
+        self.assertTrue(is_local_api('ollama/llama3'))
+        self.assertTrue(is_local_api('gpt-4o', 'http://localhost:11434'))
+        self.assertTrue(is_local_api('gpt-4o', '127.0.0.1:8080/v1'))
+        self.assertTrue(is_local_api('gpt-4o', 'http://192.168.1.20:1234'))
+        self.assertTrue(is_local_api('gpt-4o', 'http://gpu-box.local'))
+        self.assertFalse(is_local_api('gpt-4o', 'https://api.openai.com/v1'))
+        self.assertFalse(is_local_api('gpt-4o'))
+
+    def test_probe_doesnt_block_the_loop(self):
+        monitor = ConnectivityMonitor(ttl=60)
+
+        loop_ticked = threading.Event()
+
+        def slow_probe():
+            loop_ticked.wait(timeout=5)  # only released by the loop running while the probe waits
+            return False
+
+        async def check():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+                    if ticks == 3:
+                        loop_ticked.set()
+
+            tick_task = asyncio.ensure_future(ticker())
+            results = await asyncio.gather(*(monitor.is_connected() for _ in range(5)))
+            tick_task.cancel()
+            return results, ticks
+
+        with mock.patch.object(monitor, 'probe', side_effect=slow_probe) as probe:
+            results, ticks = asyncio.run(check())
+            self.assertEqual(results, [False] * 5)
+            self.assertEqual(probe.call_count, 1)  # shared by the concurrent checks
+            self.assertGreaterEqual(ticks, 3)  # the loop kept running
+
+            self.assertFalse(asyncio.run(monitor.is_connected()))  # cached
+            self.assertFalse(monitor.is_connected_nowait())
+            self.assertEqual(probe.call_count, 1)
+
+        monitor.report_success()
+        self.assertTrue(monitor.is_connected_nowait())
+
+    def test_nowait_before_first_probe(self):
+        monitor = ConnectivityMonitor()
+        probe_released = threading.Event()
+        with mock.patch.object(monitor, 'probe', side_effect=lambda: probe_released.wait(timeout=5) and False):
+            self.assertTrue(monitor.is_connected_nowait())  # assumed until probed, without waiting for the probe
+            probe_released.set()
+            monitor.probe_future.result()
+            self.assertFalse(monitor.is_connected_nowait())
+
+
+if __name__ == '__main__':
+    unittest.main()
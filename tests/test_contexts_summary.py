@@ -0,0 +1,169 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from src.utils import sql
+from src.utils.filesystem import get_application_path
+
+BENCHMARKS = os.environ.get('AP_BENCHMARKS')
+CONTEXT_COUNT = 50_000 if BENCHMARKS else 2_000
+MESSAGES_PER_CONTEXT = 40  # 2M messages when benchmarking
+
+# The contexts list query before the summary columns
+OLD_QUERY = """
+    SELECT
+        c.name,
+        c.id,
+        CASE
+            WHEN json_extract(c.config, '$.members') IS NOT NULL THEN
+                CASE
+                    WHEN json_array_length(json_extract(c.config, '$.members')) > 2 THEN
+                        json_array_length(json_extract(c.config, '$.members')) || ' members'
+                    WHEN json_array_length(json_extract(c.config, '$.members')) = 2 THEN
+                        COALESCE(json_extract(json_extract(c.config, '$.members'), '$[1].config."info.name"'), 'Assistant')
+                    WHEN json_extract(json_extract(c.config, '$.members'), '$[1].config._TYPE') = 'agent' THEN
+                        json_extract(json_extract(c.config, '$.members'), '$[1].config."info.name"')
+                    ELSE
+                        json_array_length(json_extract(c.config, '$.members')) || ' members'
+                END
+            ELSE
+                CASE
+                    WHEN json_extract(c.config, '$._TYPE') = 'workflow' THEN
+                        '1 member'
+                    ELSE
+                        COALESCE(json_extract(c.config, '$."info.name"'), 'Assistant')
+                END
+        END as member_count,
+        c.config,
+        '' AS goto_button,
+        c.folder_id
+    FROM contexts c
+    LEFT JOIN (
+        SELECT
+            context_id,
+            MAX(id) as latest_message_id
+        FROM contexts_messages
+        GROUP BY context_id
+    ) cmsg ON c.id = cmsg.context_id
+    WHERE c.parent_id IS NULL
+    AND c.kind = "CHAT"
+    GROUP BY c.id
+    ORDER BY
+        pinned DESC,
+        COALESCE(cmsg.latest_message_id, 0) DESC,
+        c.id DESC
+    LIMIT ? OFFSET ?;"""
+
+NEW_QUERY = """
+    SELECT
+        c.name,
+        c.id,
+        c.member_summary,
+        c.avatar_paths,
+        '' AS goto_button,
+        c.folder_id
+    FROM contexts c
+    WHERE c.parent_id IS NULL
+    AND c.kind = "CHAT"
+    ORDER BY
+        c.pinned DESC,
+        c.last_message_id DESC,
+        c.id DESC
+    LIMIT ? OFFSET ?;"""
+
+
+def get_config(context_id):
+    members = [{'id': '1', 'config': {'_TYPE': 'user'}}]
+    for i in range(context_id % 3 + 1):
+        members.append({'id': str(i + 2), 'config': {'_TYPE': 'agent', 'info.name': f'Agent {i}', 'info.avatar_path': f'avatar_{i}.png'}})
+    return json.dumps({'_TYPE': 'workflow', 'members': members})
+
+
+class TestContextsSummary(unittest.TestCase):
+    """The contexts list query against the denormalized summary columns."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+        shutil.copyfile(os.path.join(get_application_path(), 'data.db'), os.path.join(cls.temp_dir, 'data.db'))
+        sql.set_db_filepath(cls.temp_dir)
+
+        conn = sql.get_connection()
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM contexts_messages")
+        conn.execute("DELETE FROM contexts")
+        conn.executemany(
+            "INSERT INTO contexts (id, kind, name, config) VALUES (?, 'CHAT', ?, ?)",
+            ((context_id, f'Chat {context_id}', get_config(context_id)) for context_id in range(1, CONTEXT_COUNT + 1)))
+        # messages are interleaved across contexts, so the latest message order differs from the context id order
+        conn.executemany(
+            "INSERT INTO contexts_messages (context_id, member_id, role, msg, log) VALUES (?, '2', 'assistant', 'x', '')",
+            ((((i * 7919) % CONTEXT_COUNT) + 1,) for i in range(CONTEXT_COUNT * MESSAGES_PER_CONTEXT)))
+        conn.execute("UPDATE contexts SET pinned = 1 WHERE id % ? = 0", (CONTEXT_COUNT // 10,))
+        conn.execute("COMMIT")
+
+    @classmethod
+    def tearDownClass(cls):
+        sql.set_db_filepath(None)
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+
+    def time_query(self, query, pages=5, page_size=100):
+        start = time.perf_counter()
+        for page in range(pages):
+            sql.get_results(query, (page_size, page * page_size))
+        return (time.perf_counter() - start) / pages
+
+    def test_list_query(self):
+        old_rows = sql.get_results(OLD_QUERY, (100, 0))
+        new_rows = sql.get_results(NEW_QUERY, (100, 0))
+        self.assertEqual([row[:3] for row in old_rows], [row[:3] for row in new_rows])
+
+        plan = '\n'.join(row[-1] for row in sql.get_results(f"EXPLAIN QUERY PLAN {NEW_QUERY}", (100, 0)))
+        self.assertIn('idx_contexts_list', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    @unittest.skipUnless(BENCHMARKS, 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_list_query_benchmark(self):
+        old_secs = self.time_query(OLD_QUERY)
+        new_secs = self.time_query(NEW_QUERY)
+        print(f"\ncontexts list page ({CONTEXT_COUNT} contexts): old {old_secs * 1000:.1f}ms, new {new_secs * 1000:.1f}ms")
+
+    def test_triggers(self):
+        context_id = CONTEXT_COUNT + 1
+        with sqlite3.connect(sql.get_db_path()) as conn:  # a plain connection, the triggers need no python functions
+            conn.execute("INSERT INTO contexts (id, kind, config) VALUES (?, 'CHAT', ?)", (context_id, get_config(2)))
+        summary, avatar_paths, last_message_id = sql.get_results(
+            "SELECT member_summary, avatar_paths, last_message_id FROM contexts WHERE id = ?", (context_id,))[0]
+        self.assertEqual(summary, '4 members')  # the user is counted
+        self.assertIsNone(avatar_paths)
+        self.assertIsNone(last_message_id)
+
+        sql.update_context_avatar_paths()
+        self.assertEqual(sql.get_scalar("SELECT avatar_paths FROM contexts WHERE id = ?", (context_id,)),
+                         '//##//##//'.join(f'avatar_{i}.png' for i in range(3)))
+
+        sql.execute("UPDATE contexts SET config = ? WHERE id = ?", (get_config(0), context_id))
+        summary, avatar_paths = sql.get_results(
+            "SELECT member_summary, avatar_paths FROM contexts WHERE id = ?", (context_id,))[0]
+        self.assertEqual(summary, 'Agent 0')
+        self.assertIsNone(avatar_paths)  # cleared for the next update
+        sql.update_context_avatar_paths()
+        self.assertEqual(sql.get_scalar("SELECT avatar_paths FROM contexts WHERE id = ?", (context_id,)), 'avatar_0.png')
+
+        for _ in range(2):
+            sql.execute("INSERT INTO contexts_messages (context_id, member_id, role, msg, log) VALUES (?, '2', 'assistant', 'x', '')", (context_id,))
+        first_id, last_id = sql.get_results("SELECT MIN(id), MAX(id) FROM contexts_messages WHERE context_id = ?", (context_id,))[0]
+        self.assertEqual(sql.get_scalar("SELECT last_message_id FROM contexts WHERE id = ?", (context_id,)), last_id)
+
+        sql.execute("DELETE FROM contexts_messages WHERE id = ?", (last_id,))
+        self.assertEqual(sql.get_scalar("SELECT last_message_id FROM contexts WHERE id = ?", (context_id,)), first_id)
+        sql.execute("DELETE FROM contexts_messages WHERE id = ?", (first_id,))
+        self.assertIsNone(sql.get_scalar("SELECT last_message_id FROM contexts WHERE id = ?", (context_id,)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import httpx
+
+from src.system.clients import ClientManager
+from src.utils.runtime import runtime
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    wbufsize = -1  # send the headers and body together
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestClientManager(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.connections = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api_base = f'http://127.0.0.1:{self.server.server_port}/v1'
+        self.config = {}
+        self.clients = ClientManager(SimpleNamespace(config=SimpleNamespace(dict=self.config)))
+
+    def tearDown(self):
+        self.clients.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_one_client_per_api(self):
+        client = self.clients.get_http_client(self.api_base, 'key-a')
+        self.assertIs(self.clients.get_http_client(self.api_base, 'key-a'), client)
+        self.assertIsNot(self.clients.get_http_client(self.api_base, 'key-b'), client)
+        self.assertIsNot(self.clients.get_http_client('https://api.other.com', 'key-a'), client)
+
+        openai_client = self.clients.get_openai_client(self.api_base, 'key-a')
+        self.assertIs(openai_client._client, client)
+        self.assertIs(self.clients.get_openai_client(self.api_base, 'key-a'), openai_client)
+
+        self.config['system.http_timeout'] = 5  # changed settings replace the client
+        new_client = self.clients.get_http_client(self.api_base, 'key-a')
+        self.assertIsNot(new_client, client)
+        self.assertTrue(client.is_closed)
+        self.assertEqual(new_client.timeout.read, 5)
+        self.assertIsNot(self.clients.get_openai_client(self.api_base, 'key-a'), openai_client)
+
+    def test_async_clients_per_loop(self):
+        async def get_client():
+            return self.clients.get_http_client(self.api_base, 'key', is_async=True)
+
+        client = runtime.run(get_client())
+        self.assertIs(runtime.run(get_client()), client)
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertIsNot(loop.run_until_complete(get_client()), client)  # another loop
+        finally:
+            loop.close()
+        self.clients.get_http_client(self.api_base, 'key')
+        self.assertEqual(len(self.clients.clients), 2)  # the closed loop's client was dropped
+
+    def test_connection_reuse(self):
+        count = 50
+
+        async def shared_requests():
+            for _ in range(count):
+                client = self.clients.get_http_client(self.api_base, 'key', is_async=True)
+                (await client.get(f'{self.api_base}/models')).raise_for_status()
+
+        async def new_client_requests():
+            for _ in range(count):
+                async with httpx.AsyncClient() as client:
+                    (await client.get(f'{self.api_base}/models')).raise_for_status()
+
+        runtime.run(new_client_requests())
+        new_connections, self.server.connections = self.server.connections, 0
+        runtime.run(shared_requests())
+
+        self.assertEqual(new_connections, count)
+        self.assertEqual(self.server.connections, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import asyncio
+import importlib.util
+import json
+import os
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.system.kernels import KernelPoolManager, merge_output_chunks
+from src.system.tools import ToolManager
+
+STARTUP_SECS = 0.2
+
+
+class FakeLanguage:
+    """Runs python with exec, with a kernel's startup time"""
+    started = 0
+
+    def __init__(self, venv_path):
+        time.sleep(STARTUP_SECS)
+        FakeLanguage.started += 1
+        self.venv_path = venv_path
+        self.namespace = {}
+        self.running = threading.Lock()
+        self.terminated = False
+
+    def run(self, code):
+        assert self.running.acquire(blocking=False), 'kernel used by two calls at once'
+        try:
+            self.namespace['venv_path'] = self.venv_path
+            exec(code, self.namespace)
+            yield {'type': 'console', 'format': 'active_line', 'content': 1}
+            yield {'type': 'console', 'format': 'output', 'content': str(self.namespace.get('result', ''))}
+        finally:
+            self.running.release()
+
+    def reset(self):
+        self.namespace = {}
+
+    def terminate(self):
+        self.terminated = True
+
+
+class FakeKernelPoolManager(KernelPoolManager):
+    def create_language(self, venv_path):
+        return FakeLanguage(venv_path)
+
+
+def get_output(chunks):
+    return next(r for r in merge_output_chunks(chunks) if r['format'] == 'output')['content']
+
+
+class TestKernelPool(unittest.TestCase):
+    def setUp(self):
+        FakeLanguage.started = 0
+        self.config = {'system.kernel_spares': 1}
+        self.kernels = FakeKernelPoolManager(SimpleNamespace(config=SimpleNamespace(dict=self.config)))
+        self.environment = object()
+
+    def tearDown(self):
+        self.kernels.close()
+
+    def wait_for_spares(self):
+        for pool in self.kernels.pools.values():
+            while pool.get_stats()['starting']:
+                time.sleep(0.01)
+
+    def test_kernels_reused_per_venv(self):
+        for venv_path in ['/venvs/a', '/venvs/b', '/venvs/a', '/venvs/b']:
+            output = get_output(self.kernels.run_code(self.environment, 'result = venv_path', venv_path))
+            self.assertEqual(output, venv_path)
+        self.wait_for_spares()
+        self.assertEqual(FakeLanguage.started, 4)  # a used and a spare kernel per venv
+        self.assertEqual([stats['idle'] for stats in self.kernels.get_stats()], [2, 2])
+
+    def test_reset_between_tool_calls(self):
+        self.config['system.kernel_spares'] = 0
+        self.kernels.run_code(self.environment, 'x = 1')
+        self.assertEqual(get_output(self.kernels.run_code(self.environment, 'result = x', reset=True)), '1')
+        self.wait_for_spares()
+        while self.kernels.get_stats()[0]['busy']:  # resetting
+            time.sleep(0.01)
+        self.assertEqual(get_output(self.kernels.run_code(self.environment, 'result = "x" in dir()')), 'False')
+
+    def test_concurrent_calls_use_separate_kernels(self):
+        self.config['system.kernel_max_per_pool'] = 2
+        errors = []
+
+        def run():
+            try:
+                self.kernels.run_code(self.environment, 'import time; time.sleep(0.05)')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.wait_for_spares()
+        self.assertEqual(FakeLanguage.started, 2)
+
+    def test_idle_kernels_reaped(self):
+        self.kernels.run_code(self.environment, 'x = 1')
+        self.wait_for_spares()
+        pool = self.kernels.get_pool(self.environment, None)
+        kernels = list(pool.idle)
+        pool.reap(time.monotonic() + 30, idle_timeout=60)
+        self.assertEqual(len(pool.idle), 2)
+        pool.reap(time.monotonic() + 120, idle_timeout=60)
+        self.assertEqual(pool.idle, [])
+        self.assertTrue(all(kernel.language.terminated for kernel in kernels))
+
+    def get_tools(self):
+        """A ToolManager whose tools double `n` in the kernel of their venv, with `self.run_code`"""
+        async def receive_workflow(config, kind, params, tool_uuid):
+            code = f"result = {params['n']} * 2"
+            chunks = await asyncio.to_thread(self.run_code, code, config['venv'])
+            yield 'assistant', get_output(chunks)
+
+        patcher = mock.patch('src.system.tools.receive_workflow', receive_workflow)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.run_code = lambda code, venv_path: self.kernels.run_code(self.environment, code, venv_path, reset=True)
+        tools = ToolManager(parent=None)
+        tools.tools = {'double_a': {'venv': '/venvs/a'}, 'double_b': {'venv': '/venvs/b'}}
+        tools.tool_id_names = {'a': 'double_a', 'b': 'double_b'}
+        return tools
+
+    def call_tools(self, tools):
+        """10 tool calls alternating between two venvs"""
+        for n in range(10):
+            result = json.loads(tools.compute_tool('a' if n % 2 else 'b', {'n': n}))
+            self.assertEqual(result['output'], str(n * 2))
+
+    def test_compute_tool_reuses_kernels(self):
+        tools = self.get_tools()
+        self.call_tools(tools)  # warm the pools
+        self.wait_for_spares()
+        FakeLanguage.started = 0
+        self.call_tools(tools)
+        self.assertEqual(FakeLanguage.started, 0)
+
+    @unittest.skipUnless(os.environ.get('AP_BENCHMARKS'), 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_compute_tool_benchmark(self):
+        """Cold starting a kernel per call vs the pool"""
+        def cold_run_code(code, venv_path):
+            language = FakeLanguage(venv_path)
+            try:
+                return list(language.run(code))
+            finally:
+                language.terminate()
+
+        tools = self.get_tools()
+        self.call_tools(tools)  # warm the pools
+        self.wait_for_spares()
+        start = time.perf_counter()
+        self.call_tools(tools)
+        pool_secs = time.perf_counter() - start
+
+        self.run_code = cold_run_code
+        start = time.perf_counter()
+        self.call_tools(tools)
+        cold_secs = time.perf_counter() - start
+
+        print(f"\n10 compute_tool calls alternating venvs: cold kernels {cold_secs * 1000:.0f}ms, "
+              f"kernel pool {pool_secs * 1000:.0f}ms")
+
+    @unittest.skipUnless(importlib.util.find_spec('jupyter_client') and importlib.util.find_spec('ipykernel'),
+                         'jupyter_client and ipykernel are needed for real kernels')
+    def test_real_kernel(self):
+        kernels = KernelPoolManager(SimpleNamespace(config=SimpleNamespace(dict={})))
+        try:
+            kernels.run_code(self.environment, 'x = 21')
+            output = get_output(kernels.run_code(self.environment, 'print(x * 2)'))
+            self.assertEqual(output.strip(), '42')
+        finally:
+            kernels.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from src.system import base
+from src.system.base import SystemManager, get_load_order
+from src.utils.profiling import StartupProfiler, format_load_timeline
+
+LOAD_SECS = 0.05  # a load's sql round-trips, which release the GIL
+
+
+class FakeManager:
+    created = 0
+
+    def __init__(self, parent):
+        FakeManager.created += 1
+        self.parent = parent
+        self.loaded = 0
+        self.barrier = None
+
+    def load(self):
+        if self.barrier:
+            self.barrier.wait()
+        time.sleep(LOAD_SECS)
+        self.loaded += 1
+
+
+class FakeVectorDBManager(FakeManager):
+    def load(self):
+        self.config_loaded = self.parent.config.loaded  # read when it loads
+        super().load()
+
+
+def get_system(names=('apis', 'blocks', 'config', 'providers', 'roles', 'tools', 'vectordbs', 'workspaces')):
+    """A SystemManager with fake managers"""
+    manager_classes = {name: FakeVectorDBManager if name == 'vectordbs' else FakeManager for name in names}
+    manager_classes['venvs'] = FakeManager
+    with mock.patch.object(SystemManager, '__init__', lambda self: None):
+        system = SystemManager()
+    system.manager_classes = manager_classes
+    system.load_timings = {}
+    system.loading_managers = {}
+    for name, manager_class in manager_classes.items():
+        if name not in base.DEFERRED_MANAGERS:
+            setattr(system, name, manager_class(parent=system))
+    return system
+
+
+class TestManagerLoad(unittest.TestCase):
+    def test_concurrent_load(self):
+        system = get_system()
+        # both loads wait for each other, loaded one after the other the barrier would break
+        system.apis.barrier = system.workspaces.barrier = threading.Barrier(2, timeout=10)
+        system.load()
+
+        managers = system.get_loadable_managers()
+        self.assertTrue(all(mgr.loaded == 1 for mgr in managers.values()))
+        self.assertEqual(system.vectordbs.config_loaded, 1)  # after its dependency
+        self.assertEqual(set(system.load_timings), set(managers))
+        self.assertNotIn('venvs', system.__dict__)  # deferred
+
+    @unittest.skipUnless(os.environ.get('AP_BENCHMARKS'), 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_load_benchmark(self):
+        system = get_system()
+        start = time.perf_counter()
+        system.load()
+        load_secs = time.perf_counter() - start
+
+        managers = system.get_loadable_managers()
+        sequential_secs = LOAD_SECS * len(managers)
+        print(f"\n{len(managers)} managers: sequential ~{sequential_secs * 1000:.0f}ms, "
+              f"concurrent {load_secs * 1000:.0f}ms\n{format_load_timeline(system.load_timings)}")
+
+    def test_deferred_until_first_use(self):
+        system = get_system()
+        system.load()
+        FakeManager.created = 0
+
+        venvs = []
+        threads = [threading.Thread(target=lambda: venvs.append(system.venvs)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(FakeManager.created, 1)
+        self.assertTrue(all(venv is venvs[0] for venv in venvs))
+        self.assertEqual(venvs[0].loaded, 1)
+        self.assertIn('venvs', system.load_timings)
+
+        system.load('venvs')
+        self.assertEqual(venvs[0].loaded, 2)  # reloaded when asked
+        with self.assertRaises(AttributeError):
+            system.not_a_manager
+
+    def test_errors_raised(self):
+        system = get_system()
+        with mock.patch.object(system.roles, 'load', side_effect=ValueError('bad config')):
+            with self.assertRaises(ValueError):
+                system.load()
+
+    def test_load_order(self):
+        self.assertEqual(get_load_order(['vectordbs', 'apis', 'config']), ['config', 'vectordbs', 'apis'])
+        with mock.patch.dict(base.MANAGER_DEPENDENCIES, {'config': ('vectordbs',)}):
+            with self.assertRaises(ValueError):
+                get_load_order(['vectordbs', 'config'])
+
+    def test_profile_report(self):
+        profiler = StartupProfiler()
+        profiler.start()
+        system = get_system()
+        profiler.mark('imports')
+        system.load()
+        profiler.mark('managers loaded')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'startup.folded')
+            report = profiler.report(system.load_timings, path=path)
+            with open(path) as f:
+                stacks = f.read().splitlines()
+
+        self.assertIn('managers loaded', report)
+        self.assertIn('vectordbs', report)
+        self.assertTrue(any(line.startswith('ManagerLoad') and 'load (test_manager_load.py' in line for line in stacks))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in stacks))
+
+
+if __name__ == '__main__':
+    unittest.main()
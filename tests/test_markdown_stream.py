@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import unittest
+
+from PySide6.QtGui import QTextDocument
+from PySide6.QtWidgets import QApplication
+
+from src.gui.bubbles import MarkdownStream, render_markdown
+
+
+TOKEN_COUNT = 20000
+CHARS_PER_TOKEN = 4
+FRAME_SECS = 1 / 60
+TOKENS_PER_SEC = 300  # streaming speed used to decide which chunks land in the same frame
+SAMPLE_EVERY = 100  # full document renders are quadratic over the stream, so only every nth is timed and extrapolated
+
+
+def generate_response():
+    paragraphs = []
+    i = 0
+    while sum(len(p) for p in paragraphs) < TOKEN_COUNT * CHARS_PER_TOKEN:
+        i += 1
+        if i % 7 == 0:
+            paragraphs.append(f"```python\ndef func_{i}(x):\n\n    return x * {i}\n```")
+        elif i % 5 == 0:
+            paragraphs.append('\n'.join(f"- item **{i}.{j}** with `code`" for j in range(5)))
+        else:
+            paragraphs.append(f"## Section {i}\n" + ' '.join(['Some *streamed* text for the bubble.'] * 6))
+    return '\n\n'.join(paragraphs)
+
+
+class TestMarkdownStream(unittest.TestCase):
+    """Streams a 20k token response into a bubble document."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication(sys.argv)
+        text = generate_response()
+        cls.chunks = [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+    def assert_stream_matches(self, chunks):
+        stream = MarkdownStream()
+        text = ''
+        for chunk in chunks:
+            text += chunk
+            self.assertEqual(stream.render(text), render_markdown(text), text)
+
+    def test_stream_matches_full_render(self):
+        frames = [''.join(self.chunks[i:i + 10]) for i in range(0, 3000, 10)]
+        self.assert_stream_matches(frames)
+
+    def test_blocks_continued_after_blank_lines(self):
+        texts = [
+            "- loose\n\n- list\n\n  continued item\n\nAfter the list\n\n1. one\n\n2. two\n",
+            "Intro\n\n    indented code\n\n    more code\n\nAfter the code\n",
+            "See [the docs][ref] and [x].\n\nMore text\n\n[ref]: https://example.com\n[x]: https://x.com\n\nTail\n",
+            "~~~\n```\n\n~~~\n\nText with `a[0]`\n\n````python\nx = [1]\n\n```\n````\n\nEnd\n",
+            "<!--\na comment\n\nstill a comment\n-->\n\nParagraph\n",
+        ]
+        for text in texts:
+            with self.subTest(text=text):
+                self.assert_stream_matches(text)  # a character at a time
+
+    @unittest.skipUnless(os.environ.get('AP_BENCHMARKS'), 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_render_benchmark(self):
+        doc = QTextDocument()
+        chunks_per_frame = max(int(TOKENS_PER_SEC * FRAME_SECS), 1)
+
+        # naive: full markdown render + setHtml for every chunk
+        naive_secs = 0.0
+        text = ''
+        for i, chunk in enumerate(self.chunks):
+            text += chunk
+            if i % SAMPLE_EVERY == 0:
+                start = time.perf_counter()
+                doc.setHtml(render_markdown(text))
+                naive_secs += (time.perf_counter() - start) * SAMPLE_EVERY
+
+        # streaming: frozen blocks + trailing block, rendered once per frame
+        stream = MarkdownStream()
+        markdown_secs = 0.0
+        set_html_secs = 0.0
+        frame_count = 0
+        text = ''
+        for i, chunk in enumerate(self.chunks):
+            text += chunk
+            if i % chunks_per_frame != 0 and i != len(self.chunks) - 1:
+                continue
+            frame_count += 1
+            start = time.perf_counter()
+            html = stream.render(text)
+            markdown_secs += time.perf_counter() - start
+            if frame_count % SAMPLE_EVERY == 0:
+                start = time.perf_counter()
+                doc.setHtml(html)
+                set_html_secs += (time.perf_counter() - start) * SAMPLE_EVERY
+        stream_secs = markdown_secs + set_html_secs
+
+        print(f"\n{TOKEN_COUNT} tokens, {len(self.chunks)} chunks, {frame_count} frames")
+        print(f"naive:     {naive_secs:.2f}s")
+        print(f"streaming: {stream_secs:.2f}s (markdown {markdown_secs:.2f}s, setHtml {set_html_secs:.2f}s)")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.utils import sql
+from src.utils.filesystem import get_application_path
+from src.utils.messages import MessageHistory
+
+
+class FakeWorkflow:
+    """The parts of a Workflow that MessageHistory uses, with the members' outputs"""
+    def __init__(self, member_ids):
+        self.leaf_id = sql.execute("INSERT INTO contexts (config) VALUES ('{}')")
+        self.context_id = self.leaf_id
+        self.members = {member_id: SimpleNamespace(member_id=member_id, last_output=None, turn_output=None)
+                        for member_id in member_ids}
+        self.system = SimpleNamespace(vectordbs=SimpleNamespace(queue_message=mock.Mock()))
+
+    def get_members(self):
+        return list(self.members.values())
+
+    def reset_last_outputs(self):
+        for member in self.members.values():
+            member.last_output = None
+            member.turn_output = None
+
+    def set_last_outputs(self, map_dict):
+        for member_id, output in map_dict.items():
+            self.members[member_id].last_output = output
+
+    def set_turn_outputs(self, map_dict):
+        for member_id, output in map_dict.items():
+            self.members[member_id].turn_output = output
+
+
+def get_state(history):
+    return {
+        'messages': [(msg.id, msg.role, msg.content, msg.member_id, msg.alt_turn, msg.log) for msg in history.messages],
+        'alt_turn_state': history.alt_turn_state,
+        'member_turn_outputs': history.member_turn_outputs,
+        'member_last_outputs': history.member_last_outputs,
+        'member_index': history.member_index,
+        'role_index': history.role_index,
+        'outputs': {member_id: (member.last_output, member.turn_output)
+                    for member_id, member in history.workflow.members.items()},
+    }
+
+
+class TestMessageHistory(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        shutil.copyfile(os.path.join(get_application_path(), 'data.db'), os.path.join(self.temp_dir, 'data.db'))
+        sql.set_db_filepath(self.temp_dir)
+
+        self.workflow = FakeWorkflow(['1', '2', '3'])
+        self.history = MessageHistory(self.workflow)
+        self.history.load()
+
+    def tearDown(self):
+        sql.set_db_filepath(None)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_add_matches_refresh(self):
+        self.history.add('user', 'What is the weather in Paris and Rome?', '1')
+        self.history.add('tool', '{"name": "weather", "args": "{}"}', '2', {'model': {'model_name': 'gpt-4o'}})
+        self.history.add('result', '{"status": "success", "output": "Sunny"}', '2')
+        self.history.add('assistant', 'Paris is sunny', '2')
+        self.history.add('assistant', 'Rome is rainy', '3')  # the run is finished
+        self.history.add('user', 'And tomorrow?', '1')
+        self.history.add('assistant', 'Sunny again', '2')
+        added_state = get_state(self.history)
+
+        rebuilt = MessageHistory(self.workflow)
+        rebuilt.refresh_messages()
+        rebuilt.sync_index()
+        self.assertEqual(get_state(rebuilt), added_state)
+        self.assertEqual(len(added_state['messages']), 7)
+
+    def test_add_after_other_context_wrote(self):
+        other_context_id = sql.execute("INSERT INTO contexts (config) VALUES ('{}')")
+        sql.execute("INSERT INTO contexts_messages (context_id, member_id, role, msg, log) VALUES (?, '1', 'user', 'Hi', '')",
+                    (other_context_id,))
+        last_msg_id = sql.get_scalar("SELECT MAX(id) FROM contexts_messages")
+
+        msg = self.history.add('user', 'Fix my python code', '1', {'model': {'model_name': 'gpt-4o'}})
+        self.assertEqual(msg.id, last_msg_id + 1)
+        log = sql.get_scalar("SELECT log FROM contexts_messages WHERE id = ?", (msg.id,))
+        self.assertEqual(json.loads(log), {'model': {'model_name': 'gpt-4o'}, 'id': msg.id})
+        self.assertEqual(msg.log['id'], msg.id)
+
+    def test_deleted_ids_not_reused(self):
+        msg = self.history.add('user', 'Will it rain?', '1')
+        sql.execute("DELETE FROM contexts_messages WHERE id = ?", (msg.id,))
+        self.history.messages = []
+        self.assertEqual(self.history.add('user', 'Will it rain?', '1').id, msg.id + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import random
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.utils.messages import Message, MessageHistory
+
+ROLES = ['user', 'assistant', 'tool', 'result', 'code']
+
+
+def get_input(source_member_id, target_member_id, source_options='all'):
+    return {
+        'source_member_id': source_member_id,
+        'target_member_id': target_member_id,
+        'config': {'mappings.data': [{'source': 'Output', 'target': 'Message', 'source_options': source_options}]},
+    }
+
+
+class TestMessageIndex(unittest.TestCase):
+    def setUp(self):
+        self.workflow = SimpleNamespace(
+            config={'inputs': [get_input('1', '2'), get_input('2', '3', 'assistant'), get_input('1', '3')]},
+            members={str(i): object() for i in range(1, 5)},
+            _parent_workflow=None,
+        )
+        self.history = MessageHistory(self.workflow)
+        random.seed(0)
+        self.add_messages(2000)
+
+    def add_messages(self, count):
+        start_id = len(self.history.messages) + 1
+        for msg_id in range(start_id, start_id + count):
+            member_id = random.choice(['1', '2', '3', '4', '2.1'])
+            self.history.messages.append(Message(msg_id, random.choice(ROLES), f'Message {msg_id}', member_id, 0))
+
+    def scan(self, incl_roles='all', calling_member_id='0', base_member_id=None):
+        """The filter `get` used before the index, as a reference"""
+        input_member_ids, member_exclusive_roles, _ = self.history.get_input_filters(calling_member_id)
+        all_member_ids = input_member_ids + [calling_member_id]
+        return [
+            {
+                'id': msg.id,
+                'role': msg.role if msg.role not in ('user', 'assistant')
+                else 'user' if (msg.member_id != calling_member_id or msg.role == 'user')
+                else 'assistant',
+                'member_id': msg.member_id,
+                'content': msg.content,
+                'alt_turn': msg.alt_turn,
+            } for msg in self.history.messages
+            if (incl_roles == 'all' or msg.role in incl_roles)
+            and (base_member_id is None or msg.member_id.startswith(f'{base_member_id}.'))
+            and (len(input_member_ids) == 0 or msg.member_id in all_member_ids)
+            and ((msg.member_id not in member_exclusive_roles)
+                 or msg.role in member_exclusive_roles.get(msg.member_id, []))
+        ]
+
+    def assert_matches_scan(self):
+        for calling_member_id in ['0', '1', '2', '3', '4']:
+            for incl_roles in ['all', ('user', 'assistant'), ('tool',)]:
+                msgs = self.history.get(incl_roles, calling_member_id)
+                self.assertEqual(msgs, self.scan(incl_roles, calling_member_id), (calling_member_id, incl_roles))
+        self.assertEqual(self.history.get(base_member_id='2'), self.scan(base_member_id='2'))
+
+    def test_matches_scan(self):
+        self.assert_matches_scan()
+        self.assertEqual(self.history.last(), self.scan(('user', 'assistant'))[-1])
+        self.assertEqual(self.history.count(('user',)), len(self.scan(('user',))))
+
+    def test_index_follows_changes(self):
+        self.assert_matches_scan()
+        self.add_messages(10)  # appended
+        self.assert_matches_scan()
+        del self.history.messages[1500:]  # truncated, like editing a message in a branch
+        self.add_messages(3)
+        self.assert_matches_scan()
+        self.history.pop(0)
+        self.assert_matches_scan()
+
+    def test_inputs_cached_until_reload(self):
+        with mock.patch.object(self.history, 'get_member_inputs_from_workflow',
+                               wraps=self.history.get_member_inputs_from_workflow) as get_inputs:
+            self.history.get(calling_member_id='3')
+            self.history.get(calling_member_id='3')
+            self.assertEqual(get_inputs.call_count, 1)
+
+            self.workflow.config = {'inputs': [get_input('4', '3')]}  # reloaded
+            self.history.get(calling_member_id='3')
+            self.assertEqual(get_inputs.call_count, 2)
+        self.assert_matches_scan()
+
+    @unittest.skipUnless(os.environ.get('AP_BENCHMARKS'), 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_benchmark(self):
+        self.add_messages(48_000)
+        self.history.get(calling_member_id='2')
+
+        start = time.perf_counter()
+        for _ in range(20):
+            self.scan(('user', 'assistant'), calling_member_id='2')
+            self.scan(('user', 'assistant'))[-1:]
+        scan_secs = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(20):
+            self.history.get(('user', 'assistant'), calling_member_id='2')
+            self.history.last()
+        index_secs = time.perf_counter() - start
+
+        print(f"\n{len(self.history.messages)} messages, 20 x get + last: scan {scan_secs * 1000:.1f}ms, index {index_secs * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src.utils import sql
+from src.utils.filesystem import get_application_path
+from src.utils.search import search_messages, search_root_context_ids, rebuild_search_index, to_fts_query
+
+CONTEXT_COUNT = 5000
+MESSAGES_PER_CONTEXT = 20
+WORDS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel']
+
+
+class TestMessageSearch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        shutil.copyfile(os.path.join(get_application_path(), 'data.db'), os.path.join(self.temp_dir, 'data.db'))
+        sql.set_db_filepath(self.temp_dir)
+
+        sql.execute("DELETE FROM contexts_messages")
+        sql.execute("DELETE FROM contexts")
+        sql.execute("INSERT INTO contexts (id, kind, name) VALUES (1, 'CHAT', 'Trip planning')")
+        sql.execute("INSERT INTO contexts (id, kind, name) VALUES (2, 'CHAT', 'Recipes')")
+        sql.execute("INSERT INTO contexts (id, kind, parent_id, branch_msg_id) VALUES (3, 'CHAT', 2, 3)")
+        for msg_id, (context_id, msg) in enumerate([
+            (1, 'Book a flight to Lisbon'),
+            (1, 'Lisbon or Lisbon airport?'),
+            (2, 'How do I make pancakes?'),
+            (3, 'Pancakes for Lisbon breakfast'),
+        ], start=1):
+            sql.execute("INSERT INTO contexts_messages (id, context_id, member_id, role, msg, log) VALUES (?, ?, '1', 'user', ?, '')",
+                        (msg_id, context_id, msg))
+
+    def tearDown(self):
+        sql.set_db_filepath(None)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_ranked_and_paginated(self):
+        results = search_messages('lisbon')
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0][:2], (1, 2))  # mentions lisbon twice
+        self.assertIn('<b>Lisbon</b>', results[0][2])
+
+        page_1 = search_messages('lisbon', limit=2)
+        page_2 = search_messages('lisbon', limit=2, offset=2)
+        self.assertEqual(page_1 + page_2, results)
+
+    def test_prefix_and_punctuation(self):
+        self.assertEqual(to_fts_query('flight "to" lis'), '"flight" "to" "lis"*')
+        self.assertEqual([row[1] for row in search_messages('flight to lis')], [1])
+        self.assertEqual(search_messages('AND OR ("'), [])
+
+    def test_root_context_ids(self):
+        self.assertEqual(search_root_context_ids('breakfast'), [2])  # matched in a branch of context 2
+        self.assertEqual(sorted(search_root_context_ids('lisbon')), [1, 2])
+        self.assertEqual(search_root_context_ids('recipe'), [2])  # matched by name
+        self.assertEqual(search_root_context_ids('100%'), [])
+
+    def test_triggers_and_rebuild(self):
+        sql.execute("UPDATE contexts_messages SET msg = 'How do I make waffles?' WHERE id = 3")
+        self.assertEqual(search_messages('pancakes')[0][1], 4)
+        self.assertEqual(search_messages('waffles')[0][1], 3)
+        sql.execute("DELETE FROM contexts_messages WHERE id = 4")
+        self.assertEqual(search_messages('pancakes'), [])
+
+        sql.execute("DROP TABLE contexts_messages_fts")
+        rebuild_search_index()
+        self.assertEqual([row[1] for row in search_messages('waffles')], [3])
+
+    @unittest.skipUnless(os.environ.get('AP_BENCHMARKS'), 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_benchmark(self):
+        conn = sql.get_connection()
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO contexts (id, kind, name) VALUES (?, 'CHAT', '')",
+                         ((context_id,) for context_id in range(10, CONTEXT_COUNT + 10)))
+        conn.executemany(
+            "INSERT INTO contexts_messages (context_id, member_id, role, msg, log) VALUES (?, '1', 'user', ?, '')",
+            ((i % CONTEXT_COUNT + 10, ' '.join(WORDS[(i + j) % len(WORDS)] for j in range(i % 7 + 3)) + f' item{i}')
+             for i in range(CONTEXT_COUNT * MESSAGES_PER_CONTEXT)))
+        conn.execute("COMMIT")
+
+        start = time.perf_counter()
+        like_count = sql.get_scalar("SELECT COUNT(*) FROM contexts_messages WHERE msg LIKE '%item12345%'")
+        like_secs = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = search_messages('item12345')
+        fts_secs = time.perf_counter() - start
+
+        print(f"\n{CONTEXT_COUNT * MESSAGES_PER_CONTEXT} messages: LIKE scan {like_secs * 1000:.1f}ms, fts {fts_secs * 1000:.1f}ms")
+        self.assertEqual(len(results), like_count)
+
+
+@unittest.skipUnless(importlib.util.find_spec('PySide6'), 'PySide6 is needed to import the contexts page')
+class TestContextsPageRename(unittest.TestCase):
+    """Renames a row of the contexts page, whose query has the `{{kind}}` and `{{search}}` placeholders"""
+    setUp = TestMessageSearch.setUp
+    tearDown = TestMessageSearch.tearDown
+
+    def get_page(self):
+        from src.gui.config import ConfigDBTree
+        from src.gui.pages.contexts import Page_Contexts
+
+        class PageKwargs(Exception):
+            pass
+
+        def capture_kwargs(page, parent, **kwargs):
+            raise PageKwargs(kwargs)
+
+        with mock.patch.object(ConfigDBTree, '__init__', capture_kwargs):
+            try:
+                Page_Contexts(None)
+            except PageKwargs as e:
+                kwargs = e.args[0]
+
+        class ContextsPage:
+            get_query = ConfigDBTree.get_query
+            get_search_filter = ConfigDBTree.get_search_filter
+            reload_current_row = ConfigDBTree.reload_current_row
+            rename_item = ConfigDBTree.rename_item
+            get_selected_item_id = ConfigDBTree.get_selected_item_id
+
+        page = ContextsPage()
+        page.query = kwargs['query']
+        page.table_name = kwargs['table_name']
+        page.schema = kwargs['schema']
+        page.filterable = kwargs['filterable']
+        page.filter_widget = mock.Mock(get_kind=mock.Mock(return_value=kwargs['kind']))
+        page.query_params = (100, 0)
+        page.search_ids = None
+        page.tree = mock.MagicMock()
+        page.tree.currentItem.return_value.data.return_value = 'item'
+        page.tree.get_selected_item_id.return_value = 1
+        return page
+
+    def rename(self, page, name):
+        with mock.patch('src.gui.config.QInputDialog.getText', return_value=(name, True)):
+            page.rename_item()
+        return page.tree.reload_selected_item.call_args.kwargs['data']
+
+    def test_rename(self):
+        page = self.get_page()
+        rows = self.rename(page, 'Lisbon trip')
+        self.assertEqual(sql.get_scalar("SELECT name FROM contexts WHERE id = 1"), 'Lisbon trip')
+        self.assertEqual(sorted(row[:2] for row in rows), [('Lisbon trip', 1), ('Recipes', 2)])
+
+        page.search_ids = [2]
+        rows = self.rename(page, 'Lisbon again')
+        self.assertEqual([row[:2] for row in rows], [('Recipes', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+from PySide6.QtGui import QPixmap
+from PySide6.QtWidgets import QApplication
+
+from src.gui import helpers
+from src.gui.helpers import PixmapCache, path_to_pixmap, pixmap_cache
+
+AVATAR_PATHS = [':/resources/icon-agent-solid.png', [':/resources/icon-user.png', ':/resources/icon-blocks.png']]
+
+
+class TestPixmapCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication(sys.argv)
+
+    def setUp(self):
+        pixmap_cache.clear()
+
+    def test_lru_bounded_by_bytes(self):
+        pixmap = QPixmap(32, 32)
+        cache = PixmapCache(max_bytes=PixmapCache.get_pixmap_bytes(pixmap) * 3)
+        for i in range(3):
+            cache.put(i, QPixmap(32, 32))
+        cache.get(0)  # 1 is now the least recently used
+        cache.put(3, QPixmap(32, 32))
+
+        self.assertIsNotNone(cache.get(0))
+        self.assertIsNone(cache.get(1))
+        self.assertLessEqual(cache.total_bytes, cache.max_bytes)
+
+    def test_theme_change_clears(self):
+        cache = PixmapCache()
+        cache.set_theme(('#151515', '#c4c4c4'))
+        cache.put('icon', QPixmap(8, 8))
+        cache.set_theme(('#151515', '#c4c4c4'))
+        self.assertIsNotNone(cache.get('icon'))
+        cache.set_theme(('#ffffff', '#000000'))
+        self.assertIsNone(cache.get('icon'))
+        self.assertEqual(cache.total_bytes, 0)
+
+    def test_repeated_avatars(self):
+        with mock.patch.object(helpers, 'render_path_pixmap', wraps=helpers.render_path_pixmap) as render_path_pixmap:
+            first = path_to_pixmap(AVATAR_PATHS, diameter=25)
+            for _ in range(200):
+                pixmap = path_to_pixmap(AVATAR_PATHS, diameter=25)
+            path_to_pixmap(AVATAR_PATHS, diameter=30)
+
+        self.assertEqual(render_path_pixmap.call_count, 2)  # once per diameter
+        self.assertEqual(pixmap.toImage(), first.toImage())
+
+    @unittest.skipUnless(os.environ.get('AP_BENCHMARKS'), 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_repeated_avatars_benchmark(self):
+        row_count = 200
+
+        start = time.perf_counter()
+        path_to_pixmap(AVATAR_PATHS, diameter=25)
+        uncached_secs = (time.perf_counter() - start) * row_count
+
+        start = time.perf_counter()
+        for _ in range(row_count):
+            path_to_pixmap(AVATAR_PATHS, diameter=25)
+        cached_secs = time.perf_counter() - start
+
+        print(f"\n{row_count} rows: uncached {uncached_secs * 1000:.1f}ms, cached {cached_secs * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    unittest.main()
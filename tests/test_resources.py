@@ -0,0 +1,56 @@
+import os
+import re
+import struct
+import unittest
+
+UTILS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'utils')
+TREE_NODE_SIZE = 22  # name offset, flags, child count/first child or locale/data offset, last modified
+DIRECTORY_FLAG = 0x02
+COMPRESSED_FLAGS = 0x01 | 0x04  # zlib, zstd
+
+
+def read_rcc(path):
+    """{resource path: bytes} of a binary Qt resource file (`pyside6-rcc --binary`)"""
+    with open(path, 'rb') as f:
+        rcc = f.read()
+    magic, version, tree_offset, data_offset, names_offset = struct.unpack_from('>4siiii', rcc)
+    assert magic == b'qres' and version in (2, 3), (magic, version)
+
+    def get_name(offset):
+        length, = struct.unpack_from('>H', rcc, names_offset + offset)
+        start = names_offset + offset + 6  # length and hash
+        return rcc[start:start + length * 2].decode('utf-16-be')
+
+    def walk(node, path):
+        offset = tree_offset + node * TREE_NODE_SIZE
+        name_offset, flags = struct.unpack_from('>IH', rcc, offset)
+        name = get_name(name_offset) if node else ''
+        if flags & DIRECTORY_FLAG:
+            child_count, first_child = struct.unpack_from('>II', rcc, offset + 6)
+            for child in range(first_child, first_child + child_count):
+                yield from walk(child, f'{path}{name}/' if node else '')
+        else:
+            assert not flags & COMPRESSED_FLAGS, f'{path}{name} is compressed'
+            data_at, = struct.unpack_from('>I', rcc, offset + 10)
+            size, = struct.unpack_from('>I', rcc, data_offset + data_at)
+            start = data_offset + data_at + 4
+            yield f'{path}{name}', rcc[start:start + size]
+
+    return dict(walk(0, ''))
+
+
+class TestResources(unittest.TestCase):
+    def test_rcc_matches_qrc(self):
+        """resources.rcc is compiled from resources.qrc, it has to be recompiled when an icon changes"""
+        with open(os.path.join(UTILS_DIR, 'resources.qrc')) as f:
+            qrc_files = re.findall(r'<file>(.*?)</file>', f.read())
+        resources = read_rcc(os.path.join(UTILS_DIR, 'resources.rcc'))
+
+        self.assertEqual(sorted(resources), sorted(qrc_files))
+        for path in qrc_files:
+            with open(os.path.join(UTILS_DIR, path), 'rb') as f:
+                self.assertEqual(resources[path], f.read(), f'{path} changed, recompile resources.rcc')
+
+
+if __name__ == '__main__':
+    unittest.main()
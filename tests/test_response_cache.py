@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.system.responses import ResponseCacheManager
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.config = {'system.response_cache': True}
+        providers = SimpleNamespace(get_model_parameters=lambda model_obj, incl_api_data=True: {'temperature': 0.5})
+        self.cache = ResponseCacheManager(SimpleNamespace(config=SimpleNamespace(dict=self.config), providers=providers))
+
+        patcher = mock.patch('src.system.responses.sql.get_db_path', return_value=f'{self.temp_dir}/data.db')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        if self.cache.conn:
+            self.cache.conn.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def get_key(self, content, api_key='key-1'):
+        model_obj = {'kind': 'CHAT', 'model_name': 'gpt-4o', 'provider': 'litellm', 'model_params': {'api_key': api_key}}
+        return self.cache.get_key(model_obj, [{'role': 'user', 'content': content}])
+
+    def test_hit_and_miss(self):
+        key = self.get_key('Title this chat')
+        self.assertIsNone(self.cache.get(key))
+        self.cache.set(key, 'A title')
+        self.assertEqual(self.cache.get(key), 'A title')
+        self.assertEqual(self.get_key('Title this chat', api_key='key-2'), key)  # credentials aren't part of the key
+        self.assertNotEqual(self.get_key('Title another chat'), key)
+
+        stats = self.cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+
+    def test_disabled(self):
+        self.config['system.response_cache'] = False
+        key = self.get_key('Title this chat')
+        self.cache.set(key, 'A title')
+        self.assertIsNone(self.cache.get(key))
+        self.config['system.response_cache'] = True
+        self.assertIsNone(self.cache.get(key))
+
+    def test_ttl(self):
+        self.config['system.response_cache_ttl'] = 60
+        key = self.get_key('Title this chat')
+        with mock.patch('src.system.responses.time.time', return_value=1000):
+            self.cache.set(key, 'A title')
+        with mock.patch('src.system.responses.time.time', return_value=1059):
+            self.assertEqual(self.cache.get(key), 'A title')
+        with mock.patch('src.system.responses.time.time', return_value=1061):
+            self.assertIsNone(self.cache.get(key))
+
+    def test_lru_eviction(self):
+        self.config['system.response_cache_size'] = 1  # MB
+        response = 'x' * (300 * 1024)
+        keys = [self.get_key(f'Prompt {i}') for i in range(4)]
+        with mock.patch('src.system.responses.time.time') as mock_time:
+            for i, key in enumerate(keys[:3]):
+                mock_time.return_value = 1000 + i
+                self.cache.set(key, response)
+            mock_time.return_value = 1010
+            self.cache.get(keys[0])  # keys[1] is now the least recently used
+            mock_time.return_value = 1020
+            self.cache.set(keys[3], response)
+
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+        self.assertIsNotNone(self.cache.get(keys[3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import asyncio
+import concurrent.futures
+import threading
+import unittest
+
+from src.utils.runtime import WorkflowRuntime, iterate_in_thread
+
+
+class TestWorkflowRuntime(unittest.TestCase):
+    def setUp(self):
+        self.runtime = WorkflowRuntime()
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def test_loop_reused_across_turns(self):
+        async def get_loop():
+            return asyncio.get_running_loop()
+
+        loops = [self.runtime.submit(get_loop()).result(1) for _ in range(5)]
+        self.assertEqual(len(set(loops)), 1)
+        self.assertIs(loops[0], self.runtime.loop)
+
+    def test_submit_from_many_threads(self):
+        async def double(x):
+            await asyncio.sleep(0.01)
+            return x * 2
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda x: self.runtime.run(double(x), timeout=5), range(32)))
+        self.assertEqual(results, [x * 2 for x in range(32)])
+
+    def test_cancel(self):
+        started = threading.Event()
+        cancelled = threading.Event()
+
+        async def long_running():
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        future = self.runtime.submit(long_running())
+        self.assertTrue(started.wait(1))
+        self.runtime.cancel(future)
+        self.assertTrue(cancelled.wait(1))
+        self.assertTrue(future.cancelled())
+        self.assertEqual(self.runtime.futures, set())
+
+    def test_run_from_inside_runtime(self):
+        async def inner():
+            await asyncio.sleep(0)
+            return 'inner'
+
+        async def outer():
+            # blocking on the loop's own thread would deadlock it, coroutines on the runtime await instead
+            with self.assertRaises(RuntimeError):
+                self.runtime.run(inner(), timeout=5)
+            return await inner()
+
+        self.assertEqual(self.runtime.run(outer(), timeout=5), 'inner')
+
+    def test_blocked_stream_does_not_stall_runtime(self):
+        release = threading.Event()
+
+        def blocking_stream():  # e.g. a sync sdk stream waiting on the network
+            yield 'first'
+            release.wait(5)
+            yield 'second'
+
+        async def consume():
+            return [chunk async for chunk in iterate_in_thread(blocking_stream())]
+
+        async def other():
+            return 'other'
+
+        stream_future = self.runtime.submit(consume())
+        self.assertEqual(self.runtime.run(other(), timeout=1), 'other')
+        self.assertFalse(stream_future.done())
+        release.set()
+        self.assertEqual(stream_future.result(1), ['first', 'second'])
+
+    def test_cancel_blocked_stream(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking_stream():
+            started.set()
+            release.wait(5)
+            yield 'late'
+
+        async def consume():
+            return [chunk async for chunk in iterate_in_thread(blocking_stream())]
+
+        future = self.runtime.submit(consume())
+        self.assertTrue(started.wait(1))
+        self.runtime.cancel(future)  # doesn't wait for the next chunk
+        with self.assertRaises(concurrent.futures.CancelledError):
+            future.result(1)
+        release.set()
+
+    def test_closed_stream_stops_worker(self):
+        closed = threading.Event()
+
+        def endless_stream():
+            try:
+                while True:
+                    yield 'chunk'
+            finally:
+                closed.set()
+
+        async def consume_one():
+            chunks = iterate_in_thread(endless_stream())
+            async for chunk in chunks:
+                await chunks.aclose()
+                return chunk
+
+        self.assertEqual(self.runtime.run(consume_one(), timeout=1), 'chunk')
+        self.assertTrue(closed.wait(1))
+
+    def test_stream_error_raised(self):
+        def failing_stream():
+            yield 'chunk'
+            raise ValueError('disconnected')
+
+        async def consume():
+            return [chunk async for chunk in iterate_in_thread(failing_stream())]
+
+        with self.assertRaises(ValueError):
+            self.runtime.run(consume(), timeout=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
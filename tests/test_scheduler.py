@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+import time
+import unittest
+from types import SimpleNamespace
+
+from src.system.providers import Provider
+from src.system.scheduler import SchedulerManager, TokenBucket, get_retry_after
+
+MODEL_OBJ = {'kind': 'CHAT', 'model_name': 'gpt-4o', 'provider': 'litellm', 'model_params': {}}
+
+
+class ApiError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f'Error {status_code}')
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class FakeServer:
+    """Answers after `secs`, with a 429 when more than `capacity` requests are in flight"""
+    def __init__(self, capacity=3, secs=0.05):
+        self.capacity = capacity
+        self.secs = secs
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self.rejected = 0
+
+    async def request(self):
+        self.calls += 1
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise ApiError(429, {'retry-after-ms': '20'})
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.secs)
+        finally:
+            self.in_flight -= 1
+        return 'response'
+
+
+class TestScheduler(unittest.TestCase):
+    def get_scheduler(self, api_limits=None, model_limits=None):
+        provider = Provider(parent=None)
+        provider.insert_model('gpt-4o', 'GPT 4o', json.dumps(model_limits or {}), 'CHAT', 1, 'OpenAI',
+                              json.dumps(api_limits or {}), '')
+        scheduler = SchedulerManager(SimpleNamespace(providers=SimpleNamespace(providers={'litellm': provider})))
+        scheduler.base_delay = 0.01
+        return scheduler
+
+    def run_calls(self, scheduler, server, count):
+        async def run_all():
+            return await asyncio.gather(*(scheduler.run(MODEL_OBJ, server.request) for _ in range(count)),
+                                        return_exceptions=True)
+        return asyncio.run(run_all())
+
+    def test_concurrency_cap(self):
+        scheduler = self.get_scheduler(api_limits={'max_concurrent': 3})
+        server = FakeServer(capacity=3)
+        results = self.run_calls(scheduler, server, 10)
+        self.assertEqual(results, ['response'] * 10)
+        self.assertEqual((server.peak, server.rejected), (3, 0))
+
+        stats = scheduler.get_stats()
+        self.assertEqual((stats['running'], stats['waiting']), (0, 0))
+        self.assertEqual({limiter['name']: limiter['completed'] for limiter in stats['limiters']},
+                         {'GPT 4o': 10, 'OpenAI': 10})
+
+    def test_model_limits_override_api_limits(self):
+        scheduler = self.get_scheduler(api_limits={'max_concurrent': 5}, model_limits={'max_concurrent': 1})
+        server = FakeServer(capacity=5)
+        self.run_calls(scheduler, server, 4)
+        self.assertEqual(server.peak, 1)
+
+    def test_rate_limit_backoff_shared(self):
+        scheduler = self.get_scheduler()
+        attempts = []
+
+        async def request():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise ApiError(429, {'retry-after': '0.2'})
+            return 'response'
+
+        start = time.monotonic()
+        self.assertEqual(asyncio.run(scheduler.run(MODEL_OBJ, request)), 'response')
+        self.assertGreaterEqual(attempts[1] - start, 0.2)
+        self.assertEqual(scheduler.get_stats()['rate_limited'], 1)
+
+        async def unauthorized():
+            attempts.append(time.monotonic())
+            raise ApiError(401)
+
+        with self.assertRaises(ApiError):
+            asyncio.run(scheduler.run(MODEL_OBJ, unauthorized))
+        self.assertEqual(len(attempts), 3)  # not retried
+
+    def test_stream_keeps_slot(self):
+        scheduler = self.get_scheduler(api_limits={'max_concurrent': 1})
+
+        async def stream():
+            for i in range(3):
+                yield i
+
+        async def consume():
+            first = await scheduler.run(MODEL_OBJ, lambda: asyncio.sleep(0, stream()), stream=True)
+            second = asyncio.ensure_future(scheduler.run(MODEL_OBJ, lambda: asyncio.sleep(0, 'response')))
+            await asyncio.sleep(0.05)
+            self.assertFalse(second.done())  # waits for the stream
+            self.assertEqual([chunk async for chunk in first], [0, 1, 2])
+            return await second
+
+        self.assertEqual(asyncio.run(consume()), 'response')
+
+    def test_stream_cancelled_before_first_chunk(self):
+        scheduler = self.get_scheduler(api_limits={'max_concurrent': 1})
+        limiter = scheduler.get_limiters(MODEL_OBJ)[1]
+
+        async def stream():
+            yield 0
+
+        async def call_then_wait():
+            response_stream = await scheduler.run(MODEL_OBJ, lambda: asyncio.sleep(0, stream()), stream=True)
+            await asyncio.sleep(60)  # cancelled before iterating
+            async for _ in response_stream:
+                pass
+
+        async def cancel_and_call():
+            task = asyncio.ensure_future(call_then_wait())
+            await asyncio.sleep(0.01)
+            self.assertEqual(limiter.active, 1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0)
+            self.assertEqual(limiter.active, 0)
+            return await asyncio.wait_for(scheduler.run(MODEL_OBJ, lambda: asyncio.sleep(0, 'response')), 1)
+
+        self.assertEqual(asyncio.run(cancel_and_call()), 'response')
+
+    def test_stream_closed_early(self):
+        scheduler = self.get_scheduler(api_limits={'max_concurrent': 1})
+        limiter = scheduler.get_limiters(MODEL_OBJ)[1]
+
+        async def stream():
+            for i in range(3):
+                yield i
+
+        async def consume_one():
+            response_stream = await scheduler.run(MODEL_OBJ, lambda: asyncio.sleep(0, stream()), stream=True)
+            async for chunk in response_stream:
+                break
+            await response_stream.aclose()
+            await response_stream.aclose()  # released once
+            return limiter.active, limiter.completed
+
+        self.assertEqual(asyncio.run(consume_one()), (0, 1))
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(per_minute=600)  # 10 per second
+        now = bucket.updated
+        self.assertEqual(bucket.get_delay(600, now), 0.0)
+        bucket.take(600, now)
+        self.assertAlmostEqual(bucket.get_delay(10, now), 1.0)
+        self.assertEqual(bucket.get_delay(10, now + 1.0), 0.0)
+        self.assertAlmostEqual(bucket.get_delay(10_000, now), 60.0)  # capped to the bucket
+
+    def test_retry_after(self):
+        self.assertEqual(get_retry_after(ApiError(429, {'retry-after': '3'})), 3.0)
+        self.assertEqual(get_retry_after(ApiError(429, {'retry-after-ms': '250'})), 0.25)
+        self.assertIsNone(get_retry_after(ApiError(429)))
+        self.assertIsNone(get_retry_after(ValueError()))
+
+    @unittest.skipUnless(os.environ.get('AP_BENCHMARKS'), 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_429_storm_benchmark(self):
+        for limits in ({}, {'max_concurrent': 3}):
+            scheduler = self.get_scheduler(api_limits=limits)
+            server = FakeServer(capacity=3)
+            start = time.perf_counter()
+            results = self.run_calls(scheduler, server, 10)
+            elapsed = time.perf_counter() - start
+            print(f"\n10 calls, limits {limits}: {server.rejected} rate limited, "
+                  f"{sum(r == 'response' for r in results)} succeeded in {elapsed * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    unittest.main()
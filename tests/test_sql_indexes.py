@@ -0,0 +1,160 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+
+from src.utils import sql
+from src.utils.filesystem import get_application_path
+from src.utils.sql_upgrade import upgrade_script
+
+
+CONTEXT_COUNT = 2000
+MESSAGES_PER_CONTEXT = 100
+
+INDEXES = [
+    'idx_contexts_messages_context_id',
+    'idx_contexts_parent_id',
+    'idx_contexts_kind',
+    'idx_contexts_branch_msg_id',
+]
+
+# The hot queries of MessageHistory.load / load_branches / refresh_messages, and the latest context lookup
+QUERIES = {
+    'leaf_contexts': ("""
+        WITH RECURSIVE leaf_contexts AS (
+            SELECT c1.id
+            FROM contexts c1
+            WHERE c1.id = ?
+        UNION ALL
+            SELECT c2.id
+            FROM contexts c2
+            JOIN leaf_contexts lc ON lc.id = c2.parent_id
+            WHERE c2.active = 1
+            AND NOT EXISTS (
+                SELECT 1
+                FROM contexts c3
+                WHERE c3.parent_id = c2.parent_id
+                AND c3.branch_msg_id < c2.branch_msg_id
+                AND c3.active = 1
+            )
+        )
+        SELECT id FROM leaf_contexts ORDER BY id DESC;""", 'contexts'),
+    'branches': ("""
+        WITH RECURSIVE context_chain(id, parent_id, branch_msg_id) AS (
+          SELECT id, parent_id, branch_msg_id
+          FROM contexts
+          WHERE id = ?
+          UNION ALL
+          SELECT c.id, c.parent_id, c.branch_msg_id
+          FROM contexts c
+          JOIN context_chain cc ON c.parent_id = cc.id
+        )
+        SELECT
+            cc.branch_msg_id,
+            group_concat((SELECT MIN(cm.id) FROM contexts_messages cm WHERE cm.context_id = cc.id)) AS context_set
+        FROM context_chain cc
+        WHERE cc.branch_msg_id IS NOT null
+        GROUP BY cc.branch_msg_id;""", 'contexts'),
+    'messages': ("""
+        WITH RECURSIVE context_path(context_id, parent_id, branch_msg_id, prev_branch_msg_id) AS (
+          SELECT id, parent_id, branch_msg_id, null
+          FROM contexts
+          WHERE id = ?
+          UNION ALL
+          SELECT c.id, c.parent_id, c.branch_msg_id, cp.branch_msg_id
+          FROM context_path cp
+          JOIN contexts c ON cp.parent_id = c.id
+        )
+        SELECT m.id, m.role, m.msg, m.member_id, m.alt_turn, m.log
+        FROM contexts_messages m
+        JOIN context_path cp ON m.context_id = cp.context_id
+        WHERE m.id > 0
+            AND (cp.prev_branch_msg_id IS NULL OR m.id < cp.prev_branch_msg_id)
+        ORDER BY m.id;""", 'contexts'),
+    'latest_context': ("""
+        SELECT id FROM contexts WHERE parent_id IS NULL AND kind = 'CHAT' ORDER BY id DESC LIMIT 1""", None),
+}
+
+
+class TestSqlIndexes(unittest.TestCase):
+    """The message history queries with and without the v0.4.1 indexes."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+        shutil.copyfile(os.path.join(get_application_path(), 'data.db'), os.path.join(cls.temp_dir, 'data.db'))
+        sql.set_db_filepath(cls.temp_dir)
+
+        conn = sql.get_connection()
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM contexts_messages")
+        conn.execute("DELETE FROM contexts")
+        contexts = []
+        messages = []
+        msg_id = 0
+        for context_id in range(1, CONTEXT_COUNT + 1):
+            # every 10th context is a branch of the previous one
+            is_branch = context_id % 10 == 0
+            parent_id = context_id - 1 if is_branch else None
+            branch_msg_id = msg_id - 5 if is_branch else None
+            contexts.append((context_id, parent_id, branch_msg_id, 'CHAT', '{}'))
+            for _ in range(MESSAGES_PER_CONTEXT):
+                msg_id += 1
+                role = random.choice(('user', 'assistant'))
+                messages.append((msg_id, context_id, '1', role, 'x' * 64, '{}'))
+        conn.executemany("INSERT INTO contexts (id, parent_id, branch_msg_id, kind, config) VALUES (?, ?, ?, ?, ?)", contexts)
+        conn.executemany("INSERT INTO contexts_messages (id, context_id, member_id, role, msg, log) VALUES (?, ?, ?, ?, ?, ?)", messages)
+        conn.execute("COMMIT")
+
+    @classmethod
+    def tearDownClass(cls):
+        sql.set_db_filepath(None)
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+
+    def query_plan(self, query, params):
+        plan = sql.get_results(f"EXPLAIN QUERY PLAN {query}", params)
+        return '\n'.join(row[-1] for row in plan)
+
+    def time_queries(self, repeats=20):
+        timings = {}
+        context_ids = random.sample(range(1, CONTEXT_COUNT + 1), repeats)
+        for name, (query, param_kind) in QUERIES.items():
+            start = time.perf_counter()
+            for context_id in context_ids:
+                sql.get_results(query, (context_id,) if param_kind else None)
+            timings[name] = (time.perf_counter() - start) / repeats
+        return timings
+
+    def drop_indexes(self):
+        for index_name in INDEXES:
+            sql.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+    def test_indexes_used(self):
+        self.drop_indexes()
+        upgrade_script.v0_4_1()
+
+        plans = {name: self.query_plan(query, (1,) if param_kind else None)
+                 for name, (query, param_kind) in QUERIES.items()}
+        self.assertIn('idx_contexts_parent_id', plans['leaf_contexts'])
+        self.assertIn('idx_contexts_parent_id', plans['branches'])
+        self.assertIn('idx_contexts_messages_context_id', plans['branches'])
+        self.assertIn('idx_contexts_messages_context_id', plans['messages'])
+        self.assertIn('idx_contexts_kind', plans['latest_context'])
+        self.assertNotIn('SCAN m', plans['messages'])
+
+    @unittest.skipUnless(os.environ.get('AP_BENCHMARKS'), 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_benchmark(self):
+        self.drop_indexes()
+        before = self.time_queries()
+        upgrade_script.v0_4_1()
+        after = self.time_queries()
+
+        print(f"\n{'query':<16}{'before (ms)':>14}{'after (ms)':>14}")
+        for name in QUERIES:
+            print(f"{name:<16}{before[name] * 1000:>14.3f}{after[name] * 1000:>14.3f}")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+from src.system import plugins
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEADLESS_MODULES = ['src.utils.helpers', 'src.utils.sql', 'src.utils.connectivity', 'src.system.base']
+LAZY_MODULES = [  # only imported when a member, provider or environment uses them
+    'src.plugins.openinterpreter.src',
+    'src.plugins.openaiassistant.modules.agent_plugin',
+    'src.plugins.realtimeai.modules.client',
+    'src.plugins.docker.modules.sandbox_plugin',
+    'src.plugins.routellm.modules.provider_plugin',
+    'src.plugins.litellm.modules.provider_plugin',
+    'litellm',
+    'instructor',
+    'pyaudio',
+    'onnxruntime',
+]
+
+
+def get_import_times(statement):
+    """{module: cumulative import secs} from `python -X importtime`"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=REPO_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise AssertionError(result.stderr[-2000:])
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        import_times[module.strip()] = int(cumulative) / 1_000_000
+    return import_times
+
+
+class TestPluginRegistry(unittest.TestCase):
+    def test_names_without_importing(self):
+        with mock.patch('importlib.import_module') as import_module:
+            self.assertEqual(plugins.get_plugin_names('Agent'), ['Open_Interpreter', 'OpenAI_Assistant'])
+            self.assertEqual(plugins.get_plugin_names('Provider'), ['litellm', 'fakeyou', 'routellm'])
+        import_module.assert_not_called()
+
+    def test_imported_on_first_use(self):
+        from src.members.block import CodeBlock
+        plugins.plugin_classes.pop('src.members.block.CodeBlock', None)
+        with mock.patch('importlib.import_module', wraps=importlib.import_module) as import_module:
+            self.assertIs(plugins.get_plugin_class('Block', 'Code'), CodeBlock)
+            self.assertIs(plugins.get_plugin_class('Block', 'Code'), CodeBlock)
+        self.assertEqual(import_module.call_count, 1)
+
+        self.assertIsNone(plugins.get_plugin_class('Workflow', 'CrewAI'))
+        self.assertIs(plugins.get_plugin_class('Environment', 'E2BEnvironment', default_class=dict), dict)
+
+    def test_import_paths(self):
+        for plugin_type, type_plugins in plugins.ALL_PLUGINS.items():
+            for import_path in (type_plugins if isinstance(type_plugins, list) else type_plugins.values()):
+                module_name, _, class_name = import_path.rpartition('.')
+                self.assertTrue(class_name.isidentifier() and module_name.startswith('src.'), import_path)
+                module_path = os.path.join(REPO_DIR, *module_name.split('.')) + '.py'
+                self.assertTrue(os.path.isfile(module_path), import_path)
+                with open(module_path) as f:
+                    self.assertIn(f'class {class_name}(', f.read(), import_path)
+
+
+@unittest.skipUnless(importlib.util.find_spec('PySide6'), 'the app dependencies are needed to import it')
+class TestStartupImports(unittest.TestCase):
+    def test_lazy_modules(self):
+        import_times = get_import_times('import src.gui.main')
+        self.assertEqual([module for module in LAZY_MODULES if module in import_times], [])
+
+    def test_providers_load_without_llm_libraries(self):
+        # ProviderManager.load instantiates the provider plugins at startup, litellm is imported on the first model call
+        import_times = get_import_times('import src.plugins.litellm.modules.provider_plugin')
+        self.assertEqual([module for module in ('litellm', 'instructor') if module in import_times], [])
+
+
+@unittest.skipUnless(importlib.util.find_spec('numpy') and importlib.util.find_spec('httpx'),
+                     'the system dependencies are needed to import them')
+class TestHeadlessImports(unittest.TestCase):
+    def test_no_qt(self):
+        import_times = get_import_times(f"import {', '.join(HEADLESS_MODULES)}")
+        self.assertEqual([module for module in import_times if module.startswith('PySide6')], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
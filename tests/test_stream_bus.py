@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from src.utils.stream_bus import StreamBus
+
+
+class TestStreamBus(unittest.TestCase):
+    def test_chunks_merged_per_member(self):
+        wakeups = []
+        bus = StreamBus(on_ready=lambda: wakeups.append(1))
+        for i in range(100):
+            bus.publish('assistant', '1', 'a')
+            bus.publish('assistant', '2', 'b')
+            bus.publish('thinking', '1', 'c')
+
+        self.assertEqual(bus.drain(), [
+            ('assistant', '1', 'a' * 100),
+            ('assistant', '2', 'b' * 100),
+            ('thinking', '1', 'c' * 100),
+        ])
+        self.assertEqual(len(wakeups), 1)
+        self.assertEqual(bus.drain(), [])
+
+        metrics = bus.get_metrics()
+        self.assertEqual(metrics['published_chunks'], 300)
+        self.assertEqual(metrics['flushed_chunks'], 300)
+        self.assertEqual(metrics['max_queue_depth'], 300)
+        self.assertEqual(metrics['queue_depth'], 0)
+
+    def test_backpressure_waits_without_blocking_the_loop(self):
+        bus = StreamBus(max_pending_chars=10, max_block_secs=5)
+
+        async def run():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.001)
+
+            ticker = asyncio.create_task(tick())
+            await bus.publish_async('assistant', '1', 'x' * 9)  # below the limit, returns at once
+            publisher = asyncio.create_task(bus.publish_async('assistant', '1', 'y'))
+            await asyncio.sleep(0.1)
+            self.assertFalse(publisher.done())
+            ticks_while_waiting = ticks
+
+            drainer = threading.Thread(target=lambda: drained.extend(bus.drain()))  # the GUI thread
+            drainer.start()
+            await asyncio.wait_for(publisher, 1)
+            drainer.join()
+            ticker.cancel()
+            return ticks_while_waiting
+
+        drained = []
+        ticks_while_waiting = asyncio.run(run())
+        self.assertGreater(ticks_while_waiting, 0)  # the loop kept running other tasks
+        self.assertEqual(drained, [('assistant', '1', 'x' * 9 + 'y')])
+        self.assertGreater(bus.get_metrics()['blocked_secs'], 0)
+
+    def test_backpressure_times_out(self):
+        bus = StreamBus(max_pending_chars=10, max_block_secs=0.05)
+        asyncio.run(bus.publish_async('assistant', '1', 'x' * 20))
+        self.assertEqual(bus.drain(), [('assistant', '1', 'x' * 20)])  # nothing is dropped
+        self.assertEqual(bus.capacity_waiters, [])
+
+    def test_no_text_lost_across_threads(self):
+        bus = StreamBus(max_pending_chars=256, max_block_secs=5)
+        received = {}
+        done = threading.Event()
+
+        def produce(member_id):
+            for i in range(2000):
+                bus.publish('assistant', member_id, f'{i},')
+
+        producers = [threading.Thread(target=produce, args=(str(i),)) for i in range(4)]
+        for producer in producers:
+            producer.start()
+
+        def wait_producers():
+            for producer in producers:
+                producer.join()
+            done.set()
+
+        threading.Thread(target=wait_producers).start()
+        while not done.is_set() or bus.get_metrics()['queue_depth']:
+            for role, member_id, text in bus.drain():
+                received[member_id] = received.get(member_id, '') + text
+            time.sleep(0.001)
+
+        expected = ''.join(f'{i},' for i in range(2000))
+        self.assertEqual(received, {str(i): expected for i in range(4)})
+
+
+if __name__ == '__main__':
+    unittest.main()
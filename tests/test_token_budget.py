@@ -0,0 +1,117 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.utils import messages
+from src.utils.messages import Message, MessageHistory, MESSAGE_TOKEN_OVERHEAD
+
+
+class TestTokenBudget(unittest.TestCase):
+    def setUp(self):
+        self.member_config = {'chat.model': 'gpt-4o', 'chat.token_budget': True}
+        workflow = SimpleNamespace(
+            leaf_id=1,
+            config={'inputs': []},
+            members={'1': SimpleNamespace(config=self.member_config, model_config_key='chat.model')},
+            _parent_workflow=None,
+            system=SimpleNamespace(
+                config=SimpleNamespace(dict={}),
+                providers=SimpleNamespace(get_context_window=lambda model_obj: 1000),
+            ),
+        )
+        self.history = MessageHistory(workflow)
+        self.add('user', 'Hello there')
+        self.add('assistant', 'Hi, how can I help?')
+        self.add('user', 'What is the weather in Paris and Rome?')
+        self.add('tool', '{"name": "weather", "args": "{\\"city\\": \\"Paris\\"}"}')
+        self.add('tool', '{"name": "weather", "args": "{\\"city\\": \\"Rome\\"}"}')
+        self.add('result', '{"status": "success", "output": "Sunny"}')
+        self.add('result', '{"status": "success", "output": "Rainy"}')
+        self.add('assistant', 'Paris is sunny and Rome is rainy')
+
+    def add(self, role, content):
+        msg_id = len(self.history.messages) + 1
+        self.history.messages.append(Message(msg_id, role, content, '1', 0))
+
+    def get_msgs(self):
+        return list(self.history.messages)
+
+    def count(self, msgs):
+        return sum(self.history.get_msg_token_count(msg) for msg in msgs)
+
+    def test_walks_back_until_budget(self):
+        msgs = self.get_msgs()
+        kept, older = self.history.fit_token_budget(msgs, self.count(msgs[-1:]))
+        self.assertEqual([msg.id for msg in kept], [8])
+        self.assertEqual(older + kept, msgs)
+
+        kept, _ = self.history.fit_token_budget(msgs, self.count(msgs))
+        self.assertEqual(kept, msgs)
+
+        kept, _ = self.history.fit_token_budget(msgs, 1)
+        self.assertEqual([msg.id for msg in kept], [8])  # the latest message is always kept
+
+    def test_tool_calls_and_results_kept_together(self):
+        msgs = self.get_msgs()
+        for budget in range(self.count(msgs[-2:]), self.count(msgs[2:])):
+            kept, _ = self.history.fit_token_budget(msgs, budget)
+            self.assertIn(kept[0].role, ('assistant', 'tool'), budget)
+            self.assertLessEqual(self.count(kept), budget)
+
+        kept, _ = self.history.fit_token_budget(msgs, self.count(msgs[3:]))
+        self.assertEqual([msg.id for msg in kept], [4, 5, 6, 7, 8])
+
+    def test_token_counts_cached(self):
+        msgs = self.get_msgs()
+        self.history.fit_token_budget(msgs, 10_000)
+        with mock.patch('src.utils.messages.count_tokens') as count_tokens:
+            self.history.fit_token_budget(msgs, 10_000)
+        count_tokens.assert_not_called()
+
+        # preloaded messages have no id and are counted from their content
+        self.assertEqual(self.history.get_msg_token_count({'role': 'user', 'content': ''}), MESSAGE_TOKEN_OVERHEAD)
+
+    def test_incremental_summary(self):
+        strategy = mock.AsyncMock(side_effect=lambda previous, msgs, model_obj, max_tokens:
+                                  previous + ''.join(str(msg['id']) for msg in msgs))
+        msgs = self.get_msgs()
+        with mock.patch.dict(messages.SUMMARY_STRATEGIES, {'Test': strategy}):
+            self.assertEqual(asyncio.run(self.history.get_summary('1', 'Test', msgs[:2], {}, 100)), '12')
+            self.assertEqual(asyncio.run(self.history.get_summary('1', 'Test', msgs[:2], {}, 100)), '12')
+            self.assertEqual(asyncio.run(self.history.get_summary('1', 'Test', msgs[:3], {}, 100)), '123')
+        self.assertEqual(strategy.await_count, 2)
+        self.assertEqual([msg['id'] for msg in strategy.call_args.args[1]], [3])  # only the newly cut message
+
+    def test_llm_messages_only_builds_kept_messages(self):
+        for i in range(500):
+            self.add('user' if i % 2 else 'assistant', f'Message number {i} with some more words in it')
+        self.member_config['chat.summary_strategy'] = 'Test'
+        strategy = mock.AsyncMock(return_value='Earlier messages')
+
+        with mock.patch.dict(messages.SUMMARY_STRATEGIES, {'Test': strategy}), \
+                mock.patch.object(self.history, 'get_msg_dicts', wraps=self.history.get_msg_dicts) as get_msg_dicts:
+            llm_msgs = asyncio.run(self.history.get_llm_messages('1'))
+
+        self.assertEqual(llm_msgs[0], {'role': 'system', 'content': 'Summary of the earlier conversation:\n\nEarlier messages'})
+        built_msgs = get_msg_dicts.call_args.args[0]
+        self.assertLess(len(built_msgs), 100)
+        self.assertEqual(built_msgs[-1], self.history.messages[-1])
+        self.assertEqual(len(strategy.call_args.args[1]), len(self.history.messages) - len(built_msgs))
+
+    def test_budget_from_context_window(self):
+        member_config = {'chat.model': 'gpt-4o', 'chat.sys_msg': ''}
+        self.assertEqual(self.history.get_token_budget(None, member_config), 1000 - 250)
+
+    def test_long_history(self):
+        for i in range(50_000):
+            self.add('user' if i % 2 else 'assistant', f'Message number {i} with some more words in it')
+        msgs = self.get_msgs()
+
+        kept, _ = self.history.fit_token_budget(msgs, 4000)
+        self.assertLess(len(kept), 1000)
+        self.assertEqual(kept[-1], msgs[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.utils import messages, tokens
+from src.utils.messages import Message, MessageHistory, MESSAGE_TOKEN_OVERHEAD
+from src.utils.tokens import TokenCounter
+
+MODEL_ENCODINGS = {'gpt-4o': 'o200k_base', 'gpt-3.5-turbo': 'cl100k_base'}
+
+
+def fake_encoding(name):
+    return SimpleNamespace(name=name, encode=mock.Mock(side_effect=lambda text, disallowed_special: text.split()))
+
+
+class TestTokenCounter(unittest.TestCase):
+    def setUp(self):
+        self.encodings = {}
+
+        def get_encoding(name):
+            if name not in self.encodings:
+                self.encodings[name] = fake_encoding(name)
+            return self.encodings[name]
+
+        def encoding_for_model(model_name):
+            if model_name not in MODEL_ENCODINGS:
+                raise KeyError(model_name)
+            return get_encoding(MODEL_ENCODINGS[model_name])
+
+        patches = [
+            mock.patch.object(tokens.tiktoken, 'get_encoding', side_effect=get_encoding),
+            mock.patch.object(tokens.tiktoken, 'encoding_for_model', side_effect=encoding_for_model),
+        ]
+        self.get_encoding, self.encoding_for_model = [patch.start() for patch in patches]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+        self.counter = TokenCounter()
+
+    def test_encoder_created_once_per_model(self):
+        for content in ('one two', 'three four five', 'six'):
+            self.counter.count(content, 'gpt-4o')
+        self.assertIs(self.counter.get_encoder('gpt-4o'), self.encodings['o200k_base'])
+        self.assertEqual(self.encoding_for_model.call_count, 1)
+
+    def test_encoding_fallback(self):
+        self.assertEqual(self.counter.get_encoder('openai/gpt-4o').name, 'o200k_base')
+        self.assertEqual([call.args[0] for call in self.encoding_for_model.call_args_list], ['openai/gpt-4o', 'gpt-4o'])
+
+        self.assertEqual(self.counter.get_encoder('claude-3-5-sonnet').name, tokens.DEFAULT_ENCODING)
+        self.assertEqual(self.counter.get_encoder('anthropic/claude-3-5-sonnet').name, tokens.DEFAULT_ENCODING)
+        self.assertEqual(self.counter.get_encoder(None).name, tokens.DEFAULT_ENCODING)
+
+    def test_counts_cached_by_content_hash(self):
+        self.assertEqual(self.counter.count('one two three', 'gpt-3.5-turbo'), 3)
+        self.assertEqual(self.counter.count('one two three', 'claude-3-opus'), 3)  # same encoding, a cache hit
+        self.assertEqual(self.encodings['cl100k_base'].encode.call_count, 1)
+
+        self.counter.count('one two three', 'gpt-4o')  # another encoding
+        self.assertEqual(self.encodings['o200k_base'].encode.call_count, 1)
+        self.assertEqual(self.counter.count('', 'gpt-4o'), 0)
+        self.assertEqual(self.counter.count(None, 'gpt-4o'), 0)
+
+    def test_lru_eviction(self):
+        counter = TokenCounter(max_cached_counts=2)
+        encode = self.get_encoding(tokens.DEFAULT_ENCODING).encode
+        counter.count('a')
+        counter.count('b')
+        counter.count('a')  # hit, now the most recent
+        counter.count('c')  # evicts 'b'
+        self.assertEqual(encode.call_count, 3)
+        self.assertEqual(len(counter.counts), 2)
+
+        counter.count('a')
+        self.assertEqual(encode.call_count, 3)
+        counter.count('b')
+        self.assertEqual(encode.call_count, 4)
+
+
+class TestMessageTokenCount(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(messages, 'count_tokens', side_effect=lambda content, model_name=None: len(content.split()))
+        self.count_tokens = patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_counted_lazily(self):
+        msg = Message(1, 'assistant', 'Paris is sunny', '2', 0, {'model': {'model_name': 'gpt-4o'}})
+        self.count_tokens.assert_not_called()
+
+        self.assertEqual(msg.token_count, 3)
+        self.assertEqual(msg.token_count, 3)
+        self.count_tokens.assert_called_once_with('Paris is sunny', 'gpt-4o')
+
+    def test_member_model(self):
+        msg = Message(1, 'assistant', 'Paris is sunny', '2', 0, {'model': {'model_name': 'claude-3-opus'}})
+        msg.token_count
+        self.count_tokens.assert_called_once_with('Paris is sunny', 'claude-3-opus')
+
+        history = MessageHistory(SimpleNamespace())
+        self.assertEqual(history.get_msg_token_count(msg, 'gpt-4o'), 3 + MESSAGE_TOKEN_OVERHEAD)
+        self.assertEqual(self.count_tokens.call_args.args, ('Paris is sunny', 'gpt-4o'))
+
+        Message(2, 'user', 'Hello', '1').token_count  # no logged model, the default encoding
+        self.assertEqual(self.count_tokens.call_args.args, ('Hello', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
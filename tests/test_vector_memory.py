@@ -0,0 +1,168 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from src.system.vectordbs import LocalVectorStore, VectorDBManager
+from src.utils.messages import Message, MessageHistory
+from src.utils import sql
+from src.utils.filesystem import get_application_path
+
+WORDS = ['weather', 'rain', 'python', 'code', 'recipe', 'pasta']
+
+
+def fake_embeddings(texts):
+    """Bag of words vectors, so texts sharing words are similar"""
+    return [[text.lower().count(word) for word in WORDS] for text in texts]
+
+
+class TestLocalVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_search_and_persist(self):
+        store = LocalVectorStore(self.temp_dir, 'messages')
+        self.assertEqual(store.add([10, 11, 12], fake_embeddings(['rain today', 'python code', 'pasta recipe']), 'fake'), [0, 1, 2])
+        self.assertEqual(store.add([13], fake_embeddings(['more python']), 'fake'), [3])
+
+        results = store.search(fake_embeddings(['python'])[0], k=2)
+        self.assertEqual([msg_id for msg_id, _ in results], [13, 11])
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+
+        results = store.search(fake_embeddings(['python'])[0], k=2, candidate_ids={10, 11})
+        self.assertEqual(results[0][0], 11)
+
+        reopened = LocalVectorStore(self.temp_dir, 'messages')
+        self.assertEqual(len(reopened), 4)
+        self.assertEqual(reopened.search(fake_embeddings(['recipe'])[0], k=1)[0][0], 12)
+
+    def test_model_change_clears(self):
+        store = LocalVectorStore(self.temp_dir, 'messages')
+        store.add([1], [[1.0, 0.0]], 'model-a')
+        store.add([2], [[0.0, 1.0, 0.0]], 'model-b')
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.search([0.0, 1.0, 0.0])[0][0], 2)
+
+    def test_model_change_cleared_under_lock(self):
+        store = LocalVectorStore(self.temp_dir, 'messages')
+        store.add([1], [[1.0, 0.0]], 'model-a')
+        clear = store._clear_locked
+
+        def assert_locked_clear():
+            self.assertTrue(store.lock.locked())  # a concurrent writer can't append between the check and the clear
+            clear()
+
+        with mock.patch.object(store, '_clear_locked', side_effect=assert_locked_clear) as mock_clear:
+            store.add([2], [[0.0, 1.0]], 'model-b')
+        self.assertEqual(mock_clear.call_count, 1)
+        self.assertEqual(len(store), 1)
+
+    @unittest.skipUnless(os.environ.get('AP_BENCHMARKS'), 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_search_benchmark(self):
+        count, dim = 100_000, 384
+        rng = np.random.default_rng(0)
+        store = LocalVectorStore(self.temp_dir, 'bench')
+        vectors = rng.standard_normal((count, dim), dtype=np.float32)
+        store.add(list(range(count)), vectors, 'fake')
+
+        store.search(vectors[0])  # maps the matrix
+        start = time.perf_counter()
+        for i in range(10):
+            results = store.search(vectors[i], k=5)
+            self.assertEqual(results[0][0], i)
+        elapsed = (time.perf_counter() - start) / 10
+        print(f"\ntop-5 of {count} x {dim} vectors: {elapsed * 1000:.1f}ms")
+
+
+class TestVectorMemory(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        shutil.copyfile(os.path.join(get_application_path(), 'data.db'), os.path.join(self.temp_dir, 'data.db'))
+        sql.set_db_filepath(self.temp_dir)
+
+        self.config = {'system.vector_memory': True}
+        self.vectordbs = VectorDBManager(SimpleNamespace(config=SimpleNamespace(dict=self.config)))
+        self.vectordbs.embedding_func = mock.Mock(side_effect=fake_embeddings)
+        self.vectordbs.embed_wait_secs = 0.05
+
+    def tearDown(self):
+        sql.set_db_filepath(None)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def add_message(self, role, content):
+        msg_id = sql.execute(
+            "INSERT INTO contexts_messages (context_id, member_id, role, msg, log) VALUES (1, '1', ?, ?, '')", (role, content))
+        self.vectordbs.queue_message(msg_id, role, content)
+        return msg_id
+
+    def test_background_batched_embedding(self):
+        msg_ids = [
+            self.add_message('user', 'Will it rain? I need the weather'),
+            self.add_message('assistant', 'Here is a pasta recipe'),
+            self.add_message('tool', '{}'),  # not embedded
+            self.add_message('user', 'Fix my python code'),
+        ]
+        self.vectordbs.wait_for_embeddings()
+
+        self.assertEqual(self.vectordbs.embedding_func.call_count, 1)  # one batch
+        embedding_ids = sql.get_results(
+            "SELECT embedding_id FROM contexts_messages WHERE id IN (?, ?, ?, ?) ORDER BY id", msg_ids, return_type='list')
+        self.assertEqual(embedding_ids, [0, 1, None, 2])
+
+        results = self.vectordbs.search('messages', 'weather tomorrow', k=1)
+        self.assertEqual(results[0][0], msg_ids[0])
+
+    def test_disabled(self):
+        self.config['system.vector_memory'] = False
+        self.add_message('user', 'Will it rain?')
+        self.vectordbs.wait_for_embeddings()
+        self.assertEqual(self.vectordbs.embedding_func.call_count, 0)
+
+    def test_no_embeddings(self):
+        self.vectordbs.embedding_func = None
+        self.vectordbs.parent.providers = SimpleNamespace(get_embeddings=lambda texts, model_obj: None)
+        with self.assertRaises(ValueError):
+            self.vectordbs.embed(['Will it rain?'])
+
+        history = MessageHistory(SimpleNamespace(system=SimpleNamespace(vectordbs=self.vectordbs)))
+        self.add_message('user', 'Will it rain?')  # the worker logs the error once and carries on
+        self.vectordbs.wait_for_embeddings()
+        self.vectordbs.get_store().add([1], fake_embeddings(['rain']), 'fake')
+        memory_msg = asyncio.run(history.get_memory_message(
+            [Message(1, 'user', 'rain', '1')], [Message(2, 'user', 'rain again', '1')], 1))
+        self.assertIsNone(memory_msg)
+
+    def test_memory_searched_off_the_loop(self):
+        msg_ids = [self.add_message('user', 'Will it rain?'), self.add_message('user', 'Fix my python code')]
+        self.vectordbs.wait_for_embeddings()
+        history = MessageHistory(SimpleNamespace(system=SimpleNamespace(vectordbs=self.vectordbs)))
+        dropped = [Message(msg_id, 'user', content, '1') for msg_id, content in zip(msg_ids, ['Will it rain?', 'Fix my python code'])]
+
+        search_threads = []
+        search = self.vectordbs.search
+
+        def record_thread(*args, **kwargs):
+            search_threads.append(threading.current_thread())
+            return search(*args, **kwargs)
+
+        async def get_memory_message():
+            with mock.patch.object(self.vectordbs, 'search', side_effect=record_thread):
+                return await history.get_memory_message(dropped, [Message(9, 'user', 'more rain', '1')], 1, '1')
+
+        memory_msg = asyncio.run(get_memory_message())
+        self.assertEqual(memory_msg['content'], "Relevant earlier messages from this conversation:\n\nuser: Will it rain?")
+        self.assertIsNot(search_threads[0], threading.main_thread())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src.system.venvs import VenvManager
+
+
+class TestVenvPackages(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        with mock.patch('src.system.venvs.get_application_path', return_value=self.tmp_dir.name):
+            self.venv = VenvManager.Venv('test')
+        self.site_packages = os.path.join(self.venv.path, 'lib', 'python3.10', 'site-packages')
+        os.makedirs(self.site_packages)
+        self.add_package('ipykernel', '6.29.5')
+        self.add_package('Typing_Extensions', '4.12.2')
+        os.makedirs(os.path.join(self.site_packages, 'ipykernel'))  # not metadata
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def add_package(self, name, version):
+        dist_info = os.path.join(self.site_packages, f'{name.replace("-", "_")}-{version}.dist-info')
+        os.makedirs(dist_info)
+        with open(os.path.join(dist_info, 'METADATA'), 'w') as f:
+            f.write(f'Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n\nDescription\nName: not-a-header\n')
+        os.utime(self.site_packages, ns=(time.time_ns(), time.time_ns() + 1_000_000))  # coarse mtime filesystems
+
+    def test_reads_metadata(self):
+        self.assertEqual(self.venv.list_packages(), [['Typing_Extensions', '4.12.2'], ['ipykernel', '6.29.5']])
+        self.assertTrue(self.venv.has_package('ipykernel'))
+        self.assertTrue(self.venv.has_package('typing-extensions'))
+        self.assertFalse(self.venv.has_package('numpy'))
+
+    def test_invalidation(self):
+        self.assertFalse(self.venv.has_package('numpy'))
+        with mock.patch('src.system.venvs.read_installed_packages') as read_packages:
+            self.venv.has_package('numpy')
+        read_packages.assert_not_called()
+
+        self.add_package('numpy', '2.0.0')  # installed outside the app, the folder mtime changes
+        self.assertTrue(self.venv.has_package('numpy'))
+
+        with mock.patch('src.system.venvs.run_command'):
+            self.venv.uninstall_package('numpy')
+        self.assertIsNone(self.venv.packages)
+
+    @unittest.skipUnless(os.environ.get('AP_BENCHMARKS'), 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_benchmark(self):
+        for i in range(300):
+            self.add_package(f'package-{i}', '1.0')
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'pip', 'list', '--path', self.site_packages],
+                       capture_output=True)
+        pip_secs = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.venv.has_package('ipykernel')
+        scan_secs = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(100):
+            self.venv.has_package('ipykernel')
+        cached_secs = (time.perf_counter() - start) / 100
+
+        print(f"\n302 packages: pip list {pip_secs * 1000:.1f}ms, "
+              f"metadata scan {scan_secs * 1000:.2f}ms, cached has_package {cached_secs * 1e6:.1f}us")
+
+
+if __name__ == '__main__':
+    unittest.main()
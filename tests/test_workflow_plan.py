@@ -0,0 +1,139 @@
+import asyncio
+import os
+import time
+import unittest
+from types import SimpleNamespace
+
+from src.members import workflow
+from src.members.workflow import ExecutionPlan, WorkflowBehaviour, get_execution_plan
+
+MEMBER_SECS = 0.2
+
+
+def get_member(member_id, loc_x, member_type='agent'):
+    return {'id': member_id, 'agent_id': None, 'loc_x': loc_x, 'loc_y': 0, 'config': {'_TYPE': member_type}}
+
+
+def get_input(source_member_id, target_member_id, looper=False):
+    return {'source_member_id': source_member_id, 'target_member_id': target_member_id, 'config': {'looper': looper}}
+
+
+class FakeMember:
+    def __init__(self, member_id, runs, member_type='agent'):
+        self.member_id = member_id
+        self.config = {'_TYPE': member_type}
+        self.turn_output = None
+        self.runs = runs
+
+    async def run_member(self):
+        self.runs.append(('start', self.member_id))
+        await asyncio.sleep(MEMBER_SECS)
+        self.runs.append(('end', self.member_id))
+        self.turn_output = 'done'
+        yield 'assistant', f'Output of {self.member_id}'
+
+
+class TestExecutionPlan(unittest.TestCase):
+    def test_branches_share_a_level(self):
+        # the branches sit in different columns, but only depend on the user
+        members = [get_member('1', 0, 'user'), get_member('2', 100), get_member('3', 200), get_member('4', 300)]
+        inputs = [get_input('1', '2'), get_input('1', '3'), get_input('2', '4'), get_input('3', '4')]
+        plan = ExecutionPlan(members, inputs)
+        self.assertEqual(plan.levels, [['1'], ['2', '3'], ['4']])
+        self.assertEqual(plan.member_inputs['4'], ['2', '3'])
+
+    def test_members_without_inputs_follow_columns(self):
+        members = [get_member('4', 200), get_member('3', 105), get_member('2', 100), get_member('1', 0, 'user')]
+        inputs = [get_input('4', '2', looper=True)]  # looper inputs aren't dependencies
+        plan = ExecutionPlan(members, inputs)
+        self.assertEqual(plan.levels, [['1'], ['2', '3'], ['4']])
+        self.assertEqual(plan.order, ['1', '2', '3', '4'])  # by loc_x, not config order
+
+        # users only share a column with themselves
+        plan = ExecutionPlan([get_member('1', 0, 'user'), get_member('2', 5), get_member('3', 8, 'user')], [])
+        self.assertEqual(plan.levels, [['1'], ['2'], ['3']])
+
+    def test_circular_inputs(self):
+        members = [get_member('1', 0, 'user'), get_member('2', 100), get_member('3', 200)]
+        plan = ExecutionPlan(members, [get_input('3', '2'), get_input('2', '3')])
+        self.assertEqual(sorted(plan.order), ['1', '2', '3'])
+
+    def test_plan_cached_by_structure(self):
+        members = [get_member('1', 0, 'user'), get_member('2', 100)]
+        plan = get_execution_plan(members, [])
+        members[1]['config']['info.name'] = 'Renamed'
+        self.assertIs(get_execution_plan(members, []), plan)
+        members[1]['loc_x'] = 2
+        self.assertIsNot(get_execution_plan(members, []), plan)
+
+    def get_chain(self, count):
+        members = [get_member(str(i), i * 20) for i in range(count)]
+        inputs = [get_input(str(i), str(i + 1)) for i in range(count - 1)]
+        return members, inputs
+
+    def test_long_chain(self):
+        members, inputs = self.get_chain(2000)
+        plan = get_execution_plan(members, inputs)
+        self.assertEqual(len(plan.levels), 2000)
+        self.assertEqual(plan.order, [str(i) for i in range(2000)])
+
+    @unittest.skipUnless(os.environ.get('AP_BENCHMARKS'), 'set AP_BENCHMARKS=1 to run the benchmarks')
+    def test_compile_benchmark(self):
+        count = 2000
+        members, inputs = self.get_chain(count)
+        workflow.execution_plans.clear()
+
+        start = time.perf_counter()
+        plan = get_execution_plan(members, inputs)
+        compile_secs = time.perf_counter() - start
+        start = time.perf_counter()
+        self.assertIs(get_execution_plan(members, inputs), plan)
+        cached_secs = time.perf_counter() - start
+
+        print(f"\n{count} member chain: compile {compile_secs * 1000:.1f}ms, cached {cached_secs * 1000:.1f}ms")
+
+
+class TestWorkflowReceive(unittest.TestCase):
+    def get_workflow(self, members, inputs):
+        runs = []
+        plan = ExecutionPlan(members, inputs)
+        wf_members = {m['id']: FakeMember(m['id'], runs, m['config']['_TYPE']) for m in members}
+        fake_workflow = SimpleNamespace(
+            members={member_id: wf_members[member_id] for member_id in plan.order},
+            plan=plan,
+            config={},
+            chat_page=None,
+            autorun=True,
+            responding=False,
+            _parent_workflow=None,
+        )
+        fake_workflow.next_expected_member = lambda: next(
+            (m for m in fake_workflow.members.values() if m.turn_output is None), None)
+        fake_workflow.next_expected_is_last_member = lambda: len(
+            [m for m in fake_workflow.members.values() if m.turn_output is None]) == 1
+        return fake_workflow, runs
+
+    def receive(self, fake_workflow, from_member_id=None):
+        async def collect():
+            return [chunk async for chunk in WorkflowBehaviour(fake_workflow).receive(from_member_id)]
+        return asyncio.run(collect())
+
+    def test_independent_branches_run_concurrently(self):
+        members = [get_member('1', 0), get_member('2', 100), get_member('3', 200), get_member('4', 300)]
+        fake_workflow, runs = self.get_workflow(
+            members, [get_input('1', '2'), get_input('1', '3'), get_input('2', '4'), get_input('3', '4')])
+
+        chunks = self.receive(fake_workflow)
+
+        self.assertEqual(runs[2:4], [('start', '2'), ('start', '3')])  # both started before either ended
+        self.assertEqual(chunks, [('assistant', 'Output of 4')])  # only the final member streams
+
+    def test_from_member(self):
+        members = [get_member('1', 0, 'user'), get_member('2', 100), get_member('3', 200)]
+        fake_workflow, runs = self.get_workflow(members, [])
+        self.receive(fake_workflow, from_member_id='2')
+        self.assertEqual([member_id for event, member_id in runs if event == 'start'], ['2', '3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from src.members.base import XMLRoleRouter
+
+
+def route(chunks, tag_roles, default_role='assistant'):
+    router = XMLRoleRouter(tag_roles=tag_roles, default_role=default_role)
+    spans = []
+    for chunk in chunks:
+        spans += router.feed(chunk)
+    spans += router.flush()
+
+    merged = []
+    for role, text in spans:
+        if merged and merged[-1][0] == role:
+            merged[-1] = (role, merged[-1][1] + text)
+        else:
+            merged.append((role, text))
+    return merged, len(spans)
+
+
+class TestXMLRoleRouter(unittest.TestCase):
+    def test_tag_routed_to_role(self):
+        spans, _ = route(['Hi <think>plan</think> done'], {'think': 'Thinking'})
+        self.assertEqual(spans, [
+            ('assistant', 'Hi <think>'),
+            ('thinking', 'plan'),
+            ('assistant', '</think> done'),
+        ])
+
+    def test_tags_split_across_chunks(self):
+        chunks = ['Hi <th', 'ink>pl', 'an<', '/thi', 'nk> done']
+        spans, _ = route(chunks, {'think': 'Thinking'})
+        self.assertEqual(spans, [
+            ('assistant', 'Hi <think>'),
+            ('thinking', 'plan'),
+            ('assistant', '</think> done'),
+        ])
+
+    def test_wildcard_patterns(self):
+        spans, _ = route(['<thought_1>a</thought_1><other>b</other>'], {'thought%': 'thought'})
+        self.assertEqual(spans, [
+            ('assistant', '<thought_1>'),
+            ('thought', 'a'),
+            ('assistant', '</thought_1><other>b</other>'),
+        ])
+
+    def test_unmatched_closing_tag_stays_in_role(self):
+        spans, _ = route(['<think>a < b</x>c</think>'], {'think': 'Thinking'})
+        self.assertEqual(spans, [
+            ('assistant', '<think>'),
+            ('thinking', 'a < b</x>c'),
+            ('assistant', '</think>'),
+        ])
+
+    def test_one_span_per_chunk(self):
+        chunks = ['word ' * 50] * 20
+        spans, span_count = route(chunks, {})
+        self.assertEqual(spans, [('assistant', 'word ' * 1000)])
+        self.assertEqual(span_count, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()